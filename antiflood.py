@@ -0,0 +1,182 @@
+"""
+Защита от флуда: лишние нажатия и сообщения отсекаются до обработчиков.
+
+Обработчик TypeHandler в группе -1 (см. build_application в bot.py)
+смотрит на каждое нажатие кнопки и сообщение (в том числе правку
+сообщения) раньше остальных и, если
+его нужно отбросить, бросает ApplicationHandlerStop:
+    повтор   — та же кнопка того же сообщения, что и предыдущее нажатие
+               пользователя на нём, в пределах DUPLICATE_WINDOW, причём
+               сообщение с тех пор не менялось (его правка, текст и
+               клавиатура те же): двойное касание, на которое уже отвечает
+               первое нажатие. Шаги викторины и листание ◀️/▶️ туда и
+               обратно повторами не считаются;
+    лимит    — у пользователя кончились токены: RATE в секунду, запас
+               BURST.
+На повтор отвечается пустым answerCallbackQuery, чтобы кнопка у клиента
+перестала ждать. На нажатия сверх лимита отвечается коротким NOTICE, но
+не чаще раза в NOTICE_INTERVAL на пользователя, а на остальные — так же
+пустым ответом, как на повтор. Отброшенное
+сообщение остаётся без ответа всегда: ответ расходовал бы лимит чата.
+Отброшенное обновление стоит несколько микросекунд и не доходит до
+обработчиков, а из запросов к Bot API вызывает разве что
+answerCallbackQuery, который не расходует лимит сообщений. Поэтому
+очередь чата того, кто флудит, разбирается быстро, а общий лимит
+Telegram (rate_limiter.py) и процессор достаются остальным.
+
+Память ограничена: корзины хранятся для MAX_USERS последних
+пользователей (LRU), последние нажатия на сообщения — только за
+DUPLICATE_WINDOW. Вытесненный пользователь получает новую, полную корзину — при MAX_USERS
+активных за последние секунды это не случается. Inline-запросы не
+проверяются: их отсеивает сам inline-режим (см. inline.py).
+
+В кластере (cluster.py) все обновления пользователя в личном чате
+попадают в один процесс, так что корзины у каждого процесса свои.
+"""
+
+import time
+from collections import OrderedDict
+
+from telegram import Update
+from telegram.ext import ApplicationHandlerStop
+
+from rate_limiter import TokenBucket
+
+# Нажатий и сообщений в секунду на пользователя и запас для серии
+RATE = 2.0
+BURST = 8
+
+# В течение скольких секунд то же нажатие считается повтором
+DUPLICATE_WINDOW = 1.0
+
+# Как часто отвечать пользователю на нажатия сверх лимита, с
+NOTICE_INTERVAL = 3.0
+
+MAX_USERS = 100000
+
+NOTICE = "⏳ Не так быстро — подождите секунду"
+
+DUPLICATE = 'duplicate'
+THROTTLED = 'throttled'
+
+
+class _User(TokenBucket):
+    """Корзина пользователя и момент последнего ответа на нажатие сверх лимита"""
+
+    __slots__ = ('noticed',)
+
+    def __init__(self, rate, capacity, now):
+        super().__init__(rate, capacity, now)
+        self.noticed = float('-inf')
+
+
+def _press_key(query):
+    """
+    Нажатие: (пользователь, сообщение) и (данные кнопки, состояние
+    сообщения, каким его прислал Telegram)
+    """
+    message = query.message
+    if message is None:
+        return (query.from_user.id, query.inline_message_id), (query.data, None)
+    state = (getattr(message, 'edit_date', None), getattr(message, 'text', None) or getattr(message, 'caption', None),
+             getattr(message, 'reply_markup', None))
+    return (query.from_user.id, message.chat.id, message.message_id), (query.data, state)
+
+
+class Antiflood:
+    """Повторы и корзины токенов по пользователям, с ограниченной памятью"""
+
+    def __init__(self, rate=RATE, burst=BURST, duplicate_window=DUPLICATE_WINDOW,
+                 max_users=MAX_USERS, notice=NOTICE, notice_interval=NOTICE_INTERVAL):
+        self.rate = rate
+        self.burst = burst
+        self.duplicate_window = duplicate_window
+        self.max_users = max_users
+        self.notice = notice
+        self.notice_interval = notice_interval
+
+        self._buckets = OrderedDict()   # user_id -> _User, от давних к недавним
+        self._presses = OrderedDict()   # (пользователь, сообщение) -> (нажатие, момент), по возрастанию
+
+        self.passed = 0
+        self.duplicates = 0
+        self.throttled = 0
+        self.notices = 0
+
+    def metrics(self):
+        """Текущие значения для мониторинга"""
+        return {
+            'users': len(self._buckets),
+            'recent_presses': len(self._presses),
+            'passed': self.passed,
+            'duplicates': self.duplicates,
+            'throttled': self.throttled,
+            'notices': self.notices,
+        }
+
+    def _duplicate(self, query, now):
+        presses = self._presses
+        while presses:
+            where, (_, first) = next(iter(presses.items()))
+            if now - first < self.duplicate_window and len(presses) < self.max_users:
+                break
+            del presses[where]
+        where, press = _press_key(query)
+        last = presses.get(where)
+        if last is not None and last[0] == press:
+            return True
+        presses[where] = (press, now)
+        presses.move_to_end(where)
+        return False
+
+    def _bucket(self, user_id, now):
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            if len(self._buckets) >= self.max_users:
+                self._buckets.popitem(last=False)
+            bucket = self._buckets[user_id] = _User(self.rate, self.burst, now)
+        else:
+            self._buckets.move_to_end(user_id)
+        return bucket
+
+    def check(self, update, now=None):
+        """None, если обновление пропустить, иначе DUPLICATE или THROTTLED"""
+        if not isinstance(update, Update) or update.effective_user is None:
+            return None
+        query = update.callback_query
+        if query is None and update.effective_message is None:
+            return None
+        now = time.monotonic() if now is None else now
+        if query is not None and self._duplicate(query, now):
+            self.duplicates += 1
+            return DUPLICATE
+        bucket = self._bucket(update.effective_user.id, now)
+        if bucket.delay(now):
+            self.throttled += 1
+            return THROTTLED
+        bucket.take(now)
+        self.passed += 1
+        return None
+
+    def should_notify(self, user_id, now=None):
+        """Пора ли ответить пользователю на нажатие сверх лимита (и отметить ответ)"""
+        now = time.monotonic() if now is None else now
+        user = self._bucket(user_id, now)
+        if now - user.noticed < self.notice_interval:
+            return False
+        user.noticed = now
+        self.notices += 1
+        return True
+
+    async def guard(self, update, context):
+        """Обработчик TypeHandler(Update) в группе -1"""
+        verdict = self.check(update)
+        if verdict is None:
+            return
+        query = update.callback_query
+        if query is not None:
+            if verdict == THROTTLED and self.should_notify(query.from_user.id):
+                await query.answer(self.notice)
+            else:
+                await query.answer()
+        raise ApplicationHandlerStop
@@ -0,0 +1 @@
+"""Микро-бенчмарки бота. Запуск: python -m benchmarks.<имя>"""
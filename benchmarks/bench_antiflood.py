@@ -0,0 +1,146 @@
+"""
+Один пользователь, который жмёт кнопки без остановки, и все остальные.
+
+Обычные пользователи шлют смешанный поток (как в harness.py) с частотой
+--rate, а один «флудер» одновременно жмёт кнопки под своими сообщениями
+с частотой --flood, то повторяя нажатие, то чередуя кнопки и сообщения.
+Замеряются задержки ответов обычным пользователям и число запросов к
+Bot API, которые ушли на флудера, в трёх прогонах: без флудера, с
+флудером без защиты и с флудером под защитой antiflood.py. Каждый
+прогон повторяется --rounds раз, выводится медиана: хвост задержек на
+одной машине шумный.
+
+Приложение то же, что в harness.py: все обработчики, транспорт в том же
+процессе, ограничитель без лимитов — так видна цена самой обработки.
+
+    python -m benchmarks.bench_antiflood [--updates 1000] [--rate 100] [--flood 1000]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import statistics
+import tempfile
+from collections import Counter
+
+from telegram import Update
+
+import bot
+import router
+from antiflood import Antiflood
+from benchmarks.bench_ingress import LatencyProbe, percentile, unlimited_rate_limiter
+from benchmarks.fake_bot_api import FakeBotAPI
+from benchmarks.harness import InProcessRequest, scenario_stream, stopped
+from benchmarks.updates import callback_update
+
+FLOODER = 10 ** 9
+
+# Флудер жмёт кнопки меню под своими последними сообщениями: часть
+# нажатий — повторы, остальные упираются в лимит
+FLOOD_BUTTONS = (router.WORD_OF_DAY, router.CATEGORIES, router.RANDOM_GESTURE)
+FLOOD_MESSAGES = 50
+
+
+class FlooderCalls:
+    """Запросы к Bot API, сделанные ради флудера"""
+
+    def __init__(self):
+        self.calls = Counter()
+
+    def __call__(self, method, params):
+        if str(params.get('chat_id')) == str(FLOODER) or str(params.get('callback_query_id', '')).startswith('f'):
+            self.calls[method] += 1
+
+
+def flood_update(rng, n):
+    data = callback_update(
+        FLOODER, router.callback_data(rng.choice(FLOOD_BUTTONS)), message_id=rng.randint(1, FLOOD_MESSAGES)
+    )
+    data['callback_query']['id'] = f'f{n}'
+    return data
+
+
+async def run(updates, rate, flood, antiflood):
+    """(задержки обычных пользователей, запросы ради флудера, метрики защиты)"""
+    api = FakeBotAPI()
+    probe = LatencyProbe(len(updates))
+    flooder = FlooderCalls()
+    api.listeners.extend((probe, flooder))
+    with tempfile.TemporaryDirectory() as tmp:
+        application = bot.build_application(
+            api.token, db_path=os.path.join(tmp, 'bot.db'), rate_limiter=unlimited_rate_limiter(),
+            request=InProcessRequest(api), antiflood=antiflood
+        )
+        await application.initialize()
+        await application.start()
+        loop = asyncio.get_running_loop()
+        stopping = asyncio.Event()
+
+        async def flood_loop():
+            rng = random.Random(1)
+            started, n = loop.time(), 0
+            while not stopping.is_set():
+                delay = started + n / flood - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                application.update_queue.put_nowait(Update.de_json(flood_update(rng, n), application.bot))
+                n += 1
+
+        flooding = asyncio.create_task(flood_loop()) if flood else None
+        try:
+            started = loop.time()
+            for i, data in enumerate(updates):
+                delay = started + i / rate - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                probe.injected(data)
+                application.update_queue.put_nowait(Update.de_json(data, application.bot))
+            await asyncio.wait_for(probe.done.wait(), timeout=600)
+        finally:
+            stopping.set()
+            if flooding:
+                await flooding
+            await stopped(application)
+    return probe.latencies, flooder.calls, antiflood.metrics() if antiflood else {}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--updates', type=int, default=1000, help="обновлений от обычных пользователей")
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--rate', type=float, default=100, help="их частота, обн/с")
+    parser.add_argument('--flood', type=float, default=1000, help="нажатий флудера в секунду")
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    updates = scenario_stream('mixed', args.updates, args.users)
+    for i, data in enumerate(updates):
+        # у каждого нажатия обычных пользователей своё сообщение: в общем
+        # потоке одинаковые нажатия одного пользователя — не повторы
+        if 'callback_query' in data:
+            data['callback_query']['message']['message_id'] = i + 1
+    print(f"{'прогон':<24} {'p50, мс':>8} {'p99, мс':>8} {'запросов ради флудера':>22}")
+    for name, flood, antiflood in (
+        ('без флудера', 0, False),
+        ('флудер, без защиты', args.flood, False),
+        ('флудер, с защитой', args.flood, Antiflood()),
+    ):
+        p50, p99 = [], []
+        for _ in range(args.rounds):
+            if antiflood:
+                antiflood = Antiflood()
+            latencies, calls, stats = asyncio.run(run(updates, args.rate, flood, antiflood))
+            p50.append(percentile(latencies, 0.5))
+            p99.append(percentile(latencies, 0.99))
+        print(f"{name:<24} {statistics.median(p50) * 1000:>8.2f} {statistics.median(p99) * 1000:>8.2f} "
+              f"{sum(calls.values()):>22}")
+        if stats:
+            print(f"{'':<24} повторов {stats['duplicates']}, сверх лимита {stats['throttled']}, "
+                  f"пропущено {stats['passed']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Рассылка слова дня по большой базе подписчиков на заглушке Bot API.
+
+Первый прогон прерывается через --crash-after секунд (как при перезапуске
+воркера), второй продолжает с контрольных точек. В конце проверяется,
+что каждый подписчик получил ровно одно сообщение.
+
+    python -m benchmarks.bench_broadcast [--subscribers 100000] [--rate 1000]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+from collections import Counter
+
+from telegram.ext import ExtBot
+from telegram.request import HTTPXRequest
+
+from benchmarks.fake_bot_api import FakeBotAPI
+from broadcast import run_broadcast
+from rate_limiter import PriorityRateLimiter
+from subscribers import SubscriberStore
+
+
+async def run_shards(api, store, broadcast_id, rate, shards, workers):
+    limiter = PriorityRateLimiter(overall_rate=rate, chat_rate=1, chat_burst=3)
+    bot = ExtBot(api.token, base_url=api.base_url, rate_limiter=limiter,
+                 request=HTTPXRequest(connection_pool_size=256, pool_timeout=60))
+    async with bot:
+        tasks = [
+            asyncio.create_task(run_broadcast(bot, store, broadcast_id, 'Слово дня',
+                                              shard=k, shards=shards, workers=workers))
+            for k in range(shards)
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            # как при остановке процесса: шарды штатно сохраняют прогресс
+            for task in tasks:
+                task.cancel()
+            await asyncio.wait(tasks)
+
+
+async def main_async(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SubscriberStore(os.path.join(tmp, 'bot.db'))
+        store.subscribe_many(range(1, args.subscribers + 1))
+        async with FakeBotAPI(latency=args.latency) as api:
+            started = time.perf_counter()
+            first = asyncio.create_task(run_shards(api, store, 'bench', args.rate, args.shards, args.workers))
+            await asyncio.sleep(args.crash_after)
+            first.cancel()
+            await asyncio.gather(first, return_exceptions=True)
+            before_restart = len(api.calls)
+            print(f"прервано через {args.crash_after:.0f} с, отправлено {before_restart}")
+
+            await run_shards(api, store, 'bench', args.rate, args.shards, args.workers)
+            elapsed = time.perf_counter() - started
+
+        sent = Counter(params['chat_id'] for method, params, _ in api.calls if method == 'sendMessage')
+        duplicates = sum(1 for count in sent.values() if count > 1)
+        missing = args.subscribers - len(sent)
+        print(f"подписчиков {args.subscribers}, шардов {args.shards}, воркеров {args.workers}")
+        print(f"время {elapsed:.1f} с, {len(api.calls) / elapsed:.0f} сообщений/с")
+        print(f"повторов {duplicates}, пропущено {missing}")
+        store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--subscribers', type=int, default=100_000)
+    parser.add_argument('--rate', type=float, default=1000, help="общий лимит, сообщений/с")
+    parser.add_argument('--shards', type=int, default=4)
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--latency', type=float, default=0.005)
+    parser.add_argument('--crash-after', type=float, default=5)
+    args = parser.parse_args()
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+    asyncio.run(main_async(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+"""
+Кластер из нескольких процессов бота на одном потоке обновлений.
+
+Запускает N процессов (cluster.py) с общей базой SQLite против
+локальной заглушки Bot API и подаёт обновления через getUpdates: их
+принимает ведущий, а разбирают все процессы по своим частям очереди.
+Замеряется пропускная способность от первого обновления до последнего
+ответа, а затем проверяется, что каждое обновление обработано ровно
+один раз: ответов столько же, сколько обновлений, и каждое нажатие
+кнопки подтверждено одним answerCallbackQuery. В последнем прогоне
+ведущий посреди потока убивается (SIGKILL, как упавший dyno) и
+запускается заново: его аренды ещё действуют, так что getUpdates
+подхватывает другой процесс только после их истечения, части очереди
+убитого ждут его возвращения, и обновления не теряются и не
+удваиваются. Если хоть одно потеряно или обработано дважды, скрипт
+завершается с ошибкой; tests/test_cluster.py гоняет те же прогоны.
+
+Ускорение зависит от числа ядер: процессы делят процессор машины.
+
+    python -m benchmarks.bench_cluster [--workers 1 2 4] [--updates 3000]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+from telegram import Update
+
+from benchmarks.fake_bot_api import FakeBotAPI
+from benchmarks.updates import update_stream
+from cluster import PARTITIONS, ClusterStore, partition
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+REPLY_METHODS = ('sendMessage', 'editMessageText')
+
+
+def worker_main(token, base_url, db_path, worker, workers):
+    """Один процесс кластера без лимитов ограничителя"""
+    import bot
+    from benchmarks.bench_ingress import unlimited_rate_limiter
+    from cluster import serve
+
+    logging.getLogger().setLevel(logging.WARNING)
+    application = bot.build_application(
+        token, base_url=base_url, db_path=db_path, rate_limiter=unlimited_rate_limiter(),
+        cluster=(worker, workers), antiflood=False
+    )
+    cluster = application.bot_data['cluster']
+    cluster.renew_interval = 0.5
+    cluster.lease_ttl = 1.5
+    asyncio.run(serve(application, cluster, polling=dict(poll_interval=0, timeout=1)))
+
+
+class Replies:
+    """Ответы бота и подтверждения нажатий"""
+
+    def __init__(self, expected):
+        self.expected = expected
+        self.count = 0
+        self.answered = Counter()
+        self.last = None
+        self.done = asyncio.Event()
+
+    def __call__(self, method, params):
+        if method == 'answerCallbackQuery':
+            self.answered[str(params['callback_query_id'])] += 1
+        elif method in REPLY_METHODS:
+            self.count += 1
+            self.last = time.perf_counter()
+            if self.count >= self.expected:
+                self.done.set()
+
+
+async def spawn(api, db_path, worker, workers):
+    return await asyncio.create_subprocess_exec(
+        sys.executable, '-m', 'benchmarks.bench_cluster', '--worker', f'{worker}/{workers}',
+        '--base-url', api.base_url, '--db', db_path, cwd=ROOT, env=dict(os.environ, METRICS_PORT='0'),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+
+async def claim_as(db_path, pid, worker, workers, expected):
+    """
+    Забрать из очереди expected обновлений частей процесса worker от его
+    имени — как если бы он забрал их и упал, не успев обработать
+    """
+    store = ClusterStore(db_path)
+    parts = tuple(p for p in range(PARTITIONS) if p % workers == worker)
+    claimed = 0
+    deadline = time.perf_counter() + 60
+    try:
+        while claimed < expected and time.perf_counter() < deadline:
+            claimed += len(store.claim(parts, f'{socket.gethostname()}:{pid}', limit=expected))
+            await asyncio.sleep(0.05)
+    finally:
+        store.close()
+    return claimed
+
+
+async def run(workers, updates, latency, restart=None, victim=0):
+    """
+    (обновлений/с, ответов, повторно подтверждённых нажатий, без подтверждения).
+    restart — сигнал, которым посреди потока останавливается процесс
+    victim (0 — ведущий) перед перезапуском: SIGTERM — штатная остановка,
+    SIGKILL — падение: процесс замирает, вторая половина его обновлений
+    забирается из очереди от его имени, и только потом он убивается —
+    они должны вернуться в очередь к перезапущенному.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        async with FakeBotAPI(latency=latency) as api:
+            replies = Replies(len(updates))
+            api.listeners.append(replies)
+            db_path = os.path.join(tmp, 'bot.db')
+            processes = []
+            for worker in range(workers):
+                processes.append(await spawn(api, db_path, worker, workers))
+                if worker == 0:
+                    # первый процесс создаёт схему и становится ведущим
+                    await asyncio.sleep(2)
+            # все процессы запущены и держат свои части очереди
+            await asyncio.sleep(3)
+
+            try:
+                started = time.perf_counter()
+                half = len(updates) // 2
+                for update in updates[:half]:
+                    api.push_update(update)
+                if restart:
+                    # первая половина разобрана, аренды процесса действуют
+                    deadline = time.perf_counter() + 60
+                    while replies.count < half and time.perf_counter() < deadline:
+                        await asyncio.sleep(0.05)
+                    await asyncio.sleep(0.5)
+                    process = processes[victim]
+                    if restart == signal.SIGKILL:
+                        process.send_signal(signal.SIGSTOP)
+                        for update in updates[half:]:
+                            api.push_update(update)
+                        ours = sum(
+                            1 for u in updates[half:]
+                            if partition(Update.de_json(u, None)) % workers == victim
+                        )
+                        await claim_as(db_path, process.pid, victim, workers, ours)
+                    process.send_signal(restart)
+                    await process.wait()
+                    processes[victim] = await spawn(api, db_path, victim, workers)
+                if restart != signal.SIGKILL:
+                    for update in updates[half:]:
+                        api.push_update(update)
+                try:
+                    await asyncio.wait_for(replies.done.wait(), timeout=120)
+                except asyncio.TimeoutError:
+                    pass
+                elapsed = (replies.last or time.perf_counter()) - started
+                # лишние ответы пришли бы после ожидаемых
+                await asyncio.sleep(2)
+            finally:
+                for process in processes:
+                    if process.returncode is None:
+                        process.terminate()
+                        await process.wait()
+
+    callbacks = {str(u['update_id']) for u in updates if 'callback_query' in u}
+    twice = sum(1 for count in replies.answered.values() if count > 1)
+    missing = len(callbacks - set(replies.answered))
+    return len(updates) / elapsed, replies.count, twice, missing
+
+
+def ok(count, twice, missing, expected):
+    """Каждое обновление обработано ровно один раз"""
+    return count == expected and twice == 0 and missing == 0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--updates', type=int, default=3000)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.0, help="задержка заглушки API, с")
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    parser.add_argument('--base-url', help=argparse.SUPPRESS)
+    parser.add_argument('--db', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        from benchmarks.fake_bot_api import TOKEN
+        from cluster import parse_worker
+        worker_main(TOKEN, args.base_url, args.db, *parse_worker(args.worker))
+        return
+
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+    print(f"ядер: {os.cpu_count()}")
+    print(f"{'процессов':>9} {'обн/с':>8} {'ответов':>8} {'дважды':>7} {'потеряно':>9}")
+    passed = True
+    for workers in args.workers:
+        rate, count, twice, missing = asyncio.run(run(workers, update_stream(args.updates, args.users), args.latency))
+        print(f"{workers:>9} {rate:>8.0f} {count:>8} {twice:>7} {missing:>9}")
+        passed &= ok(count, twice, missing, args.updates)
+
+    workers = max(2, max(args.workers))
+    rate, count, twice, missing = asyncio.run(
+        run(workers, update_stream(args.updates, args.users, seed=1), args.latency, restart=signal.SIGKILL)
+    )
+    print(f"\nведущий из {workers} убит посреди потока и запущен заново:")
+    print(f"{workers:>9} {rate:>8.0f} {count:>8} {twice:>7} {missing:>9}")
+    passed &= ok(count, twice, missing, args.updates)
+    if not passed:
+        sys.exit("есть потерянные или дважды обработанные обновления")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Выигрыш от параллельной обработки чатов при сохранении порядка в чате.
+
+Много пользователей жмут кнопки одновременно; сравнивается
+последовательная обработка (1) и ChatOrderedUpdateProcessor с разными
+пределами. Порядок проверяется по answerCallbackQuery: id запросов
+одного чата должны идти по возрастанию.
+
+    python -m benchmarks.bench_concurrency [--users 500] [--updates 3000]
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+
+from benchmarks.bench_ingress import run
+from benchmarks.updates import CALLBACKS, callback_update
+
+
+class OrderCheck:
+    """Считает нарушения порядка ответов внутри чата"""
+
+    def __init__(self, chat_of):
+        self.chat_of = chat_of
+        self.last = {}
+        self.violations = 0
+
+    def __call__(self, method, params):
+        if method != 'answerCallbackQuery':
+            return
+        query_id = int(params['callback_query_id'])
+        chat_id = self.chat_of[query_id]
+        if query_id < self.last.get(chat_id, 0):
+            self.violations += 1
+        self.last[chat_id] = query_id
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--updates', type=int, default=3000)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.02)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32, 128])
+    args = parser.parse_args()
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+
+    rng = random.Random(0)
+    updates = [
+        callback_update(rng.randint(1, args.users), rng.choice(CALLBACKS), update_id=i)
+        for i in range(1, args.updates + 1)
+    ]
+    chat_of = {u['update_id']: u['callback_query']['from']['id'] for u in updates}
+
+    print(f"{'потоков':>8} {'обн/с':>8} {'p50, мс':>8} {'p99, мс':>8} {'нарушений порядка':>18}")
+    baseline = None
+    for concurrency in args.concurrency:
+        check = OrderCheck(chat_of)
+        rate, p50, p99 = asyncio.run(run('polling', updates, args.latency, concurrency, listeners=[check]))
+        baseline = baseline or rate
+        print(f"{concurrency:>8} {rate:>8.0f} {p50 * 1000:>8.1f} {p99 * 1000:>8.1f} {check.violations:>18}"
+              f"   ×{rate / baseline:.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Подбор жестов по фасетам на большой базе.
+
+Сравниваются пересечение битовых множеств (FacetIndex) и проход по
+всем записям с проверкой полей — для всех сочетаний категории и
+сложности; отдельно меряются построение индекса и сверка с данными.
+
+    python -m benchmarks.bench_facets [--size 30000]
+"""
+
+import argparse
+import time
+
+from benchmarks.corpus import synthetic_corpus
+from facets import FacetIndex, resolve
+from gesture_store import normalize_key
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=int, default=30000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    records = {normalize_key(word): gesture for word, gesture in synthetic_corpus(args.size).items()}
+    keys = tuple(sorted(records))
+
+    started = time.perf_counter()
+    index = FacetIndex(keys, records)
+    build = time.perf_counter() - started
+    started = time.perf_counter()
+    index.check(records)
+    check = time.perf_counter() - started
+
+    choices = [(c, d) for c in range(len(index.values['category']) + 1)
+               for d in range(len(index.values['difficulty']) + 1)]
+    selections = [resolve(index, choice) for choice in choices]
+
+    def scan(selection):
+        return [key for key in keys
+                if all(value is None or records[key][facet] == value for facet, value in selection.items())]
+
+    def bitsets(selection):
+        return index.select(selection).bit_count()
+
+    for selection in selections:
+        assert bitsets(selection) == len(scan(selection)), selection
+
+    print(f"жестов {args.size}, сочетаний {len(selections)}")
+    print(f"построение индекса  {build * 1000:8.1f} мс")
+    print(f"сверка с данными    {check * 1000:8.1f} мс")
+    for name, query in (('проход по записям', scan), ('битовые множества', bitsets),
+                        ('номера жестов', lambda s: len(index.matches(s)))):
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            for selection in selections:
+                query(selection)
+        elapsed = (time.perf_counter() - started) / (args.repeat * len(selections))
+        print(f"{name:<19} {elapsed * 1e6:8.1f} мкс на запрос")
+
+
+if __name__ == '__main__':
+    main()
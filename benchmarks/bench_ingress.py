@@ -0,0 +1,129 @@
+"""
+Polling против вебхука на локальной заглушке Bot API.
+
+Обновления подаются через getUpdates или POST на вебхук, задержка
+считается от подачи обновления до ответа бота (sendMessage/editMessageText).
+
+    python -m benchmarks.bench_ingress [--updates 2000] [--latency 0.02]
+"""
+
+import argparse
+import asyncio
+import logging
+import socket
+import time
+from collections import defaultdict, deque
+
+import bot
+from benchmarks.fake_bot_api import FakeBotAPI
+from benchmarks.updates import update_stream
+from rate_limiter import PriorityRateLimiter
+
+REPLY_METHODS = ('sendMessage', 'editMessageText')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def unlimited_rate_limiter():
+    """Ограничитель без реальных лимитов: заглушка их не проверяет"""
+    return PriorityRateLimiter(overall_rate=1e9, chat_rate=1e9, chat_burst=1e9, group_rate=1e9, group_burst=1e9)
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+class LatencyProbe:
+    """Сопоставляет ответы бота с поданными обновлениями (FIFO по чату)"""
+
+    def __init__(self, expected):
+        self.expected = expected
+        self.pending = defaultdict(deque)
+        self.latencies = []
+        self.done = asyncio.Event()
+
+    def injected(self, update):
+        chat_id = (update.get('message') or update['callback_query']['message'])['chat']['id']
+        self.pending[chat_id].append(time.perf_counter())
+
+    def __call__(self, method, params):
+        if method not in REPLY_METHODS:
+            return
+        queue = self.pending.get(params.get('chat_id'))
+        if queue:
+            self.latencies.append(time.perf_counter() - queue.popleft())
+            if len(self.latencies) == self.expected:
+                self.done.set()
+
+
+async def run(mode, updates, latency, concurrency, application_factory=None, listeners=()):
+    """Прогнать поток обновлений; возвращает (обновлений/с, p50, p99)"""
+    application_factory = application_factory or bot.build_application
+    async with FakeBotAPI(latency=latency) as api:
+        probe = LatencyProbe(len(updates))
+        api.listeners.append(probe)
+        api.listeners.extend(listeners)
+        application = application_factory(
+            api.token, base_url=api.base_url, concurrent_updates=concurrency,
+            rate_limiter=unlimited_rate_limiter(), antiflood=False
+        )
+        await application.initialize()
+
+        if mode == 'polling':
+            await application.updater.start_polling(poll_interval=0, timeout=1)
+        else:
+            port = free_port()
+            await application.updater.start_webhook(
+                listen='127.0.0.1', port=port, url_path='hook',
+                webhook_url=f'http://127.0.0.1:{port}/hook', secret_token='secret'
+            )
+        await application.start()
+
+        started = time.perf_counter()
+        if mode == 'polling':
+            for update in updates:
+                probe.injected(update)
+                api.push_update(update)
+        else:
+            connections = asyncio.Semaphore(40)
+
+            async def post(update):
+                async with connections:
+                    probe.injected(update)
+                    await api.post_update(update)
+
+            await asyncio.gather(*(post(update) for update in updates))
+        await asyncio.wait_for(probe.done.wait(), timeout=600)
+        elapsed = time.perf_counter() - started
+
+        await application.updater.stop()
+        await application.stop()
+        await application.shutdown()
+
+    return len(updates) / elapsed, percentile(probe.latencies, 0.5), percentile(probe.latencies, 0.99)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--updates', type=int, default=2000)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.02, help="задержка заглушки API, с")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 32])
+    args = parser.parse_args()
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+
+    print(f"{'режим':>8} {'потоков':>8} {'обн/с':>8} {'p50, мс':>8} {'p99, мс':>8}")
+    for concurrency in args.concurrency:
+        for mode in ('polling', 'webhook'):
+            updates = update_stream(args.updates, args.users)
+            rate, p50, p99 = asyncio.run(run(mode, updates, args.latency, concurrency))
+            print(f"{mode:>8} {concurrency:>8} {rate:>8.0f} {p50 * 1000:>8.1f} {p99 * 1000:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
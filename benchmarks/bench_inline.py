@@ -0,0 +1,100 @@
+"""
+Inline-режим под потоком нажатий клавиш.
+
+Пользователи набирают слова из базы по букве (паузы 80–350 мс), слова
+выбираются по закону Ципфа — популярные набирают чаще. Каждое нажатие
+это inline-запрос. Время моделируется: запрос, за которым через меньше
+чем DEBOUNCE следует нажатие того же пользователя, считается отсеянным,
+остальные обрабатываются настоящим InlineSearch. Для сравнения тот же
+поток прогоняется поиском без кэша.
+
+    python -m benchmarks.bench_inline [--size 30000] [--users 2000]
+"""
+
+import argparse
+import random
+import time
+
+from benchmarks.bench_ingress import percentile
+from benchmarks.corpus import synthetic_corpus
+from inline import DEBOUNCE, InlineSearch, gesture_article, query_key
+from search import SearchIndex
+
+
+def keystrokes(gestures, users, words_per_user, rng):
+    """[(момент, user_id, текст запроса)] по возрастанию времени"""
+    vocabulary = sorted({
+        word.lower()
+        for gesture in gestures.values()
+        for word in [gesture['main_meaning']] + [alt['word'] for alt in gesture['alternative_meanings']]
+    })
+    rng.shuffle(vocabulary)
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+
+    events = []
+    for user_id in range(1, users + 1):
+        moment = rng.uniform(0, 60)
+        for word in rng.choices(vocabulary, weights, k=words_per_user):
+            for end in range(1, len(word) + 1):
+                moment += rng.uniform(0.08, 0.35)
+                events.append((moment, user_id, word[:end]))
+            moment += rng.uniform(2, 20)
+    events.sort()
+    return events
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=int, default=30000)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--words', type=int, default=5, help="слов на пользователя")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    gestures = synthetic_corpus(args.size)
+    index = SearchIndex(gestures)
+
+    def render(key):
+        gesture = gestures[key]
+        return gesture_article(key, gesture['main_meaning'], gesture['gesture_name'], gesture['description'][:100])
+
+    events = keystrokes(gestures, args.users, args.words, rng)
+    # следующее нажатие того же пользователя
+    next_at = {}
+    following = [None] * len(events)
+    for i in range(len(events) - 1, -1, -1):
+        moment, user_id, _ = events[i]
+        following[i] = next_at.get(user_id)
+        next_at[user_id] = moment
+
+    inline = InlineSearch(index, render)
+    latencies = []
+    for i, (moment, user_id, text) in enumerate(events):
+        started = time.perf_counter()
+        key = query_key(text)
+        if inline.cached(key) is None:
+            if following[i] is not None and following[i] - moment < DEBOUNCE:
+                inline.skipped += 1
+                continue
+            inline.results(text, key)
+        latencies.append(time.perf_counter() - started)
+
+    uncached = []
+    for _, _, text in events[:5000]:
+        started = time.perf_counter()
+        [render(key) for key, _ in index.search(text, limit=20)]
+        uncached.append(time.perf_counter() - started)
+
+    total = len(events)
+    print(f"запросов {total}, пользователей {args.users}, жестов {args.size}")
+    print(f"из кэша {inline.hits / total:.1%}, поиском {inline.misses / total:.1%}, "
+          f"отсеяно {inline.skipped / total:.1%}")
+    print(f"{'':>12} {'p50, мкс':>9} {'p99, мкс':>9} {'всего, с':>9}")
+    for name, values in (('с кэшем', latencies), ('без кэша', uncached)):
+        scale = total / len(values) if name == 'без кэша' else 1
+        print(f"{name:>12} {percentile(values, 0.5) * 1e6:>9.0f} {percentile(values, 0.99) * 1e6:>9.0f} "
+              f"{sum(values) * scale:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
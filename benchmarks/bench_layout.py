@@ -0,0 +1,158 @@
+"""
+Длинные описания и повторные нажатия.
+
+Первая часть — отрисовка с разбиением на страницы: синтетическая база,
+где у жестов в --alternatives раз больше других значений, собирается
+заново, и для неё считается, сколько сообщений не влезло бы в лимит
+Telegram одним куском, сколько у них страниц и во что обходится
+отрисовка жеста.
+
+Вторая — правки без лишних запросов: пользователи нажимают кнопки
+меню (слово дня, категории, помощь, в меню), часто повторяя последнее
+нажатие. Сообщение в нажатии — то, что бот показал в прошлый раз, как
+его прислал бы Telegram: видимый текст и entities разметки. Считается, сколько editMessageText не
+понадобилось и сколько байт не ушло.
+
+    python -m benchmarks.bench_layout [--size 2000] [--alternatives 12] [--clicks 20000]
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from html.parser import HTMLParser
+
+from telegram import Message, MessageEntity
+
+import bot
+import router
+from benchmarks.corpus import synthetic_corpus
+from gesture_store import normalize_key
+from layout import MESSAGE_LIMIT, Editor, utf16_len, visible_len
+from render_cache import RenderCache, Variant
+
+BUTTONS = (router.WORD_OF_DAY, router.CATEGORIES, router.HELP, router.BACK)
+
+
+def render_long(size, alternatives):
+    corpus = {normalize_key(word): gesture for word, gesture in synthetic_corpus(size).items()}
+    for gesture in corpus.values():
+        gesture['alternative_meanings'] = gesture['alternative_meanings'] * alternatives
+    # format_gesture_full читает жесты из bot.GESTURES_DB
+    bot.GESTURES_DB = corpus
+    cache = RenderCache((), {'full': Variant(bot.format_gesture_full, bot.GESTURE_KEYBOARD)})
+    started = time.perf_counter()
+    pages = [cache.get(key).pages for key in corpus]
+    elapsed = time.perf_counter() - started
+    too_long = sum(1 for key in corpus if visible_len(''.join(bot.format_gesture_full(key))) > MESSAGE_LIMIT)
+    split = [p for p in pages if len(p) > 1]
+    print(f"жестов {size}, других значений ×{alternatives}")
+    print(f"длиннее {MESSAGE_LIMIT} знаков одним куском   {too_long}")
+    print(f"разбито на страницы                {len(split)}, до {max(map(len, pages))} страниц")
+    print(f"самая длинная страница             {max(visible_len(page) for p in pages for page in p)} знаков")
+    print(f"отрисовка                          {elapsed / size * 1e6:.1f} мкс на жест")
+
+
+class TelegramHTML(HTMLParser):
+    """Разбор HTML-текста на текст и entities, как при parse_mode='HTML'"""
+
+    TYPES = {
+        'b': MessageEntity.BOLD, 'i': MessageEntity.ITALIC, 'u': MessageEntity.UNDERLINE,
+        's': MessageEntity.STRIKETHROUGH, 'code': MessageEntity.CODE, 'pre': MessageEntity.PRE,
+    }
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.text = ''
+        self.entities = []
+        self._open = []
+
+    def handle_starttag(self, tag, attrs):
+        self._open.append((tag, utf16_len(self.text)))
+
+    def handle_endtag(self, tag):
+        tag, offset = self._open.pop()
+        length = utf16_len(self.text) - offset
+        if length and tag in self.TYPES:
+            self.entities.append((self.TYPES[tag], offset, length))
+
+    def handle_data(self, data):
+        self.text += data
+
+
+def shown_message(text, reply_markup=None):
+    """Сообщение, которое Telegram пришлёт в нажатии после отправки text"""
+    parser = TelegramHTML()
+    parser.feed(text)
+    parser.close()
+    # пробелы по краям Telegram обрезает, entities сдвигаются вместе с текстом
+    shift = utf16_len(parser.text) - utf16_len(parser.text.lstrip())
+    plain = parser.text.strip()
+    end = utf16_len(plain)
+    entities = []
+    for kind, offset, length in parser.entities:
+        start, stop = max(offset - shift, 0), min(offset - shift + length, end)
+        if stop > start:
+            entities.append(MessageEntity(kind, start, stop - start))
+    return Message(1, None, None, text=plain, entities=entities, reply_markup=reply_markup)
+
+
+class Query:
+    """Нажатие под сообщением: message — то, что бот показал в нём последним"""
+
+    def __init__(self, message):
+        self.message = message
+        self.sent = None
+
+    async def edit_message_text(self, text, reply_markup=None, parse_mode=None):
+        self.sent = (text, reply_markup)
+
+
+def page_of(button):
+    if button == router.WORD_OF_DAY:
+        return bot.gesture_message(bot.get_word_of_day(), 'word_of_day')
+    if button == router.CATEGORIES:
+        return bot.categories_page(bot.CATALOG, 0)
+    if button == router.HELP:
+        return bot.help_text(), bot.BACK_KEYBOARD
+    return bot.format_main_menu('Тест'), bot.MAIN_KEYBOARD
+
+
+async def navigate(clicks, repeat):
+    rng = random.Random(0)
+    editor = Editor()
+    shown = {}          # пользователь -> (текст, клавиатура)
+    last = {}
+    for _ in range(clicks):
+        user = rng.randint(1, 200)
+        button = last.get(user) if user in last and rng.random() < repeat else rng.choice(BUTTONS)
+        last[user] = button
+        text, reply_markup = shown.get(user, ('menu', None))
+        query = Query(shown_message(text, reply_markup))
+        page = page_of(button)
+        await editor.edit(query, *page)
+        if query.sent:
+            shown[user] = query.sent
+    return editor.metrics()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=int, default=2000)
+    parser.add_argument('--alternatives', type=int, default=12)
+    parser.add_argument('--clicks', type=int, default=20000)
+    parser.add_argument('--repeat', type=float, default=0.3, help="доля повторных нажатий той же кнопки")
+    args = parser.parse_args()
+
+    stats = asyncio.run(navigate(args.clicks, args.repeat))
+    total = stats['edits'] + stats['skipped']
+    print(f"нажатий {total}, повторных ~{args.repeat:.0%}")
+    print(f"editMessageText отправлено     {stats['edits']}")
+    print(f"не понадобилось               {stats['skipped']} ({stats['skipped'] / total:.0%}), "
+          f"{stats['saved_bytes'] / 1024:.0f} КБ")
+    print()
+    render_long(args.size, args.alternatives)
+
+
+if __name__ == '__main__':
+    main()
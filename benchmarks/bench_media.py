@@ -0,0 +1,91 @@
+"""
+Ролики жестов на заглушке Bot API: прогрев каталога и отправка.
+
+Вместо настоящих роликов — файлы случайных байтов нужного размера
+(перекодирование ffmpeg здесь не меряется). Сравниваются:
+прогрев с разным числом одновременных загрузок, повторный прогрев
+(всё уже загружено) и отправка жестов по file_id против загрузки файла
+при каждой отправке.
+
+    python -m benchmarks.bench_media [--clips 200] [--size-kb 400]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import tempfile
+import time
+
+from telegram import Bot
+from telegram.request import HTTPXRequest
+
+from benchmarks.fake_bot_api import FakeBotAPI
+from media import VARIANTS, MediaLibrary, MediaStore, variant_path
+
+
+def make_clips(media_dir, count, size, rng):
+    keys = [f'жест{i}' for i in range(count)]
+    for key in keys:
+        for variant in VARIANTS:
+            path = variant_path(media_dir, variant, key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(rng.randbytes(size if variant == 'animation' else size // 3))
+    return keys
+
+
+async def run(args, tmp):
+    rng = random.Random(0)
+    media_dir = os.path.join(tmp, 'media')
+    keys = make_clips(media_dir, args.clips, args.size_kb * 1024, rng)
+    request = HTTPXRequest(connection_pool_size=64, pool_timeout=60, write_timeout=60)
+
+    async with FakeBotAPI(latency=args.latency) as api, Bot(api.token, base_url=api.base_url, request=request) as bot:
+        print(f"{'прогрев':>24} {'загрузок':>9} {'время, с':>9}")
+        for concurrency in args.concurrency:
+            store = MediaStore(os.path.join(tmp, f'media-{concurrency}.db'))
+            library = MediaLibrary(store, media_dir, upload_chat_id=-100, concurrency=concurrency)
+            before = api.uploads
+            started = time.perf_counter()
+            stats = await library.warm_up(bot, keys)
+            print(f"{f'по {concurrency} сразу':>24} {api.uploads - before:>9} {time.perf_counter() - started:>9.2f}")
+            assert stats.uploaded == len(keys) * len(VARIANTS), stats
+
+        before = api.uploads
+        started = time.perf_counter()
+        stats = await library.warm_up(bot, keys)
+        print(f"{'повторно':>24} {api.uploads - before:>9} {time.perf_counter() - started:>9.2f}   ({stats})")
+
+        sends = [rng.choice(keys) for _ in range(args.sends)]
+        print(f"\n{'отправка':>24} {'МБ':>9} {'время, с':>9}")
+        for name in ('по file_id', 'загрузкой каждый раз'):
+            if name != 'по file_id':
+                library = MediaLibrary(MediaStore(':memory:'), media_dir)
+            uploaded = api.uploaded_bytes
+            started = time.perf_counter()
+            for i, key in enumerate(sends):
+                if name != 'по file_id':
+                    library.store.forget(key)
+                await library.send(bot, 1000 + i, key)
+            elapsed = time.perf_counter() - started
+            print(f"{name:>24} {(api.uploaded_bytes - uploaded) / 2 ** 20:>9.1f} {elapsed:>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clips', type=int, default=200)
+    parser.add_argument('--size-kb', type=int, default=400)
+    parser.add_argument('--sends', type=int, default=300)
+    parser.add_argument('--latency', type=float, default=0.05, help="задержка заглушки API, с")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8])
+    args = parser.parse_args()
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(run(args, tmp))
+
+
+if __name__ == '__main__':
+    main()
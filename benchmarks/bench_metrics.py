@@ -0,0 +1,98 @@
+"""
+Накладные расходы замеров обработчиков (metrics.py).
+
+Сначала пустой обработчик вызывается напрямую и через обёртку Metrics —
+это цена замера одного вызова. Затем поток обновлений прогоняется через
+бота на заглушке Bot API (как в bench_ingress) без замеров и с ними, по
+нескольку раз вперемешку. В конце — разбивка времени обработчиков из
+/metrics: собственные вычисления, очередь ограничителя, ответ API.
+
+    python -m benchmarks.bench_metrics [--updates 2000] [--rounds 3]
+"""
+
+import argparse
+import asyncio
+import logging
+import re
+import statistics
+import time
+from collections import defaultdict
+
+import bot
+from benchmarks.bench_ingress import run
+from benchmarks.updates import update_stream
+from metrics import Metrics
+
+
+async def handler(update, context):
+    return None
+
+
+async def call_overhead(calls):
+    wrapped = Metrics().wrap('handler', handler)
+    timings = {}
+    for name, callback in (('напрямую', handler), ('с замером', wrapped)):
+        started = time.perf_counter()
+        for _ in range(calls):
+            await callback(None, None)
+        timings[name] = (time.perf_counter() - started) / calls
+    return timings
+
+
+def breakdown(text):
+    """{обработчик: {часть: (сумма, число)}} из текста /metrics"""
+    parts = defaultdict(dict)
+    for name, part, handler, value in re.findall(
+            r'^bot_handler_(?:(\w+)_)?seconds_(sum|count)\{handler="([^"]+)"\} (\S+)$', text, re.M):
+        parts[handler].setdefault(name or 'total', {})[part] = float(value)
+    return parts
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--updates', type=int, default=2000)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.02, help="задержка заглушки API, с")
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--calls', type=int, default=200000)
+    args = parser.parse_args()
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+    logging.getLogger('bot').setLevel(logging.WARNING)
+
+    timings = asyncio.run(call_overhead(args.calls))
+    for name, seconds in timings.items():
+        print(f"пустой обработчик {name:<10} {seconds * 1e6:6.2f} мкс")
+    print(f"цена замера              {(timings['с замером'] - timings['напрямую']) * 1e6:6.2f} мкс на вызов\n")
+
+    applications = []
+
+    def factory(*factory_args, instrument, **kwargs):
+        application = bot.build_application(*factory_args, instrument=instrument, **kwargs)
+        applications.append(application)
+        return application
+
+    rates = defaultdict(list)
+    for _ in range(args.rounds):
+        for instrument in (False, True):
+            updates = update_stream(args.updates, args.users)
+            rate, _, _ = asyncio.run(run(
+                'webhook', updates, args.latency, args.concurrency,
+                application_factory=lambda *a, **kw: factory(*a, instrument=instrument, **kw)
+            ))
+            rates[instrument].append(rate)
+    plain, measured = statistics.median(rates[False]), statistics.median(rates[True])
+    print(f"без замеров  {plain:8.0f} обн/с")
+    print(f"с замерами   {measured:8.0f} обн/с  ({(measured / plain - 1) * 100:+.1f}%)\n")
+
+    text = applications[-1].bot_data['metrics'].render()
+    print(f"{'обработчик':<28} {'вызовов':>8} {'всего, мс':>10} {'код, мс':>8} {'очередь':>8} {'API, мс':>8}")
+    for name, parts in sorted(breakdown(text).items()):
+        count = parts['total']['count']
+        mean = {part: values['sum'] / count * 1000 for part, values in parts.items()}
+        print(f"{name:<28} {count:>8.0f} {mean['total']:>10.2f} {mean['compute']:>8.2f} "
+              f"{mean['limiter']:>8.2f} {mean['api']:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
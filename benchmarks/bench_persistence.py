@@ -0,0 +1,77 @@
+"""
+Пропускная способность бота с сохранением данных пользователей и без.
+
+Сравниваются хранилище в памяти («без сохранения»), SQLite с записью
+на каждое изменение и SQLite с отложенной пакетной записью: сначала
+сами операции хранилища, затем бот целиком на заглушке Bot API.
+
+    python -m benchmarks.bench_persistence [--updates 3000] [--users 500]
+"""
+
+import argparse
+import asyncio
+import functools
+import logging
+import os
+import random
+import tempfile
+import time
+
+import bot
+from benchmarks.bench_ingress import run
+from benchmarks.updates import update_stream
+from storage import MemoryBackend, SQLiteBackend, UserStore
+
+
+def store_ops(users, count, user_count):
+    """Просмотры жестов напрямую через хранилище; возвращает операций/с"""
+    rng = random.Random(0)
+    started = time.perf_counter()
+    for i in range(count):
+        user_id = rng.randint(1, user_count)
+        history = users.get(user_id).setdefault('history', [])
+        history.append(f'gesture{i}')
+        del history[:-bot.HISTORY_SIZE]
+        users.mark_dirty(user_id)
+        if i % 1000 == 999:
+            users.flush()       # как задача flush_users раз в интервал
+    users.flush()
+    return count / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--updates', type=int, default=3000)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.0, help="задержка заглушки API, с")
+    parser.add_argument('--concurrency', type=int, default=32)
+    args = parser.parse_args()
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+    logging.getLogger('apscheduler').setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        configs = (
+            ('память', lambda: UserStore(MemoryBackend())),
+            ('SQLite, сразу', lambda: UserStore(SQLiteBackend(os.path.join(tmp, 'sync.db')), write_behind=False)),
+            ('SQLite, пакетами', lambda: UserStore(SQLiteBackend(os.path.join(tmp, 'batch.db')))),
+        )
+        print(f"{'хранилище':>18} {'операций/с':>11} {'транзакций':>11}")
+        for name, make_store in configs:
+            users = make_store()
+            rate = store_ops(users, args.updates * 10, args.users)
+            print(f"{name:>18} {rate:>11.0f} {users.backend.writes:>11}")
+            users.close()
+
+        print(f"\n{'хранилище':>18} {'обн/с':>8} {'p99, мс':>8} {'транзакций':>11}")
+        for name, make_store in configs:
+            users = make_store()
+            factory = functools.partial(
+                bot.build_application, db_path=os.path.join(tmp, 'subscribers.db'), users=users
+            )
+            updates = update_stream(args.updates, args.users)
+            rate, _, p99 = asyncio.run(run('polling', updates, args.latency, args.concurrency, factory))
+            print(f"{name:>18} {rate:>8.0f} {p99 * 1000:>8.1f} {users.backend.writes:>11}")
+
+
+if __name__ == '__main__':
+    main()
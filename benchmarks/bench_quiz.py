@@ -0,0 +1,82 @@
+"""
+Тренировка на большой аудитории: выбор карточки, ответ и выборка
+«кому пора повторять» при миллионах карточек.
+
+Сначала база заполняется учениками с историей повторений (сроки
+разбросаны на месяц вперёд и назад), затем меряется задержка операций.
+
+    python -m benchmarks.bench_quiz [--learners 50000] [--cards 40]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.bench_ingress import percentile
+from benchmarks.corpus import synthetic_corpus
+from quiz import DAY, Card, Quiz, QuizStore
+
+
+def timed(func, calls):
+    latencies = []
+    for args in calls:
+        started = time.perf_counter()
+        func(*args)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--learners', type=int, default=50000)
+    parser.add_argument('--cards', type=int, default=40, help="карточек у ученика")
+    parser.add_argument('--corpus', type=int, default=5000)
+    parser.add_argument('--number', type=int, default=5000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    gestures = synthetic_corpus(args.corpus)
+    categories = {}
+    for key, record in gestures.items():
+        categories.setdefault(record['category'], []).append(key)
+    keys = sorted(gestures)
+    quiz = Quiz(gestures, categories, rng)
+    now = time.time()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = QuizStore(os.path.join(tmp, 'quiz.db'))
+        started = time.perf_counter()
+        batch = []
+        for user_id in range(1, args.learners + 1):
+            for gesture in rng.sample(keys, args.cards):
+                interval = rng.choice((1.0, 6.0, 15.0, 30.0))
+                due = int(now + rng.uniform(-30, 30) * DAY)
+                batch.append((user_id, gesture, Card(2.5, interval, 2, due)))
+            if len(batch) >= 100000:
+                store.save_many(batch)
+                batch.clear()
+        store.save_many(batch)
+        rows = args.learners * args.cards
+        print(f"карточек {rows}, учеников {args.learners}: заполнено за {time.perf_counter() - started:.1f} с, "
+              f"файл {os.path.getsize(store.path) / 2 ** 20:.0f} МБ")
+
+        users = [(rng.randint(1, args.learners),) for _ in range(args.number)]
+        results = {
+            'следующая карточка': timed(lambda user_id: quiz.next_card(store, user_id, now), users),
+            'вопрос + ответ': timed(
+                lambda user_id: quiz.answer(store, user_id, quiz.question(quiz.next_card(store, user_id, now)).gesture,
+                                            rng.random() < 0.8, now),
+                users
+            ),
+            'кому пора (1000)': timed(lambda: store.due_learners(now, 1000), [()] * 200),
+        }
+        print(f"{'операция':>20} {'p50, мкс':>9} {'p99, мкс':>9}")
+        for name, latencies in results.items():
+            print(f"{name:>20} {percentile(latencies, 0.5) * 1e6:>9.0f} {percentile(latencies, 0.99) * 1e6:>9.0f}")
+        store.close()
+
+
+if __name__ == '__main__':
+    main()
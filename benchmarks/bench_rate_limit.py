@@ -0,0 +1,98 @@
+"""
+Исходящий ограничитель против заглушки, которая сама отвечает 429.
+
+Пользователи жмут кнопки, параллельно идёт рассылка. Без ограничителя
+часть запросов упирается в лимиты и падает с RetryAfter; с ним 429 почти
+не бывает, интерактивные ответы обгоняют рассылку, а повторные правки
+одного сообщения склеиваются.
+
+    python -m benchmarks.bench_rate_limit [--broadcast 300]
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+import time
+
+from telegram import Bot
+from telegram.error import RetryAfter
+from telegram.ext import ExtBot
+from telegram.request import HTTPXRequest
+
+from benchmarks.bench_ingress import percentile
+from benchmarks.fake_bot_api import FakeBotAPI, Limits
+from rate_limiter import BROADCAST, PriorityRateLimiter
+
+
+async def scenario(api, bot, users, clicks, broadcast):
+    """Клики пользователей (правка одного сообщения) + рассылка"""
+    rng = random.Random(0)
+    interactive, background, failures = [], [], 0
+
+    async def timed(latencies, coroutine):
+        nonlocal failures
+        started = time.perf_counter()
+        try:
+            await coroutine
+        except RetryAfter:
+            failures += 1
+        else:
+            latencies.append(time.perf_counter() - started)
+
+    async def user(chat_id):
+        # пользователь жмёт быстрее, чем приходят ответы
+        pending = []
+        for _ in range(clicks):
+            await asyncio.sleep(rng.uniform(0.05, 0.3))
+            pending.append(asyncio.ensure_future(
+                timed(interactive, bot.edit_message_text('…', chat_id=chat_id, message_id=1))
+            ))
+        await asyncio.gather(*pending)
+
+    kwargs = {'rate_limit_args': BROADCAST} if isinstance(bot, ExtBot) else {}
+    tasks = [user(chat_id) for chat_id in range(1, users + 1)]
+    tasks += [timed(background, bot.send_message(10_000 + i, 'Слово дня', **kwargs)) for i in range(broadcast)]
+    started = time.perf_counter()
+    await asyncio.gather(*tasks)
+    return time.perf_counter() - started, interactive, background, failures
+
+
+async def run(limited, scale, users, clicks, broadcast):
+    limits = Limits(overall_rate=30 * scale, chat_rate=1 * scale, chat_burst=3)
+    request = HTTPXRequest(connection_pool_size=256, pool_timeout=60)
+    async with FakeBotAPI(latency=0.01, limits=limits) as api:
+        if limited:
+            limiter = PriorityRateLimiter(overall_rate=30 * scale, chat_rate=1 * scale, chat_burst=3)
+            bot = ExtBot(api.token, base_url=api.base_url, rate_limiter=limiter, request=request)
+        else:
+            limiter = None
+            bot = Bot(api.token, base_url=api.base_url, request=request)
+        async with bot:
+            elapsed, interactive, background, failures = await scenario(api, bot, users, clicks, broadcast)
+        return elapsed, interactive, background, failures, api.rejected, limiter
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', type=float, default=1, help="во сколько раз поднять лимиты Telegram")
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--clicks', type=int, default=10)
+    parser.add_argument('--broadcast', type=int, default=300)
+    args = parser.parse_args()
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+
+    print(f"{'':>16} {'время, с':>9} {'429':>6} {'ошибок':>7} {'клик p50/p99, мс':>18} "
+          f"{'рассылка p99, с':>16} {'склеено':>8}")
+    for limited in (False, True):
+        elapsed, interactive, background, failures, rejected, limiter = asyncio.run(
+            run(limited, args.scale, args.users, args.clicks, args.broadcast)
+        )
+        name = 'с ограничителем' if limited else 'без него'
+        clicks = f"{percentile(interactive, 0.5) * 1000:.0f}/{percentile(interactive, 0.99) * 1000:.0f}"
+        print(f"{name:>16} {elapsed:>9.1f} {rejected:>6} {failures:>7} {clicks:>18} "
+              f"{percentile(background, 0.99):>16.2f} {limiter.coalesced if limiter else 0:>8}")
+
+
+if __name__ == '__main__':
+    main()
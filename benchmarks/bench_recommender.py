@@ -0,0 +1,73 @@
+"""
+Рекомендации «Случайного жеста» на большой базе.
+
+Меряются построение таблицы похожих жестов (при сборке снимка), время
+одной рекомендации и размер того, что рекомендатель хранит о
+пользователе (поля seen и struggling записи), — для пользователей,
+просмотревших разное число жестов. Для сравнения — плотное битовое
+множество просмотренных на всю базу.
+
+    python -m benchmarks.bench_recommender [--size 30000]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from benchmarks.corpus import synthetic_corpus
+from facets import FacetIndex
+from gesture_store import normalize_key
+from recommender import GestureNumbers, Recommender, Similarity
+
+
+def simulated_user(recommender, rng, views, mistakes):
+    """Запись пользователя, который посмотрел views жестов и ошибся на mistakes"""
+    record = {'history': []}
+    for _ in range(views):
+        key = recommender.recommend(record)
+        record['history'] = (record['history'] + [key])[-50:]
+        recommender.viewed(record, key)
+    for key in rng.sample(record['history'], min(mistakes, len(record['history']))):
+        recommender.answered(record, key, False)
+    return record
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=int, default=30000)
+    parser.add_argument('--repeat', type=int, default=2000)
+    args = parser.parse_args()
+
+    records = {normalize_key(word): gesture for word, gesture in synthetic_corpus(args.size).items()}
+    keys = tuple(sorted(records))
+    facets = FacetIndex(keys, records)
+
+    started = time.perf_counter()
+    similarity = Similarity(keys, records)
+    build = time.perf_counter() - started
+    print(f"жестов {args.size}")
+    print(f"таблица похожих     {build * 1000:8.1f} мс, {similarity.metrics()['table_bytes'] // 1024} КБ")
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        numbers = GestureNumbers(os.path.join(tmp, 'bench.db'))
+        recommender = Recommender(keys, similarity, facets, numbers, rng=rng)
+        print(f"\n{'просмотрено':>11} {'мкс на рекомендацию':>20} {'байт на пользователя':>21}")
+        for views in (0, 10, 100, 1000):
+            record = simulated_user(recommender, rng, views, mistakes=min(views, 5))
+            timings = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                recommender.recommend(record)
+                timings.append(time.perf_counter() - started)
+            stored = sum(len(record.get(field, '')) for field in ('seen', 'struggling'))
+            print(f"{views:>11} {statistics.median(timings) * 1e6:>20.1f} {stored:>21}")
+        numbers.close()
+    print(f"\nплотное битовое множество на всю базу: {(args.size + 7) // 8} байт на пользователя")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Горячая перезагрузка большой базы: правка нескольких жестов.
+
+Меряется фоновая сборка снимка (чтение, проверка, компиляция, копия и
+дообновление индекса, каталог) против сборки всего с нуля, а также пауза
+подмены: то, что делается в потоке обработчиков (кэш сообщений только
+для изменённых жестов, тренировка, календарь).
+
+    python -m benchmarks.bench_reload [--size 30000] [--edits 10]
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.corpus import synthetic_corpus
+from corpus import CorpusWatcher, initial_snapshot
+from gesture_store import compile_corpus, GestureStore
+from quiz import Quiz
+from render_cache import RenderCache, Variant
+from wordofday import WordCalendar
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=int, default=30000)
+    parser.add_argument('--edits', type=int, default=10)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    raw = synthetic_corpus(args.size)
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, 'gestures.json')
+        compiled = os.path.join(tmp, 'gestures.bin')
+        with open(source, 'w', encoding='utf-8') as f:
+            json.dump(raw, f, ensure_ascii=False)
+
+        started = time.perf_counter()
+        compile_corpus(raw, compiled)
+        snapshot = initial_snapshot(GestureStore(compiled))
+        full = time.perf_counter() - started
+
+        gestures = snapshot.gestures
+        render = RenderCache(gestures, {
+            'full': Variant(lambda key: f"<b>{gestures[key]['main_meaning']}</b>\n{gestures[key]['description']}"),
+            'short': Variant(lambda key: gestures[key]['main_meaning']),
+        })
+
+        for key in rng.sample(sorted(raw), args.edits):
+            raw[key] = dict(raw[key], description=raw[key]['description'] + ' (исправлено)')
+        raw['новый жест'] = dict(next(iter(raw.values())), main_meaning='НОВЫЙ ЖЕСТ')
+        time.sleep(0.01)
+        with open(source, 'w', encoding='utf-8') as f:
+            json.dump(raw, f, ensure_ascii=False)
+
+        watcher = CorpusWatcher(source, compiled)
+        watcher._mtime = None
+        new = watcher.build(snapshot)
+
+        started = time.perf_counter()
+        gestures = new.gestures
+        render.invalidate(new.changed, new.removed)
+        Quiz(new.gestures, new.categories, keys=new.keys)
+        WordCalendar(new.keys)
+        swap = time.perf_counter() - started
+
+        assert new.search.search('новый жест')[0][0] == 'новый жест'
+        print(f"жестов {args.size}, изменено {len(new.changed)}, удалено {len(new.removed)}")
+        print(f"сборка с нуля          {full:8.3f} с")
+        print(f"фоновая сборка снимка  {watcher.last_build_seconds:8.3f} с")
+        print(f"пауза подмены          {swap * 1000:8.1f} мс")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+"""
+Сравнение кэша сообщений с прямым вызовом format_gesture_full.
+
+    python -m benchmarks.bench_render_cache
+"""
+
+import timeit
+
+import bot
+
+
+def main(number=20000):
+    keys = list(bot.GESTURES_DB.keys())
+    for key in keys:
+        assert bot.RENDER_CACHE.text(key) == ''.join(bot.format_gesture_full(key))
+
+    def formatter():
+        for key in keys:
+            bot.format_word_of_day(key)
+
+    def cached():
+        for key in keys:
+            bot.RENDER_CACHE.get(key, 'word_of_day')
+
+    calls = number * len(keys)
+    for name, func in (('format_gesture_full', formatter), ('RenderCache.get', cached)):
+        seconds = min(timeit.repeat(func, number=number, repeat=3))
+        print(f"{name:22} {seconds / calls * 1e6:8.3f} мкс/вызов")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Выбор обработчика кнопки: цепочка if/elif против таблицы Router.
+
+Цепочка строится так же, как был устроен button_handler: сравнения
+query.data с именами действий и startswith для действий с аргументами,
+в порядке объявления. Нажатия распределены по действиям равномерно,
+поэтому в среднем цепочка проходит половину сравнений. Отдельно
+показаны длина callback_data кнопки жеста (старая «gesture_<ключ>» и
+упакованная) и стоимость упаковки/распаковки. Router помнит
+расшифровку повторяющихся callback_data, как и бывает с кнопками меню.
+
+    python -m benchmarks.bench_router [--actions 10 50 200]
+"""
+
+import argparse
+import random
+import time
+
+from router import GestureIds, Router, decode, encode
+
+
+def if_chain(count):
+    """Функция выбора обработчика цепочкой сравнений, как в старом button_handler"""
+    lines = ['def dispatch(data):']
+    for i in range(count):
+        keyword = 'if' if i == 0 else 'elif'
+        if i % 2:
+            lines.append(f"    {keyword} data.startswith('act{i}:'):\n        return {i}, data.split(':')[1:]")
+        else:
+            lines.append(f"    {keyword} data == 'act{i}':\n        return {i}, ()")
+    lines.append('    return None')
+    namespace = {}
+    exec('\n'.join(lines), namespace)
+    return namespace['dispatch'], [f'act{i}:7:3' if i % 2 else f'act{i}' for i in range(count)]
+
+
+def table(count):
+    ids = GestureIds()
+    ids.publish(tuple(f'жест{i:05}' for i in range(30000)))
+    router = Router(None, ids)
+    for i in range(count):
+        router.route(i, gesture=bool(i % 3 == 1))(lambda *args: None)
+    data = [encode(i, 7, 3, tag=ids.tag) for i in range(count)]
+    return router.resolve, data
+
+
+def measure(dispatch, data, presses):
+    started = time.perf_counter()
+    for i in presses:
+        if dispatch(data[i]) is None:
+            raise AssertionError(data[i])
+    return (time.perf_counter() - started) / len(presses)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--actions', type=int, nargs='+', default=[10, 50, 200])
+    parser.add_argument('--presses', type=int, default=200000)
+    args = parser.parse_args()
+    rng = random.Random(0)
+
+    print(f"{'действий':>9} {'if/elif, мкс':>13} {'Router, мкс':>12}")
+    for count in args.actions:
+        presses = [rng.randrange(count) for _ in range(args.presses)]
+        chain = measure(*if_chain(count), presses)
+        routed = measure(*table(count), presses)
+        print(f"{count:>9} {chain * 1e6:>13.3f} {routed * 1e6:>12.3f}")
+
+    key = 'очень длинное название жеста'
+    legacy = f'gesture_{key}'.encode('utf-8')
+    packed = encode(4, 29999, tag=0xffff)
+    print(f"\ncallback_data кнопки жеста «{key}»: {len(legacy)} байт было, {len(packed)} байт стало")
+    started = time.perf_counter()
+    for i in range(args.presses):
+        decode.__wrapped__(encode(12, i % 1000, 2, 1, tag=0xffff))
+    print(f"упаковка + распаковка без кэша: {(time.perf_counter() - started) / args.presses * 1e6:.2f} мкс")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+"""
+Задержка поиска в зависимости от размера корпуса.
+
+    python -m benchmarks.bench_search
+"""
+
+import time
+
+from benchmarks.corpus import synthetic_corpus
+from search import SearchIndex
+
+QUERIES = ['привет', 'люблю', 'спосибо', 'благодарю', 'думаю', 'пажалуйста',
+           'не согласен', 'ок', 'здраствуй', 'рука к сердцу']
+
+
+def main(sizes=(100, 1000, 10000, 30000), rounds=200):
+    print(f"{'жестов':>8} {'сборка, с':>10} {'p50, мкс':>9} {'p99, мкс':>9}")
+    for size in sizes:
+        corpus = synthetic_corpus(size)
+        started = time.perf_counter()
+        index = SearchIndex(corpus)
+        build = time.perf_counter() - started
+
+        timings = []
+        for _ in range(rounds):
+            for query in QUERIES:
+                started = time.perf_counter()
+                index.search(query)
+                timings.append(time.perf_counter() - started)
+        timings.sort()
+        p50 = timings[len(timings) // 2] * 1e6
+        p99 = timings[int(len(timings) * 0.99)] * 1e6
+        print(f"{size:>8} {build:>10.2f} {p50:>9.1f} {p99:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
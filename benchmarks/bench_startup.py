@@ -0,0 +1,100 @@
+"""
+Старт бота: время от запуска процесса до первого обработанного обновления.
+
+Бот запускается отдельным процессом (python bot.py --polling) против
+локальной заглушки Bot API, в очереди getUpdates его уже ждёт /start;
+замеряется момент, когда заглушка получает ответ. Варианты: настоящая
+база, большая синтетическая база с готовым снимком индексов (после
+python corpus.py build) и она же без снимка, когда индексы строятся
+при старте.
+
+    python -m benchmarks.bench_startup [--size 30000] [--runs 3]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.corpus import SOURCE, synthetic_corpus
+from benchmarks.fake_bot_api import FakeBotAPI
+from benchmarks.updates import message_update
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+async def first_update(env):
+    """Секунды от запуска процесса бота до его ответа на /start"""
+    async with FakeBotAPI() as api:
+        replied = asyncio.Event()
+        api.listeners.append(lambda method, params: method == 'sendMessage' and replied.set())
+        api.push_update(message_update(1, '/start'))
+        env = dict(os.environ, BOT_TOKEN=api.token, TELEGRAM_API_URL=api.base_url, METRICS_PORT='0', **env)
+
+        started = time.perf_counter()
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, 'bot.py', '--polling', cwd=ROOT, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            await asyncio.wait_for(replied.wait(), timeout=600)
+            return time.perf_counter() - started
+        finally:
+            process.terminate()
+            await process.wait()
+
+
+def corpus_env(tmp, name, source):
+    return {
+        'GESTURES_SOURCE': source,
+        'GESTURES_COMPILED': os.path.join(tmp, f'{name}.bin'),
+        'GESTURES_SNAPSHOT': os.path.join(tmp, f'{name}.snapshot'),
+        'BOT_DB_PATH': os.path.join(tmp, f'{name}.db'),
+    }
+
+
+def build(env):
+    subprocess.run(
+        [sys.executable, 'corpus.py', 'build', env['GESTURES_SOURCE'], env['GESTURES_COMPILED'], env['GESTURES_SNAPSHOT']],
+        cwd=ROOT, check=True, stdout=subprocess.DEVNULL
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=int, default=30000)
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        big_source = os.path.join(tmp, 'big.json')
+        with open(big_source, 'w', encoding='utf-8') as f:
+            json.dump(synthetic_corpus(args.size), f, ensure_ascii=False)
+        small, big = corpus_env(tmp, 'small', SOURCE), corpus_env(tmp, 'big', big_source)
+        build(small)
+        build(big)
+
+        print(f"{'вариант':<32} {'до первого ответа, с':>21}")
+        cases = (
+            ('база из репозитория, снимок', small, False),
+            (f'{args.size} жестов, снимок', big, False),
+            (f'{args.size} жестов, без снимка', big, True),
+        )
+        for name, env, drop_snapshot in cases:
+            timings = []
+            for _ in range(args.runs):
+                if drop_snapshot and os.path.exists(env['GESTURES_SNAPSHOT']):
+                    os.remove(env['GESTURES_SNAPSHOT'])
+                timings.append(asyncio.run(first_update(env)))
+            print(f"{name:<32} {statistics.median(timings):>21.2f}")
+
+
+if __name__ == '__main__':
+    main()
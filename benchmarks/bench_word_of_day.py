@@ -0,0 +1,47 @@
+"""
+Слово дня: календарь на синтетической базе и покрытие цикла.
+
+Проверяет, что за цикл выпадает каждый жест ровно один раз, и меряет
+запрос «слово дня в поясе пользователя» при тысячах разных поясов.
+
+    python -m benchmarks.bench_word_of_day [--size 30000]
+"""
+
+import argparse
+import random
+import timeit
+from datetime import timedelta
+from zoneinfo import available_timezones
+
+from benchmarks.corpus import synthetic_corpus
+from wordofday import EPOCH, DayClock, WordCalendar, parse_timezone
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=int, default=30000)
+    parser.add_argument('--number', type=int, default=200000)
+    args = parser.parse_args()
+
+    keys = list(synthetic_corpus(args.size))
+    calendar = WordCalendar(keys)
+    for cycle in range(3):
+        start = EPOCH + timedelta(days=cycle * len(keys))
+        shown = {calendar.word_for(start + timedelta(days=day)) for day in range(len(keys))}
+        assert len(shown) == len(keys), "каждый жест должен выпасть за цикл ровно один раз"
+    print(f"жестов {len(keys)}: за каждый из 3 циклов показаны все")
+
+    zones = [parse_timezone(name) for name in sorted(available_timezones())]
+    requests = [random.choice(zones) for _ in range(args.number)]
+    clock = DayClock()
+
+    def lookup():
+        for tz in requests:
+            calendar.word_for(clock.today(tz))
+
+    seconds = min(timeit.repeat(lookup, number=1, repeat=3))
+    print(f"поясов {len(zones)}: {seconds / args.number * 1e6:.3f} мкс на запрос")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+"""Синтетический корпус жестов для бенчмарков"""
+
+import json
+import os
+import random
+
+SOURCE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'gestures.json')
+
+SYLLABLES = tuple(c + v for c in 'бвгджзклмнпрстфхцчшщ' for v in 'аеиоуыэюя')
+
+
+def load_real():
+    with open(SOURCE, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def fake_word(rng):
+    return ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+
+
+def synthetic_corpus(size, seed=0):
+    """Корпус из size жестов: настоящие + сгенерированные по их образцу"""
+    rng = random.Random(seed)
+    real = load_real()
+    templates = list(real.values())
+    corpus = dict(real)
+    while len(corpus) < size:
+        template = rng.choice(templates)
+        word = fake_word(rng)
+        if word in corpus:
+            continue
+        gesture = dict(template)
+        gesture['main_meaning'] = word.upper()
+        gesture['alternative_meanings'] = [
+            dict(alt, word=fake_word(rng).upper()) for alt in template['alternative_meanings']
+        ]
+        gesture['examples'] = [f"{example} {fake_word(rng)}" for example in template['examples']]
+        gesture['description'] = f"{template['description']} {' '.join(fake_word(rng) for _ in range(5))}"
+        corpus[word] = gesture
+    return corpus
@@ -0,0 +1,255 @@
+"""
+Заглушка Telegram Bot API для локальных нагрузочных тестов.
+
+Поднимает HTTP-сервер на asyncio, отвечает на методы бота правдоподобными
+объектами, раздаёт обновления через getUpdates и умеет сама отправлять
+их на вебхук. Каждое обращение к API записывается в calls. Загруженные
+файлы получают свои file_id, а отправка по известному file_id повторяет
+его, как настоящий Telegram.
+"""
+
+import asyncio
+import http
+import itertools
+import json
+import time
+from email.parser import BytesParser
+from urllib.parse import parse_qsl
+
+import httpx
+
+TOKEN = '123456:FAKE-TOKEN'
+
+# Методы, которые Telegram считает отправкой сообщения в чат
+LIMITED_METHODS = frozenset({
+    'sendMessage', 'editMessageText', 'editMessageCaption', 'editMessageReplyMarkup',
+    'sendAnimation', 'sendVideo', 'sendPhoto', 'sendDocument',
+})
+
+
+class Limits:
+    """Лимиты, которые заглушка проверяет сама: общий и на чат"""
+
+    def __init__(self, overall_rate=30.0, chat_rate=1.0, chat_burst=3, retry_after=1):
+        self.overall_rate = overall_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.retry_after = retry_after
+        self._overall = [overall_rate, time.monotonic()]
+        self._chats = {}
+
+    @staticmethod
+    def _take(bucket, rate, capacity, now):
+        tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+        if tokens < 1:
+            bucket[0] = tokens
+            return False
+        bucket[0] = tokens - 1
+        return True
+
+    def allow(self, chat_id):
+        now = time.monotonic()
+        # небольшой допуск на расхождение часов клиента и сервера
+        chat = self._chats.setdefault(chat_id, [self.chat_burst, now])
+        if not self._take(chat, self.chat_rate, self.chat_burst + 0.05, now):
+            return False
+        if not self._take(self._overall, self.overall_rate, self.overall_rate + 0.5, now):
+            chat[0] += 1
+            return False
+        return True
+
+
+def parse_body(headers, body):
+    """Параметры запроса PTB: form-urlencoded или multipart, значения — JSON"""
+    content_type = headers.get('content-type', '')
+    params = {}
+    if content_type.startswith('multipart/form-data'):
+        message = BytesParser().parsebytes(f'Content-Type: {content_type}\r\n\r\n'.encode() + body)
+        for part in message.get_payload():
+            name = part.get_param('name', header='content-disposition')
+            if part.get_filename():
+                params[name] = {'filename': part.get_filename(), 'size': len(part.get_payload(decode=True))}
+            else:
+                params[name] = part.get_payload(decode=True).decode('utf-8')
+    elif body:
+        params = dict(parse_qsl(body.decode('utf-8')))
+    for name, value in params.items():
+        if isinstance(value, str):
+            try:
+                params[name] = json.loads(value)
+            except ValueError:
+                pass
+    return params
+
+
+class FakeBotAPI:
+    """Локальный Bot API: записывает вызовы и отвечает успехом"""
+
+    def __init__(self, token=TOKEN, latency=0.0, host='127.0.0.1', port=0, limits=None):
+        self.token = token
+        self.latency = latency
+        self.limits = limits
+        self.rejected = 0
+        self.host = host
+        self.port = port
+        self.calls = []
+        self.webhook_url = None
+        self.webhook_secret = None
+        self._updates = []
+        self._updates_ready = asyncio.Event()
+        self._message_ids = itertools.count(1)
+        self._file_ids = itertools.count(1)
+        self.uploads = 0
+        self.uploaded_bytes = 0
+        self._server = None
+        self._client = None
+        self.listeners = []
+
+    @property
+    def base_url(self):
+        return f'http://{self.host}:{self.port}/bot'
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._client = httpx.AsyncClient(limits=httpx.Limits(max_connections=100))
+        return self
+
+    async def stop(self):
+        self._server.close()
+        await self._client.aclose()
+        self._updates_ready.set()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    # --- Обновления ---
+
+    def push_update(self, update):
+        """Положить обновление в очередь getUpdates"""
+        self._updates.append(update)
+        self._updates_ready.set()
+
+    async def post_update(self, update):
+        """Отправить обновление на вебхук, как это делает Telegram"""
+        headers = {}
+        if self.webhook_secret:
+            headers['X-Telegram-Bot-Api-Secret-Token'] = self.webhook_secret
+        response = await self._client.post(self.webhook_url, json=update, headers=headers)
+        response.raise_for_status()
+
+    async def _get_updates(self, params):
+        offset = params.get('offset') or 0
+        self._updates = [u for u in self._updates if u['update_id'] >= offset]
+        if not self._updates:
+            self._updates_ready.clear()
+            try:
+                await asyncio.wait_for(self._updates_ready.wait(), params.get('timeout') or 0)
+            except asyncio.TimeoutError:
+                pass
+        return self._updates[:params.get('limit') or 100]
+
+    # --- Методы бота ---
+
+    def _message(self, params):
+        message_id = params.get('message_id') or next(self._message_ids)
+        return {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': params.get('chat_id', 0), 'type': 'private'},
+            'text': params.get('text', ''),
+        }
+
+    def _media_message(self, kind, params):
+        value = params.get(kind)
+        if isinstance(value, dict):
+            # загрузка файла: выдаём новый file_id
+            self.uploads += 1
+            self.uploaded_bytes += value['size']
+            file_id = f'FAKE-FILE-{next(self._file_ids)}'
+        else:
+            file_id = value
+        message = self._message(params)
+        message[kind] = {
+            'file_id': file_id, 'file_unique_id': file_id.rsplit('-', 1)[-1],
+            'width': 480, 'height': 480, 'duration': 3,
+        }
+        return message
+
+    async def call(self, method, params):
+        """Выполнить метод API; возвращает (HTTP-статус, тело ответа)"""
+        if method == 'getUpdates':
+            return 200, {'ok': True, 'result': await self._get_updates(params)}
+
+        if self.limits and method in LIMITED_METHODS and not self.limits.allow(params.get('chat_id')):
+            self.rejected += 1
+            return 429, {
+                'ok': False,
+                'error_code': 429,
+                'description': f'Too Many Requests: retry after {self.limits.retry_after}',
+                'parameters': {'retry_after': self.limits.retry_after},
+            }
+
+        self.calls.append((method, params, time.perf_counter()))
+        for listener in self.listeners:
+            listener(method, params)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if method == 'getMe':
+            result = {'id': 123456, 'is_bot': True, 'first_name': 'Fake', 'username': 'fake_bot'}
+        elif method == 'setWebhook':
+            self.webhook_url = params.get('url')
+            self.webhook_secret = params.get('secret_token')
+            result = True
+        elif method == 'deleteWebhook':
+            self.webhook_url = None
+            result = True
+        elif method in ('sendMessage', 'editMessageText'):
+            result = self._message(params)
+        elif method == 'sendAnimation':
+            result = self._media_message('animation', params)
+        elif method == 'sendVideo':
+            result = self._media_message('video', params)
+        else:
+            result = True
+        return 200, {'ok': True, 'result': result}
+
+    # --- HTTP ---
+
+    async def _serve(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                _, path, _ = request_line.decode().split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, value = line.decode().split(':', 1)
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                prefix = f'/bot{self.token}/'
+                if path.startswith(prefix):
+                    status, payload = await self.call(path[len(prefix):], parse_body(headers, body))
+                else:
+                    status, payload = 404, {'ok': False, 'error_code': 404, 'description': 'Not Found'}
+
+                data = json.dumps(payload).encode()
+                writer.write(
+                    f'HTTP/1.1 {status} {http.HTTPStatus(status).phrase}\r\nContent-Type: application/json\r\n'
+                    f'Content-Length: {len(data)}\r\n\r\n'.encode() + data
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
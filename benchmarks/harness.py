@@ -0,0 +1,288 @@
+"""
+Нагрузочный прогон бота с проверкой на регрессии.
+
+Обновления (Update) строятся по сценариям — /start, /word, кнопки
+«Слово дня», «Категории», «Поиск», «Все жесты», поиск текстом и их смесь —
+и подаются в очередь настоящего Application со всеми обработчиками.
+Bot API заменён транспортом в том же процессе (InProcessRequest): он
+отвечает как заглушка fake_bot_api, но без HTTP, так что замер — это
+PTB, обработчики, ограничитель и хранилища.
+
+Каждый сценарий прогоняется так: весь поток сразу — пропускная
+способность (лучшая из --rounds попыток, чтобы шум машины не выглядел
+регрессией); поток с частотой --rate — p50/p95/p99 задержки от подачи
+обновления до ответа бота в его чат (--rate 0 — задержки под полной
+нагрузкой); по одному обновлению от каждого из --memory-users
+пользователей — память на 1000 пользователей, прирост кучи Python
+(tracemalloc) после прогрева.
+
+Результаты пишутся в JSON (--save) и сравниваются с прошлым прогоном
+(--baseline): если какая-то величина стала хуже больше чем на
+--threshold, выход с кодом 1.
+
+    python -m benchmarks.harness --save baseline.json
+    python -m benchmarks.harness --baseline baseline.json --threshold 0.2
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from telegram import Update
+from telegram.request import BaseRequest
+
+import bot
+import router
+from benchmarks.bench_ingress import LatencyProbe, percentile, unlimited_rate_limiter
+from benchmarks.fake_bot_api import FakeBotAPI
+from benchmarks.updates import SEARCHES, callback_update, message_update
+from pagination import ALL_SCOPE, page_data
+
+SCENARIOS = {
+    'start': lambda rng, user_id: message_update(user_id, '/start'),
+    'word': lambda rng, user_id: message_update(user_id, '/word'),
+    'word_of_day': lambda rng, user_id: callback_update(user_id, router.callback_data(router.WORD_OF_DAY)),
+    'categories': lambda rng, user_id: callback_update(user_id, router.callback_data(router.CATEGORIES, 0)),
+    'search_button': lambda rng, user_id: callback_update(user_id, router.callback_data(router.SEARCH)),
+    'all_gestures': lambda rng, user_id: callback_update(user_id, page_data(ALL_SCOPE, 0)),
+    'text_search': lambda rng, user_id: message_update(user_id, rng.choice(SEARCHES)),
+}
+
+# Доли сценариев в смешанном потоке — примерно как в живом трафике
+MIX = {
+    'start': 0.1, 'word': 0.1, 'word_of_day': 0.2, 'categories': 0.15,
+    'search_button': 0.05, 'all_gestures': 0.15, 'text_search': 0.25,
+}
+
+# Величины, по которым сравнение может провалить прогон, и их
+# направление: +1 — больше значит лучше. p95/p99 только выводятся: на
+# тысяче обновлений хвост задержек зависит от того, попала ли в замер
+# сборка мусора или задача JobQueue
+GATED = {
+    'throughput': +1,
+    'p50_ms': -1,
+    'memory_per_1k_users_kb': -1,
+}
+
+# Разница меньше этой не считается регрессией (шум таймера и аллокатора)
+ABSOLUTE_SLACK = {'p50_ms': 0.5, 'memory_per_1k_users_kb': 16.0}
+
+
+class InProcessRequest(BaseRequest):
+    """Транспорт PTB, который вызывает FakeBotAPI.call напрямую, без сети"""
+
+    def __init__(self, api):
+        self.api = api
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        params = request_data.parameters if request_data else {}
+        status, payload = await self.api.call(url.rsplit('/', 1)[-1], params)
+        return status, json.dumps(payload).encode()
+
+
+def scenario_update(name, rng, user_id):
+    """Обновление-словарь сценария name ('mixed' — случайный сценарий по MIX)"""
+    if name == 'mixed':
+        name = rng.choices(tuple(MIX), tuple(MIX.values()))[0]
+    return SCENARIOS[name](rng, user_id)
+
+
+def user_id_of(data):
+    return (data.get('message') or data['callback_query'])['from']['id']
+
+
+def scenario_stream(name, count, users, seed=0):
+    rng = random.Random(seed)
+    return [scenario_update(name, rng, rng.randint(1, users)) for _ in range(count)]
+
+
+async def started_application(api, db_path, concurrency):
+    application = bot.build_application(
+        api.token, concurrent_updates=concurrency, db_path=db_path,
+        rate_limiter=unlimited_rate_limiter(), request=InProcessRequest(api), antiflood=False
+    )
+    await application.initialize()
+    await application.start()
+    return application
+
+
+async def stopped(application):
+    await application.stop()
+    await application.shutdown()
+    await bot.close_storage(application)
+
+
+async def replay(updates, rate, concurrency, latency, db_path):
+    """Прогнать поток; (обновлений/с, задержки в секундах)"""
+    api = FakeBotAPI(latency=latency)
+    probe = LatencyProbe(len(updates))
+    api.listeners.append(probe)
+    application = await started_application(api, db_path, concurrency)
+    try:
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        for i, data in enumerate(updates):
+            if rate:
+                # расписание от начала потока, а не пауза между подачами
+                delay = started + i / rate - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            probe.injected(data)
+            application.update_queue.put_nowait(Update.de_json(data, application.bot))
+            if not rate and i % 100 == 99:
+                # дать обработчикам поработать, не копя весь поток в очереди
+                await asyncio.sleep(0)
+        await asyncio.wait_for(probe.done.wait(), timeout=600)
+        elapsed = loop.time() - started
+    finally:
+        await stopped(application)
+    return len(updates) / elapsed, probe.latencies
+
+
+async def memory_per_user(name, users, concurrency, db_path):
+    """Прирост кучи Python на одного пользователя после его первого обновления, байт"""
+    api = FakeBotAPI()
+    probe = LatencyProbe(users)
+    api.listeners.append(probe)
+    application = await started_application(api, db_path, concurrency)
+    rng = random.Random(1)
+    # у каждого пользователя — единственное обновление
+    updates = [scenario_update(name, rng, user_id) for user_id in range(1, users + 1)]
+    for data in updates:
+        # очереди самого замера заводятся заранее и в счёт не идут
+        probe.pending[user_id_of(data)]
+    warmup = len(updates) // 10
+    try:
+        gc.collect()
+        tracemalloc.start()
+        for i, data in enumerate(updates):
+            if i == warmup:
+                # кэши, которые не зависят от числа пользователей, уже прогреты
+                await asyncio.sleep(0.2)
+                gc.collect()
+                before = tracemalloc.get_traced_memory()[0]
+            probe.injected(data)
+            application.update_queue.put_nowait(Update.de_json(data, application.bot))
+            if i % 100 == 99:
+                await asyncio.sleep(0)
+        await asyncio.wait_for(probe.done.wait(), timeout=600)
+        gc.collect()
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+        await stopped(application)
+    return (after - before) / (users - warmup)
+
+
+def run_suite(args):
+    results = {}
+    for name in args.scenarios:
+        with tempfile.TemporaryDirectory() as tmp:
+            updates = scenario_stream(name, args.updates, args.users)
+            rate = max(
+                asyncio.run(replay(
+                    updates, 0, args.concurrency, args.api_latency, os.path.join(tmp, f'throughput{i}.db')
+                ))[0]
+                for i in range(args.rounds)
+            )
+            _, latencies = asyncio.run(replay(
+                updates, args.rate, args.concurrency, args.api_latency, os.path.join(tmp, 'latency.db')
+            ))
+            per_user = asyncio.run(memory_per_user(
+                name, args.memory_users, args.concurrency, os.path.join(tmp, 'memory.db')
+            ))
+        results[name] = {
+            'throughput': rate,
+            'p50_ms': percentile(latencies, 0.5) * 1000,
+            'p95_ms': percentile(latencies, 0.95) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+            'memory_per_1k_users_kb': per_user * 1000 / 1024,
+        }
+        row = results[name]
+        print(f"{name:<14} {row['throughput']:>8.0f} {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} "
+              f"{row['p99_ms']:>8.2f} {row['memory_per_1k_users_kb']:>12.0f}")
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Регрессии относительно baseline: [(сценарий, величина, было, стало, изменение)]"""
+    regressions = []
+    for name, row in results.items():
+        old_row = baseline.get(name)
+        if old_row is None:
+            continue
+        for metric, direction in GATED.items():
+            old, new = old_row.get(metric), row.get(metric)
+            if old is None or new is None or old <= 0:
+                continue
+            change = (new - old) / old
+            worse = -change * direction
+            if worse > threshold and abs(new - old) > ABSOLUTE_SLACK.get(metric, 0):
+                regressions.append((name, metric, old, new, change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон бота со сравнением с базовым")
+    parser.add_argument('--scenarios', nargs='+', default=[*SCENARIOS, 'mixed'],
+                        choices=[*SCENARIOS, 'mixed'])
+    parser.add_argument('--updates', type=int, default=2000, help="обновлений на сценарий")
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--rate', type=float, default=300, help="частота потока для задержек, обн/с; 0 — сразу весь")
+    parser.add_argument('--rounds', type=int, default=3, help="попыток замера пропускной способности")
+    parser.add_argument('--concurrency', type=int, default=bot.CONCURRENT_UPDATES)
+    parser.add_argument('--api-latency', type=float, default=0.0, help="задержка ответа Bot API, с")
+    parser.add_argument('--memory-users', type=int, default=5000)
+    parser.add_argument('--save', help="записать результаты в JSON")
+    parser.add_argument('--baseline', help="JSON прошлого прогона для сравнения")
+    parser.add_argument('--threshold', type=float, default=0.2, help="допустимое ухудшение, доля")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    print(f"{'сценарий':<14} {'обн/с':>8} {'p50, мс':>8} {'p95, мс':>8} {'p99, мс':>8} {'КБ/1000 польз.':>12}")
+    results = run_suite(args)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({
+                'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'python': platform.python_version(),
+                'params': {k: getattr(args, k) for k in ('updates', 'users', 'rate', 'rounds', 'concurrency', 'api_latency')},
+                'results': results,
+            }, f, ensure_ascii=False, indent=2)
+        print(f"\nРезультаты записаны в {args.save}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n❌ Хуже базового больше чем на {args.threshold:.0%}:")
+            for name, metric, old, new, change in regressions:
+                print(f"  {name:<14} {metric:<24} {old:>10.2f} → {new:>10.2f} ({change:+.0%})")
+            sys.exit(1)
+        print(f"\n✅ В пределах {args.threshold:.0%} от базового")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Синтетические обновления Telegram в виде JSON-словарей"""
+
+import itertools
+import random
+import time
+
+CALLBACKS = ('word_of_day', 'random_gesture', 'categories', 'all_gestures', 'search', 'help', 'back')
+COMMANDS = ('/start', '/word', '/help')
+SEARCHES = ('привет', 'люблю', 'спосибо', 'хорошо', 'думаю')
+
+_ids = itertools.count(1)
+
+
+def _user(user_id):
+    return {'id': user_id, 'is_bot': False, 'first_name': f'User{user_id}'}
+
+
+def _chat(chat_id):
+    return {'id': chat_id, 'type': 'private', 'first_name': f'User{chat_id}'}
+
+
+def message_update(user_id, text, update_id=None):
+    """Сообщение пользователя (команда или текст)"""
+    update_id = update_id or next(_ids)
+    message = {
+        'message_id': update_id,
+        'date': int(time.time()),
+        'chat': _chat(user_id),
+        'from': _user(user_id),
+        'text': text,
+    }
+    if text.startswith('/'):
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+    return {'update_id': update_id, 'message': message}
+
+
+def edited_update(update):
+    """То же сообщение, но правкой (edited_message)"""
+    message = dict(update['message'], edit_date=update['message']['date'])
+    return {'update_id': update['update_id'], 'edited_message': message}
+
+
+def callback_update(user_id, data, message_id=1, update_id=None):
+    """Нажатие на inline-кнопку под сообщением бота"""
+    update_id = update_id or next(_ids)
+    return {
+        'update_id': update_id,
+        'callback_query': {
+            'id': str(update_id),
+            'from': _user(user_id),
+            'chat_instance': str(user_id),
+            'data': data,
+            'message': {
+                'message_id': message_id,
+                'date': int(time.time()),
+                'chat': _chat(user_id),
+                'from': {'id': 123456, 'is_bot': True, 'first_name': 'Fake'},
+                'text': 'menu',
+            },
+        },
+    }
+
+
+def random_update(rng, user_id):
+    """Случайное обновление в пропорциях, похожих на живой трафик"""
+    roll = rng.random()
+    if roll < 0.6:
+        return callback_update(user_id, rng.choice(CALLBACKS))
+    if roll < 0.85:
+        return message_update(user_id, rng.choice(COMMANDS))
+    return message_update(user_id, rng.choice(SEARCHES))
+
+
+def update_stream(count, users, seed=0):
+    """count обновлений от users разных пользователей"""
+    rng = random.Random(seed)
+    return [random_update(rng, rng.randint(1, users)) for _ in range(count)]
@@ -1,14 +1,62 @@
 """
 Бот "Слово дня - Русский жестовый язык"
 На основе учебников И.Ф. Гейльман, А.Е. Харламенкова
+
+Запуск:
+    python bot.py              # long polling
+    python bot.py --webhook    # вебхук: WEBHOOK_URL, PORT, WEBHOOK_SECRET
+    CLUSTER_WORKER=k/N python bot.py   # процесс k из N (см. cluster.py)
+
+Переменные окружения:
+    BOT_TOKEN           токен бота
+    BOT_MODE            polling (по умолчанию) или webhook
+    CONCURRENT_UPDATES  сколько чатов обслуживать одновременно (порядок внутри
+                        чата сохраняется)
+    TELEGRAM_API_URL    адрес Bot API (для локальной заглушки)
+    BOT_DB_PATH         файл SQLite с подписчиками и данными пользователей
+    BROADCAST_TIME      время ежедневной рассылки, ЧЧ:ММ (по BROADCAST_TZ)
+    BROADCAST_TZ        часовой пояс рассылки
+    BROADCAST_SHARD     доля рассылки этого процесса, k/N (по умолчанию 0/1)
+    CLUSTER_WORKER      номер процесса в кластере, k/N: обновления идут через
+                        общую очередь в BOT_DB_PATH (по умолчанию без кластера)
+    MEDIA_DIR           каталог с перекодированными роликами (см. media.py)
+    MEDIA_CHAT_ID       служебный чат, куда /warmup загружает ролики
+    ADMIN_IDS           id администраторов через запятую (для /warmup)
+    METRICS_HOST        адрес эндпоинта /metrics (по умолчанию 127.0.0.1)
+    METRICS_PORT        порт эндпоинта /metrics, 0 — выключен (по умолчанию 9464);
+                        процесс кластера k слушает METRICS_PORT + k
+    GESTURES_SOURCE     корпус жестов (по умолчанию gestures.json рядом с ботом)
+    GESTURES_COMPILED   скомпилированный корпус (gestures.bin)
+    GESTURES_SNAPSHOT   снимок индексов корпуса (gestures.snapshot, см. corpus.py)
 """
 
+import argparse
+import asyncio
+import gc
 import os
 import logging
-import random
-from datetime import datetime
+import time
+from datetime import time as dt_time
+from zoneinfo import ZoneInfo
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, filters, ContextTypes
+from telegram.ext import (
+    Application, CommandHandler, CallbackQueryHandler, InlineQueryHandler, MessageHandler, TypeHandler, filters,
+    ContextTypes
+)
+
+from chat_scheduler import ChatOrderedUpdateProcessor
+from corpus import DEFAULT_SNAPSHOT, WATCH_INTERVAL, CorpusWatcher, open_snapshot
+from gesture_store import DEFAULT_COMPILED, DEFAULT_SOURCE, open_store
+from layout import Editor
+from metrics import Metrics
+from pagination import ALL_SCOPE, categories_page, gestures_page, nav_row
+from rate_limiter import OVERALL_RATE, PriorityRateLimiter
+from render_cache import RenderCache, Variant
+import router
+from router import GESTURE_IDS, Router, callback_data, gesture_data
+from storage import SQLiteBackend, UserStore
+from subscribers import BUCKETS, SubscriberStore
+from wordofday import DayClock, WordCalendar, parse_timezone
 
 # Настройка логирования
 logging.basicConfig(
@@ -19,438 +67,215 @@ logger = logging.getLogger(__name__)
 
 TOKEN = os.environ.get('BOT_TOKEN')
 
-if not TOKEN:
-    logger.error("❌ BOT_TOKEN not found!")
-    exit(1)
+BOT_MODE = os.environ.get('BOT_MODE', 'polling')
+WEBHOOK_URL = os.environ.get('WEBHOOK_URL')
+WEBHOOK_SECRET = os.environ.get('WEBHOOK_SECRET')
+PORT = int(os.environ.get('PORT', '8443'))
+CONCURRENT_UPDATES = int(os.environ.get('CONCURRENT_UPDATES', '16'))
+TELEGRAM_API_URL = os.environ.get('TELEGRAM_API_URL')
+DB_PATH = os.environ.get('BOT_DB_PATH', 'bot.db')
+BROADCAST_TIME = os.environ.get('BROADCAST_TIME', '09:00')
+BROADCAST_TZ = ZoneInfo(os.environ.get('BROADCAST_TZ', 'Europe/Moscow'))
+BROADCAST_SHARD, BROADCAST_SHARDS = map(int, os.environ.get('BROADCAST_SHARD', '0/1').split('/'))
+if os.environ.get('CLUSTER_WORKER'):
+    from cluster import parse_worker
+    CLUSTER_WORKER = parse_worker(os.environ['CLUSTER_WORKER'])
+else:
+    CLUSTER_WORKER = None
+MEDIA_DIR = os.environ.get('MEDIA_DIR')
+MEDIA_CHAT_ID = os.environ.get('MEDIA_CHAT_ID')
+ADMIN_IDS = frozenset(int(user_id) for user_id in os.environ.get('ADMIN_IDS', '').split(',') if user_id.strip())
+GESTURES_SOURCE = os.environ.get('GESTURES_SOURCE', DEFAULT_SOURCE)
+GESTURES_COMPILED = os.environ.get('GESTURES_COMPILED', DEFAULT_COMPILED)
+GESTURES_SNAPSHOT = os.environ.get('GESTURES_SNAPSHOT', DEFAULT_SNAPSHOT)
+METRICS_HOST = os.environ.get('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.environ.get('METRICS_PORT', '9464'))
 
 
 # === БАЗА ЖЕСТОВ РЖЯ ===
 
-GESTURES_DB = {
-    "привет": {
-        "gesture_name": "Рука вверх с махом",
-        "main_meaning": "ПРИВЕТ",
-        "alternative_meanings": [
-            {
-                "word": "ЗДРАВСТВУЙ",
-                "context": "Формальное приветствие",
-                "example": "Здравствуй, как дела?",
-                "difference": "Более медленное движение"
-            },
-            {
-                "word": "ПРИВЕТСТВУЮ",
-                "context": "Официальное обращение",
-                "example": "Приветствую вас!",
-                "difference": "Рука выше, движение четче"
-            },
-            {
-                "word": "САЛЮТ",
-                "context": "Неформальное, молодёжное",
-                "example": "Салют, друзья!",
-                "difference": "Быстрое, энергичное движение"
-            }
-        ],
-        "description": "Поднимите правую руку на уровень головы ладонью вперёд. Помашите кистью из стороны в сторону 2-3 раза. Движение свободное, дружелюбное.",
-        "examples": [
-            "Привет! Как дела?",
-            "Здравствуй, рад тебя видеть!",
-            "Приветствую вас на встрече!"
-        ],
-        "category": "Приветствия",
-        "difficulty": "Лёгкий",
-        "tips": "Улыбайтесь! Зрительный контакт важен. Махи не слишком широкие.",
-        "common_mistakes": "Не машите всей рукой от плеча — только кисть!",
-        "gif_path": None  # Для будущих GIF
-    },
-    
-    "спасибо": {
-        "gesture_name": "Рука от сердца вперёд",
-        "main_meaning": "СПАСИБО",
-        "alternative_meanings": [
-            {
-                "word": "БЛАГОДАРЮ",
-                "context": "Более формальное",
-                "example": "Благодарю за помощь",
-                "difference": "Рука дольше у сердца, затем плавно вперёд"
-            },
-            {
-                "word": "БЛАГОДАРНОСТЬ",
-                "context": "Существительное",
-                "example": "Выражаю благодарность",
-                "difference": "Обе руки к сердцу, затем вперёд"
-            },
-            {
-                "word": "ПРИЗНАТЕЛЬНОСТЬ",
-                "context": "Глубокая благодарность",
-                "example": "Я вам очень признателен",
-                "difference": "Движение медленнее, с наклоном головы"
-            }
-        ],
-        "description": "Правую руку прижмите к груди в области сердца (пальцы вместе, ладонь к себе). Затем плавно выведите руку вперёд, раскрывая ладонь вверх, как бы отдавая благодарность от сердца.",
-        "examples": [
-            "Спасибо за помощь!",
-            "Благодарю вас!",
-            "Спасибо, очень приятно!"
-        ],
-        "category": "Вежливость",
-        "difficulty": "Лёгкий",
-        "tips": "Движение должно быть искренним, от сердца. Можно добавить лёгкий поклон головой.",
-        "common_mistakes": "Не делайте резко — движение плавное и душевное.",
-        "gif_path": None
-    },
-    
-    "пожалуйста": {
-        "gesture_name": "Открытая ладонь вперёд",
-        "main_meaning": "ПОЖАЛУЙСТА",
-        "alternative_meanings": [
-            {
-                "word": "ПРОШУ",
-                "context": "Вежливая просьба",
-                "example": "Прошу вас помочь",
-                "difference": "Ладонь чуть наклонена к собе"
-            },
-            {
-                "word": "УГОЩАЙТЕСЬ",
-                "context": "Предложение",
-                "example": "Угощайтесь, пожалуйста",
-                "difference": "Движение ладони в сторону угощения"
-            },
-            {
-                "word": "НЕ ЗА ЧТО",
-                "context": "Ответ на спасибо",
-                "example": "Не за что, обращайтесь!",
-                "difference": "Легкое покачивание ладони"
-            }
-        ],
-        "description": "Вытяните правую руку вперёд ладонью вверх, пальцы вместе. Сделайте плавное приглашающее движение к собеседнику или в сторону предмета.",
-        "examples": [
-            "Пожалуйста, проходите",
-            "Прошу вас",
-            "Не за что!"
-        ],
-        "category": "Вежливость",
-        "difficulty": "Лёгкий",
-        "tips": "Жест должен быть открытым и приглашающим. Улыбка обязательна!",
-        "common_mistakes": "Не держите ладонь вертикально — только горизонтально или чуть вверх.",
-        "gif_path": None
-    },
-    
-    "да": {
-        "gesture_name": "Кивок головой",
-        "main_meaning": "ДА",
-        "alternative_meanings": [
-            {
-                "word": "СОГЛАСЕН",
-                "context": "Выражение согласия",
-                "example": "Я согласен с вами",
-                "difference": "Более энергичный кивок"
-            },
-            {
-                "word": "ПРАВИЛЬНО",
-                "context": "Подтверждение правоты",
-                "example": "Правильно, именно так!",
-                "difference": "Кивок + указательный палец вверх"
-            },
-            {
-                "word": "КОНЕЧНО",
-                "context": "Уверенное согласие",
-                "example": "Конечно, помогу!",
-                "difference": "Быстрые уверенные кивки"
-            }
-        ],
-        "description": "Кивните головой вниз 1-2 раза. Можно дополнить жестом: кулак с поднятым большим пальцем вверх (знак одобрения).",
-        "examples": [
-            "Да, я согласен",
-            "Да, конечно!",
-            "Правильно!"
-        ],
-        "category": "Базовые слова",
-        "difficulty": "Лёгкий",
-        "tips": "Естественный кивок как в обычной жизни. Зрительный контакт!",
-        "common_mistakes": "Не киваёте слишком много раз — 1-2 достаточно.",
-        "gif_path": None
-    },
-    
-    "нет": {
-        "gesture_name": "Покачивание головой",
-        "main_meaning": "НЕТ",
-        "alternative_meanings": [
-            {
-                "word": "НЕ СОГЛАСЕН",
-                "context": "Несогласие",
-                "example": "Я не согласен с этим",
-                "difference": "Более медленное покачивание"
-            },
-            {
-                "word": "НЕПРАВИЛЬНО",
-                "context": "Указание на ошибку",
-                "example": "Неправильно, так не делается",
-                "difference": "Покачивание + палец из стороны в сторону"
-            },
-            {
-                "word": "НЕЛЬЗЯ",
-                "context": "Запрет",
-                "example": "Нельзя так делать!",
-                "difference": "Энергичное покачивание + строгая мимика"
-            }
-        ],
-        "description": "Покачайте головой из стороны в сторону 2-3 раза. Можно усилить жестом: указательный палец двигается из стороны в сторону перед собой.",
-        "examples": [
-            "Нет, я не могу",
-            "Нет, это неправильно",
-            "Нельзя!"
-        ],
-        "category": "Базовые слова",
-        "difficulty": "Лёгкий",
-        "tips": "Мимика важна! Покажите отрицание на лице.",
-        "common_mistakes": "Не кивайте вверх-вниз — только в стороны!",
-        "gif_path": None
-    },
-    
-    "понимаю": {
-        "gesture_name": "Рука к голове с кивком",
-        "main_meaning": "ПОНИМАЮ",
-        "alternative_meanings": [
-            {
-                "word": "ПОНЯЛ",
-                "context": "Подтверждение понимания",
-                "example": "Понял, сделаю",
-                "difference": "Резкое касание лба + кивок"
-            },
-            {
-                "word": "ЯСНО",
-                "context": "Понимание объяснения",
-                "example": "Ясно, теперь понятно",
-                "difference": "Легкое касание + улыбка"
-            },
-            {
-                "word": "ДОГАДАЛСЯ",
-                "context": "Осознание",
-                "example": "А, догадался!",
-                "difference": "Палец к виску + кивок"
-            }
-        ],
-        "description": "Коснитесь указательным пальцем лба или виска и кивните головой. Показывает, что информация 'вошла в голову'.",
-        "examples": [
-            "Понял, спасибо!",
-            "Ясно, теперь понятно",
-            "А, догадался!"
-        ],
-        "category": "Понимание и мышление",
-        "difficulty": "Лёгкий",
-        "tips": "Кивок головой усиливает понимание. Зрительный контакт обязателен.",
-        "common_mistakes": "Не путайте с жестом 'думать' (там круговые движения).",
-        "gif_path": None
-    },
-    
-    "думать": {
-        "gesture_name": "Круговые движения у головы",
-        "main_meaning": "ДУМАТЬ",
-        "alternative_meanings": [
-            {
-                "word": "РАЗМЫШЛЯТЬ",
-                "context": "Глубокое обдумывание",
-                "example": "Я долго размышлял над этим",
-                "difference": "Медленные круговые движения"
-            },
-            {
-                "word": "СООБРАЖАТЬ",
-                "context": "Умственная работа",
-                "example": "Нужно соображать быстрее",
-                "difference": "Быстрые движения у виска"
-            },
-            {
-                "word": "МОЗГИ (работают)",
-                "context": "Разговорное",
-                "example": "У меня мозги не варят",
-                "difference": "Круги указательным пальцем у виска"
-            }
-        ],
-        "description": "Указательным пальцем делайте круговые движения около виска или лба. Движение показывает 'работу мысли' в голове.",
-        "examples": [
-            "Я думаю над этим",
-            "Дай мне подумать",
-            "Надо соображать!"
-        ],
-        "category": "Понимание и мышление",
-        "difficulty": "Средний",
-        "tips": "Мимика задумчивости. Можно смотреть вверх или в сторону.",
-        "common_mistakes": "Не путайте с 'понимаю' — там касание без кругов.",
-        "gif_path": None
-    },
-    
-    "хорошо": {
-        "gesture_name": "Большой палец вверх",
-        "main_meaning": "ХОРОШО",
-        "alternative_meanings": [
-            {
-                "word": "ОТЛИЧНО",
-                "context": "Высокая оценка",
-                "example": "Отлично сделано!",
-                "difference": "Энергичный жест + улыбка"
-            },
-            {
-                "word": "ОК / ОКЕЙ",
-                "context": "Согласие, одобрение",
-                "example": "Окей, договорились",
-                "difference": "Кольцо из пальцев (большой + указательный)"
-            },
-            {
-                "word": "ЗДОРОВО",
-                "context": "Восхищение",
-                "example": "Здорово получилось!",
-                "difference": "Большой палец + кивки головой"
-            },
-            {
-                "word": "МОЛОДЕЦ",
-                "context": "Похвала",
-                "example": "Молодец, правильно!",
-                "difference": "Большой палец вверх + похлопывание"
-            }
-        ],
-        "description": "Сожмите руку в кулак, большой палец поднимите вверх. Жест энергичный, уверенный. Универсальный знак одобрения.",
-        "examples": [
-            "Как дела? — Хорошо!",
-            "Отлично, так и сделаем",
-            "Здорово получилось!"
-        ],
-        "category": "Эмоции и оценки",
-        "difficulty": "Лёгкий",
-        "tips": "Улыбка делает жест дружелюбнее. Можно добавить кивок.",
-        "common_mistakes": "Не опускайте палец вниз — только вверх означает 'хорошо'!",
-        "gif_path": None
-    },
-    
-    "плохо": {
-        "gesture_name": "Большой палец вниз",
-        "main_meaning": "ПЛОХО",
-        "alternative_meanings": [
-            {
-                "word": "УЖАСНО",
-                "context": "Сильная негативная оценка",
-                "example": "Ужасно получилось",
-                "difference": "Резкое движение вниз + гримаса"
-            },
-            {
-                "word": "НЕ НРАВИТСЯ",
-                "context": "Неодобрение",
-                "example": "Мне это не нравится",
-                "difference": "Покачивание головой + палец вниз"
-            },
-            {
-                "word": "ПРОВАЛ",
-                "context": "Неудача",
-                "example": "Полный провал",
-                "difference": "Палец резко вниз + мимика разочарования"
-            }
-        ],
-        "description": "Сожмите руку в кулак, большой палец направьте вниз. Мимика недовольства. Показывает негативную оценку.",
-        "examples": [
-            "Дела плохо",
-            "Это ужасно",
-            "Не нравится мне это"
-        ],
-        "category": "Эмоции и оценки",
-        "difficulty": "Лёгкий",
-        "tips": "Мимика важна — покажите недовольство на лице.",
-        "common_mistakes": "Не путайте с другими жестами — палец строго вниз.",
-        "gif_path": None
-    },
-    
-    "любовь": {
-        "gesture_name": "Рука к сердцу",
-        "main_meaning": "ЛЮБОВЬ",
-        "alternative_meanings": [
-            {
-                "word": "ЛЮБИТЬ",
-                "context": "Глагол, чувство",
-                "example": "Я тебя люблю",
-                "difference": "Круговое движение рукой на сердце"
-            },
-            {
-                "word": "НРАВИТЬСЯ (сильно)",
-                "context": "Сильная симпатия",
-                "example": "Мне это очень нравится",
-                "difference": "Легкое касание + улыбка"
-            },
-            {
-                "word": "ДОРОГОЙ",
-                "context": "О близком человеке",
-                "example": "Ты мне очень дорог",
-                "difference": "Рука задерживается на сердце"
-            },
-            {
-                "word": "ДУШЕВНЫЙ",
-                "context": "Об эмоциональной близости",
-                "example": "Душевный разговор",
-                "difference": "Плавное круговое движение"
-            }
-        ],
-        "description": "Прижмите правую руку (или обе руки) к груди в области сердца. Можно сделать мягкое круговое движение. Выражение лица тёплое, искреннее.",
-        "examples": [
-            "Я тебя люблю",
-            "Люблю свою семью",
-            "Это мне по душе"
-        ],
-        "category": "Эмоции и чувства",
-        "difficulty": "Средний",
-        "tips": "Искренность — главное. Мимика должна показывать тепло.",
-        "common_mistakes": "Не путайте с 'спасибо' — там рука движется вперёд.",
-        "gif_path": None
-    }
-}
-
-# Категории для навигации
-CATEGORIES = {
-    "Приветствия": ["привет"],
-    "Вежливость": ["спасибо", "пожалуйста"],
-    "Базовые слова": ["да", "нет"],
-    "Понимание и мышление": ["понимаю", "думать"],
-    "Эмоции и оценки": ["хорошо", "плохо"],
-    "Эмоции и чувства": ["любовь"]
-}
-
-# Для "слова дня" — меняется каждый день
-def get_word_of_day():
-    """Получить слово дня на основе даты"""
-    today = datetime.now().day
-    words = list(GESTURES_DB.keys())
-    index = today % len(words)
-    return words[index]
+# Корпус лежит в gestures.json и компилируется в gestures.bin,
+# который открывается через mmap (см. gesture_store.py). Индексы
+# загружаются из готового снимка (поисковый распаковывается при первом
+# поиске), а правки файла подхватываются на ходу (см. corpus.py и reload_gestures)
+GESTURES_DB = open_store(GESTURES_SOURCE, GESTURES_COMPILED)
+CORPUS = CorpusWatcher(GESTURES_SOURCE, GESTURES_COMPILED, GESTURES_SNAPSHOT)
+SNAPSHOT = open_snapshot(GESTURES_DB, GESTURES_SNAPSHOT)
+
+# Категории для навигации — по полю category жестов
+CATEGORIES = SNAPSHOT.categories
+
+# Номера жестов в callback_data кнопок (см. router.py)
+GESTURE_IDS.publish(SNAPSHOT.keys)
+
+# Подбор по категории и сложности — пересечения битовых множеств (см. facets.py)
+FACETS = SNAPSHOT.facets
+
+DAY_CLOCK = DayClock()
+
+
+# === ПО ПЕРВОМУ ОБРАЩЕНИЮ ===
+
+# Первому обновлению (обычно /start) не нужны ни рекомендации, ни
+# тренировка, ни ролики, ни inline-поиск: их модули импортируются, а
+# объекты строятся при первом обращении, как broadcast в daily_broadcast.
+# Построенное по старой базе reload_gestures обновляет или сбрасывает
+
+# «Случайный жест» — следующий жест по просмотрам и ошибкам пользователя (см. recommender.py)
+RECOMMENDER = None
+
+# Для "слова дня" — календарь на всю базу (см. wordofday.py)
+WORD_CALENDAR = None
+
+# Вопросы тренировки (см. quiz.py)
+QUIZ = None
+
+# Inline-режим (см. inline.py)
+INLINE = None
+
+
+def get_recommender(bot_data):
+    """Рекомендатель; постоянные номера жестов хранятся в базе приложения"""
+    global RECOMMENDER
+    if RECOMMENDER is None:
+        from recommender import GestureNumbers, Recommender
+        numbers = bot_data['gesture_numbers'] = GestureNumbers(bot_data['db_path'])
+        RECOMMENDER = Recommender(SNAPSHOT.keys, SNAPSHOT.similarity, SNAPSHOT.facets, numbers=numbers)
+    return RECOMMENDER
+
+
+def get_word_calendar():
+    """Календарь слова дня по текущей базе"""
+    global WORD_CALENDAR
+    if WORD_CALENDAR is None:
+        WORD_CALENDAR = WordCalendar(SNAPSHOT.keys)
+    return WORD_CALENDAR
+
+
+def get_quiz():
+    """Вопросы тренировки по текущей базе"""
+    global QUIZ
+    if QUIZ is None:
+        from quiz import Quiz
+        QUIZ = Quiz(GESTURES_DB, CATEGORIES, keys=SNAPSHOT.keys)
+    return QUIZ
+
+
+def get_inline():
+    """Inline-поиск по текущему индексу"""
+    global INLINE
+    if INLINE is None:
+        from inline import InlineSearch
+        INLINE = InlineSearch(SEARCH_INDEX, inline_article)
+    return INLINE
+
+
+def get_quiz_store(bot_data):
+    """Карточки тренировок приложения (см. quiz.py)"""
+    if 'quiz' not in bot_data:
+        from quiz import QuizStore
+        bot_data['quiz'] = QuizStore(bot_data['db_path'])
+    return bot_data['quiz']
+
+
+def get_media(bot_data):
+    """Ролики жестов приложения (см. media.py)"""
+    if 'media' not in bot_data:
+        from media import DEFAULT_MEDIA_DIR, MediaLibrary, MediaStore
+        bot_data['media'] = MediaLibrary(
+            MediaStore(bot_data['db_path']), MEDIA_DIR or DEFAULT_MEDIA_DIR, MEDIA_CHAT_ID
+        )
+    return bot_data['media']
+
+
+def get_word_of_day(tz=BROADCAST_TZ):
+    """Слово дня на сегодняшнюю дату в поясе tz"""
+    return get_word_calendar().word_for(DAY_CLOCK.today(tz))
+
+
+def user_timezone(update, context):
+    """Часовой пояс пользователя (/timezone), иначе пояс рассылки"""
+    name = user_record(update, context).get('timezone')
+    return parse_timezone(name) if name else BROADCAST_TZ
+
+
+# === ДАННЫЕ ПОЛЬЗОВАТЕЛЕЙ ===
+
+# Сколько последних просмотренных жестов помнить
+HISTORY_SIZE = 50
+
+
+def user_record(update, context):
+    """Запись пользователя в UserStore (см. storage.py)"""
+    return context.bot_data['users'].get(update.effective_user.id)
+
+
+def record_view(update, context, gesture_key):
+    """Запомнить просмотр жеста в истории пользователя"""
+    users = context.bot_data['users']
+    user_id = update.effective_user.id
+    record = users.get(user_id)
+    history = record.setdefault('history', [])
+    history.append(gesture_key)
+    del history[:-HISTORY_SIZE]
+    get_recommender(context.bot_data).viewed(record, gesture_key)
+    users.mark_dirty(user_id)
+
+
+async def flush_users(context: ContextTypes.DEFAULT_TYPE):
+    """Сбросить изменённые записи пользователей (задача JobQueue)"""
+    context.bot_data['users'].flush()
+
+
+async def close_storage(application: Application):
+    """При остановке сохранить всё, что ещё не записано"""
+    global RECOMMENDER
+    await application.bot_data['metrics'].close()
+    application.bot_data['users'].close()
+    application.bot_data['subscribers'].close()
+    if 'quiz' in application.bot_data:
+        application.bot_data['quiz'].close()
+    if 'media' in application.bot_data:
+        application.bot_data['media'].store.close()
+    if 'gesture_numbers' in application.bot_data:
+        application.bot_data['gesture_numbers'].close()
+        # следующее приложение в том же процессе откроет свою базу
+        RECOMMENDER = None
+    if 'cluster' in application.bot_data:
+        application.bot_data['cluster'].store.close()
 
 
 # === ФОРМАТИРОВАНИЕ СООБЩЕНИЙ ===
 
 def format_gesture_full(gesture_key):
-    """Полное описание жеста"""
+    """Полное описание жеста по разделам: длинное делится между ними на страницы (см. layout.py)"""
     gesture = GESTURES_DB[gesture_key]
     
-    message = f"🤟 <b>{gesture['main_meaning']}</b>\n\n"
-    message += f"✋ <b>Жест:</b> {gesture['gesture_name']}\n\n"
+    sections = [f"🤟 <b>{gesture['main_meaning']}</b>\n\n✋ <b>Жест:</b> {gesture['gesture_name']}\n\n"]
     
     # Описание
-    message += f"📝 <b>Как показать:</b>\n{gesture['description']}\n\n"
+    sections.append(f"📝 <b>Как показать:</b>\n{gesture['description']}\n\n")
     
-    # Альтернативные значения
-    if gesture['alternative_meanings']:
-        message += f"💭 <b>ДРУГИЕ ЗНАЧЕНИЯ ЭТОГО ЖЕСТА:</b>\n\n"
-        for i, alt in enumerate(gesture['alternative_meanings'], 1):
-            message += f"{i}️⃣ <b>{alt['word']}</b>\n"
-            message += f"   📌 {alt['context']}\n"
-            message += f"   💬 {alt['example']}\n"
-            message += f"   🔍 {alt['difference']}\n\n"
+    # Альтернативные значения: каждое — отдельный раздел, заголовок — с первым
+    for i, alt in enumerate(gesture['alternative_meanings'], 1):
+        section = f"💭 <b>ДРУГИЕ ЗНАЧЕНИЯ ЭТОГО ЖЕСТА:</b>\n\n" if i == 1 else ""
+        section += f"{i}️⃣ <b>{alt['word']}</b>\n"
+        section += f"   📌 {alt['context']}\n"
+        section += f"   💬 {alt['example']}\n"
+        section += f"   🔍 {alt['difference']}\n\n"
+        sections.append(section)
     
     # Примеры
-    message += f"💡 <b>Примеры фраз:</b>\n"
+    section = f"💡 <b>Примеры фраз:</b>\n"
     for example in gesture['examples']:
-        message += f"• {example}\n"
+        section += f"• {example}\n"
+    sections.append(section)
     
-    message += f"\n⚠️ <b>Частая ошибка:</b>\n{gesture['common_mistakes']}\n\n"
-    message += f"💡 <b>Совет:</b> {gesture['tips']}\n\n"
-    message += f"📂 Категория: {gesture['category']}\n"
-    message += f"⭐ Сложность: {gesture['difficulty']}"
+    sections.append(f"\n⚠️ <b>Частая ошибка:</b>\n{gesture['common_mistakes']}\n\n")
+    sections.append(f"💡 <b>Совет:</b> {gesture['tips']}\n\n")
+    sections.append(f"📂 Категория: {gesture['category']}\n⭐ Сложность: {gesture['difficulty']}")
     
-    return message
+    return sections
 
 
 def format_gesture_short(gesture_key):
@@ -465,26 +290,162 @@ def format_gesture_short(gesture_key):
     return message
 
 
+# === ГОТОВЫЕ КЛАВИАТУРЫ И КЭШ СООБЩЕНИЙ ===
+
+MAIN_KEYBOARD = InlineKeyboardMarkup([
+    [
+        InlineKeyboardButton("📅 Слово дня", callback_data=callback_data(router.WORD_OF_DAY)),
+        InlineKeyboardButton("🧠 Тренировка", callback_data=callback_data(router.QUIZ))
+    ],
+    [
+        InlineKeyboardButton("📚 Категории", callback_data=callback_data(router.CATEGORIES, 0)),
+        InlineKeyboardButton("🔍 Поиск", callback_data=callback_data(router.SEARCH))
+    ],
+    [
+        InlineKeyboardButton("📖 Все жесты", callback_data=callback_data(router.PAGE, ALL_SCOPE, 0)),
+        InlineKeyboardButton("🎚 Подбор", callback_data=callback_data(router.FILTER))
+    ],
+    [
+        InlineKeyboardButton("❓ Помощь", callback_data=callback_data(router.HELP))
+    ]
+])
+
+GESTURE_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🔄 Случайный жест", callback_data=callback_data(router.RANDOM_GESTURE))],
+    [InlineKeyboardButton("◀️ В меню", callback_data=callback_data(router.BACK))]
+])
+
+BACK_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton("◀️ В меню", callback_data=callback_data(router.BACK))]
+])
+
+
+def format_word_of_day(gesture_key):
+    """Слово дня: заголовок + полное описание"""
+    sections = format_gesture_full(gesture_key)
+    sections[0] = f"📅 <b>СЛОВО ДНЯ</b>\n\n{sections[0]}"
+    return sections
+
+
+def build_render_cache():
+    """Кэш сообщений о жестах: каждое рисуется при первом показе"""
+    return RenderCache((), {
+        'full': Variant(format_gesture_full, GESTURE_KEYBOARD),
+        'short': Variant(format_gesture_short, GESTURE_KEYBOARD),
+        'word_of_day': Variant(format_word_of_day, GESTURE_KEYBOARD),
+    })
+
+
+RENDER_CACHE = build_render_cache()
+
+# Номера вариантов в callback_data кнопок страниц жеста; порядок не менять
+GESTURE_VARIANTS = ('full', 'short', 'word_of_day')
+
+
+def gesture_message(gesture_key, variant='full', page=0):
+    """Текст страницы сообщения о жесте и клавиатура, с ◀️ N/M ▶️, если страниц несколько"""
+    rendered = RENDER_CACHE.get(gesture_key, variant)
+    if len(rendered.pages) <= 1:
+        return rendered.text, rendered.reply_markup
+    page = min(max(page, 0), len(rendered.pages) - 1)
+    variant_id = GESTURE_VARIANTS.index(variant)
+    nav = nav_row(
+        len(rendered.pages), page,
+        lambda p: gesture_data(router.GESTURE_PAGE, gesture_key, variant_id, p), size=1
+    )
+    return rendered.pages[page], InlineKeyboardMarkup([nav, *rendered.reply_markup.inline_keyboard])
+
+SEARCH_INDEX = SNAPSHOT.search
+
+CATALOG = SNAPSHOT.catalog
+
+
+def inline_article(gesture_key):
+    """Inline-результат: краткое описание жеста"""
+    from inline import gesture_article
+    gesture = GESTURES_DB[gesture_key]
+    return gesture_article(
+        gesture_key, gesture['main_meaning'], gesture['gesture_name'], RENDER_CACHE.text(gesture_key, 'short')
+    )
+
+
+# Индексы базы живут, пока их не сменит перезагрузка: сборщику мусора
+# незачем обходить их миллионы объектов при каждой полной сборке
+gc.freeze()
+
+
+def reload_gestures(snapshot):
+    """
+    Подменить базу жестов готовым снимком. Между присваиваниями нет await,
+    так что обработчики видят либо старую версию, либо новую целиком;
+    кэш сообщений перестраивается только для изменённых записей.
+    """
+    global SNAPSHOT, GESTURES_DB, CATEGORIES, FACETS, SEARCH_INDEX, CATALOG, QUIZ, WORD_CALENDAR
+    started = time.perf_counter()
+    SNAPSHOT = snapshot
+    GESTURES_DB = snapshot.gestures
+    CATEGORIES = snapshot.categories
+    FACETS = snapshot.facets
+    GESTURE_IDS.publish(snapshot.keys)
+    if RECOMMENDER is not None:
+        RECOMMENDER.publish(snapshot.keys, snapshot.similarity, snapshot.facets)
+    SEARCH_INDEX = snapshot.search
+    CATALOG = snapshot.catalog
+    RENDER_CACHE.invalidate(snapshot.changed, snapshot.removed)
+    if INLINE is not None:
+        INLINE.index = snapshot.search
+        INLINE.clear()
+    QUIZ = None
+    if snapshot.changed or snapshot.removed:
+        WORD_CALENDAR = None
+    CORPUS.swapped(time.perf_counter() - started)
+    logger.info(
+        "База жестов v%d: изменено %d, удалено %d, сборка %.3f с, подмена %.4f с",
+        snapshot.version, len(snapshot.changed), len(snapshot.removed),
+        CORPUS.last_build_seconds, CORPUS.last_swap_seconds
+    )
+
+
+async def watch_corpus(context: ContextTypes.DEFAULT_TYPE):
+    """Подхватить изменённый gestures.json (задача JobQueue)"""
+    if not CORPUS.changed():
+        return
+    snapshot = await asyncio.to_thread(CORPUS.build, SNAPSHOT)
+    if snapshot is not None:
+        reload_gestures(snapshot)
+
+
+# === ВИДЕО ЖЕСТОВ ===
+
+async def send_gesture_media(update, context, gesture_key):
+    """Показать ролик жеста, если он есть (по file_id, без повторной загрузки)"""
+    if not GESTURES_DB[gesture_key].get('gif_path'):
+        return
+    await get_media(context.bot_data).send(context.bot, update.effective_chat.id, gesture_key)
+
+
+async def warmup_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда /warmup - заранее загрузить все ролики (только для администраторов)"""
+    if update.effective_user.id not in ADMIN_IDS:
+        return
+    media = get_media(context.bot_data)
+    if media.upload_chat_id is None:
+        await update.message.reply_text("MEDIA_CHAT_ID не задан — загружать некуда.")
+        return
+    keys = [key for key in GESTURES_DB if GESTURES_DB[key].get('gif_path')]
+    await update.message.reply_text(f"⏳ Загружаю ролики: {len(keys)} жестов…")
+    stats = await media.warm_up(context.bot, keys)
+    await update.message.reply_text(
+        f"✅ Готово: загружено {stats.uploaded}, уже были {stats.cached}, "
+        f"нет файла {stats.missing}, ошибок {stats.failed}"
+    )
+
+
 # === ОБРАБОТЧИКИ КОМАНД ===
 
-async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Команда /start"""
-    user = update.effective_user.first_name
-    
-    keyboard = [
-        [InlineKeyboardButton("📅 Слово дня", callback_data='word_of_day')],
-        [
-            InlineKeyboardButton("📚 Категории", callback_data='categories'),
-            InlineKeyboardButton("🔍 Поиск", callback_data='search')
-        ],
-        [
-            InlineKeyboardButton("📖 Все жесты", callback_data='all_gestures'),
-            InlineKeyboardButton("❓ Помощь", callback_data='help')
-        ]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    message = f"""👋 Привет, {user}!
+def format_main_menu(first_name):
+    """Текст главного меню"""
+    return f"""👋 Привет, {first_name}!
 
 Я помогу изучить <b>Русский жестовый язык</b>! 🤟
 
@@ -495,33 +456,46 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 <b>Что я умею:</b>
 
 📅 Слово дня — каждый день новый жест
+🧠 Тренировка — повторяй жесты, пока не запомнишь
 📚 Категории — жесты по темам
 🔍 Поиск — найти нужный жест
 💭 Варианты значений — один жест, много смыслов
 
 <b>Выбери что хочешь изучить:</b>"""
+
+
+async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда /start"""
+    user = update.effective_user.first_name
     
     await update.message.reply_text(
-        message,
-        reply_markup=reply_markup,
+        format_main_menu(user),
+        reply_markup=MAIN_KEYBOARD,
         parse_mode='HTML'
     )
 
 
-async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Команда /help"""
-    message = """📚 <b>КАК ПОЛЬЗОВАТЬСЯ БОТОМ</b>
+HELP_TEXT = """📚 <b>КАК ПОЛЬЗОВАТЬСЯ БОТОМ</b>
 
 <b>Команды:</b>
 /start - главное меню
 /word - слово дня
+/quiz - тренировка: угадай значение жеста
+/subscribe - получать слово дня каждое утро
+/unsubscribe - отписаться от рассылки
+/timezone - часовой пояс для слова дня
 /help - эта справка
 
+<b>В любом чате:</b>
+Напишите @имя_бота и слово — бот предложит жест, чтобы отправить его собеседнику
+
 <b>Кнопки:</b>
 📅 Слово дня - ежедневный жест
+🧠 Тренировка - повторение с интервалами
 📚 Категории - жесты по темам
 🔍 Поиск - найти жест по слову
 📖 Все жесты - полный список
+🎚 Подбор - жесты по категории и сложности
 
 <b>Что показывается:</b>
 • Основное значение жеста
@@ -533,47 +507,482 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 • Полезные советы
 
 <b>Категории жестов:</b>
-• Приветствия
-• Вежливость
-• Базовые слова
-• Понимание и мышление
-• Эмоции и оценки
-• Эмоции и чувства
+{categories}
 
 💡 <b>Совет:</b> Изучайте по 1-2 жеста в день, практикуйте перед зеркалом!"""
-    
-    await update.message.reply_text(message, parse_mode='HTML')
+
+
+def help_text():
+    """Справка; категории берутся из текущей базы"""
+    return HELP_TEXT.format(categories='\n'.join(f'• {name}' for name in CATEGORIES))
+
+
+async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда /help"""
+    await update.message.reply_text(help_text(), parse_mode='HTML')
 
 
 async def word_of_day_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Команда /word - показать слово дня"""
-    word = get_word_of_day()
-    message = f"📅 <b>СЛОВО ДНЯ</b>\n\n{format_gesture_full(word)}"
+    word = get_word_of_day(user_timezone(update, context))
+    text, reply_markup = gesture_message(word, 'word_of_day')
+    record_view(update, context, word)
     
+    await update.message.reply_text(
+        text,
+        reply_markup=reply_markup,
+        parse_mode='HTML'
+    )
+    await send_gesture_media(update, context, word)
+
+
+async def timezone_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда /timezone - часовой пояс, в котором меняется слово дня"""
+    if not context.args:
+        current = user_record(update, context).get('timezone') or str(BROADCAST_TZ)
+        await update.message.reply_text(
+            f"🕒 Ваш часовой пояс: <b>{current}</b>\n\n"
+            "Изменить: /timezone Asia/Yekaterinburg или /timezone +5",
+            parse_mode='HTML'
+        )
+        return
+    name = ' '.join(context.args)
+    try:
+        tz = parse_timezone(name)
+    except ValueError:
+        await update.message.reply_text(
+            "Не знаю такого часового пояса 🤔 Примеры: Europe/Moscow, Asia/Novosibirsk, +3"
+        )
+        return
+    context.bot_data['users'].update(update.effective_user.id, timezone=name)
+    await update.message.reply_text(
+        f"✅ Часовой пояс: {name}. Сегодня у вас {DAY_CLOCK.today(tz):%d.%m.%Y}."
+    )
+
+
+def quiz_question(user_id, store):
+    """Текст и клавиатура следующего вопроса тренировки"""
+    quiz = get_quiz()
+    question = quiz.question(quiz.next_card(store, user_id))
     keyboard = [
-        [InlineKeyboardButton("🔄 Случайный жест", callback_data='random_gesture')],
-        [InlineKeyboardButton("◀️ В меню", callback_data='back')]
+        [InlineKeyboardButton(
+            option,
+            callback_data=gesture_data(router.QUIZ_ANSWER, question.gesture, int(i == question.answer))
+        )]
+        for i, option in enumerate(question.options)
     ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    keyboard.append([InlineKeyboardButton("◀️ В меню", callback_data=callback_data(router.BACK))])
+    text = f"🧠 <b>ТРЕНИРОВКА</b>\n\nЧто означает этот жест?\n\n{question.prompt}"
+    return text, InlineKeyboardMarkup(keyboard)
+
+
+def quiz_result(user_id, store, gesture, correct):
+    """Учесть ответ и показать правильное значение"""
+    card = get_quiz().answer(store, user_id, gesture, correct)
+    record = GESTURES_DB[gesture]
     
-    await update.message.reply_text(
-        message,
+    text = "✅ <b>Верно!</b>\n\n" if correct else "❌ <b>Не совсем.</b>\n\n"
+    text += f"🤟 <b>{record['main_meaning']}</b>"
+    if record['alternative_meanings']:
+        text += f"\n💭 Также: {', '.join(alt['word'] for alt in record['alternative_meanings'])}"
+    days = round(card.interval)
+    text += f"\n\n🗓 Повторим через {days} дн." if days > 1 else "\n\n🗓 Повторим завтра."
+    keyboard = InlineKeyboardMarkup([
+        [InlineKeyboardButton("▶️ Дальше", callback_data=callback_data(router.QUIZ))],
+        [InlineKeyboardButton("◀️ В меню", callback_data=callback_data(router.BACK))]
+    ])
+    return text, keyboard
+
+
+async def quiz_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда /quiz - тренировка с интервальным повторением"""
+    text, reply_markup = quiz_question(update.effective_user.id, get_quiz_store(context.bot_data))
+    await update.message.reply_text(text, reply_markup=reply_markup, parse_mode='HTML')
+
+
+async def subscribe_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда /subscribe - ежедневная рассылка слова дня"""
+    if context.bot_data['subscribers'].subscribe(update.effective_chat.id):
+        message = f"✅ Готово! Слово дня будет приходить каждый день в {BROADCAST_TIME}."
+    else:
+        message = "Вы уже подписаны на слово дня 🙂"
+    await update.message.reply_text(message)
+
+
+async def unsubscribe_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда /unsubscribe"""
+    if context.bot_data['subscribers'].unsubscribe(update.effective_chat.id):
+        message = "Вы отписались от рассылки. Вернуться: /subscribe"
+    else:
+        message = "Вы не были подписаны. Подписаться: /subscribe"
+    await update.message.reply_text(message)
+
+
+async def daily_broadcast(context: ContextTypes.DEFAULT_TYPE):
+    """Рассылка слова дня подписчикам (задача JobQueue)"""
+    # модуль рассылки нужен раз в сутки, а не к первому обновлению
+    from broadcast import run_broadcast
+    
+    today = DAY_CLOCK.today(BROADCAST_TZ)
+    broadcast_id = today.isoformat()
+    text, reply_markup = gesture_message(get_word_calendar().word_for(today), 'word_of_day')
+    await run_broadcast(
+        context.bot,
+        context.bot_data['subscribers'],
+        broadcast_id,
+        text,
         reply_markup=reply_markup,
+        shard=BROADCAST_SHARD,
+        shards=BROADCAST_SHARDS
+    )
+
+
+async def start_metrics(application: Application):
+    """Запустить эндпоинт /metrics и продолжить незаконченную рассылку"""
+    if METRICS_PORT:
+        # процессы кластера на одной машине не должны делить порт
+        cluster = application.bot_data.get('cluster')
+        port = METRICS_PORT + cluster.worker if cluster else METRICS_PORT
+        await application.bot_data['metrics'].serve(METRICS_HOST, port)
+    await resume_broadcast(application)
+
+
+def register_metrics(metrics, application):
+    """Подключить к /metrics словари metrics() очереди, ограничителя и хранилищ"""
+    metrics.collect('updates', lambda: dict(
+        application.update_processor.metrics(), update_queue=application.update_queue.qsize()
+    ))
+    if isinstance(application.bot.rate_limiter, PriorityRateLimiter):
+        metrics.collect('rate_limiter', application.bot.rate_limiter.metrics)
+    metrics.collect('users', application.bot_data['users'].metrics)
+    metrics.collect('inline', lambda: INLINE.metrics() if INLINE is not None else {})
+    metrics.collect('buttons', ROUTER.metrics)
+    metrics.collect('edits', EDITOR.metrics)
+    metrics.collect('corpus', CORPUS.metrics)
+    metrics.collect('facets', lambda: FACETS.metrics())
+    metrics.collect('recommender', lambda: RECOMMENDER.metrics() if RECOMMENDER is not None else {})
+    if 'cluster' in application.bot_data:
+        metrics.collect('cluster', application.bot_data['cluster'].metrics)
+    if 'antiflood' in application.bot_data:
+        metrics.collect('antiflood', application.bot_data['antiflood'].metrics)
+
+
+async def resume_broadcast(application: Application):
+    """После перезапуска продолжить сегодняшнюю рассылку, если она не закончена"""
+    cluster = application.bot_data.get('cluster')
+    if cluster is not None and not cluster.is_leader:
+        # в кластере — когда процесс станет ведущим (см. cluster.py)
+        return
+    store = application.bot_data['subscribers']
+    broadcast_id = DAY_CLOCK.today(BROADCAST_TZ).isoformat()
+    buckets = [b for b in range(BUCKETS) if b % BROADCAST_SHARDS == BROADCAST_SHARD]
+    if store.progress(broadcast_id) and not store.is_finished(broadcast_id, buckets):
+        logger.info("Продолжаем рассылку %s", broadcast_id)
+        application.job_queue.run_once(daily_broadcast, 0)
+
+
+async def search_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Поиск жеста по тексту сообщения"""
+    results = SEARCH_INDEX.search(update.message.text, limit=8)
+    
+    if not results:
+        await update.message.reply_text(
+            "🔍 Ничего не найдено. Попробуйте другое слово.",
+            reply_markup=BACK_KEYBOARD
+        )
+        return
+    
+    await update.message.reply_text(
+        f"🔍 <b>Найдено жестов: {len(results)}</b>\n\nВыберите жест:",
+        reply_markup=gesture_list_keyboard(key for key, _ in results),
         parse_mode='HTML'
     )
 
 
+async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Inline-режим: @bot слово — поиск жеста из любого чата"""
+    from inline import CACHE_TIME, EMPTY_CACHE_TIME
+    
+    query = update.inline_query
+    if not query.query.strip():
+        await query.answer([inline_article(get_word_of_day())], cache_time=EMPTY_CACHE_TIME)
+        return
+    
+    results = await get_inline().answer(query.from_user.id, query.id, query.query)
+    if results is None:
+        # пользователь уже набрал запрос длиннее
+        return
+    await query.answer(results, cache_time=CACHE_TIME, is_personal=False)
+
+
 # === ОБРАБОТЧИК КНОПОК ===
 
-async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Обработка нажатий на кнопки"""
+# Кнопки несут упакованную callback_data (см. router.py); обработчик
+# выбирается по номеру действия, без цепочки сравнений строк
+
+def gesture_list_keyboard(keys):
+    """Клавиатура со списком жестов"""
+    keyboard = [
+        [InlineKeyboardButton(GESTURES_DB[key]['main_meaning'], callback_data=gesture_data(router.GESTURE, key))]
+        for key in keys
+    ]
+    keyboard.append([InlineKeyboardButton("◀️ В меню", callback_data=callback_data(router.BACK))])
+    return InlineKeyboardMarkup(keyboard)
+
+
+async def stale_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Кнопка из старого сообщения, которую уже не понять: вернуть в меню"""
     query = update.callback_query
-    await query.answer()
+    await query.answer("Эта кнопка устарела — база жестов обновилась")
+    await edit_page(update, (format_main_menu(query.from_user.first_name), MAIN_KEYBOARD))
+
+
+ROUTER = Router(stale_button)
+# кнопки жестов до перехода на упакованную callback_data
+ROUTER.legacy_prefix('gesture_', router.GESTURE)
+ROUTER.alias('all_gestures', router.PAGE, ALL_SCOPE, 0)
+ROUTER.alias('categories', router.CATEGORIES, 0)
+
+
+@ROUTER.route(router.NOOP, aliases=('noop',))
+async def noop_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Кнопка «N/M» ничего не делает"""
+
+
+async def show_gesture(update, context, word, variant='full'):
+    """Показать жест в сообщении с кнопкой и прислать ролик"""
+    record_view(update, context, word)
+    if await edit_page(update, gesture_message(word, variant)):
+        await send_gesture_media(update, context, word)
+
+
+@ROUTER.route(router.WORD_OF_DAY, aliases=('word_of_day',))
+async def word_of_day_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await show_gesture(update, context, get_word_of_day(user_timezone(update, context)), 'word_of_day')
+
+
+@ROUTER.route(router.RANDOM_GESTURE, aliases=('random_gesture',))
+async def random_gesture_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await show_gesture(update, context, get_recommender(context.bot_data).recommend(user_record(update, context)))
+
+
+@ROUTER.route(router.GESTURE, gesture=True)
+async def gesture_button(update: Update, context: ContextTypes.DEFAULT_TYPE, word):
+    await show_gesture(update, context, word)
+
+
+@ROUTER.route(router.GESTURE_PAGE, gesture=True)
+async def gesture_page_button(update: Update, context: ContextTypes.DEFAULT_TYPE, word, variant=0, page=0):
+    variant = GESTURE_VARIANTS[variant] if variant < len(GESTURE_VARIANTS) else 'full'
+    await edit_page(update, gesture_message(word, variant, page))
+
+
+# Правки сообщений: если нажатие ничего не меняет, запрос не отправляется (см. layout.py)
+EDITOR = Editor()
+
+
+async def edit_page(update, text_and_markup):
+    """Показать страницу в сообщении нажатой кнопки; False, если оно уже такое"""
+    text, reply_markup = text_and_markup
+    return await EDITOR.edit(update.callback_query, text, reply_markup)
+
+
+@ROUTER.route(router.QUIZ, aliases=('quiz',))
+async def quiz_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await edit_page(update, quiz_question(update.effective_user.id, get_quiz_store(context.bot_data)))
+
+
+@ROUTER.route(router.QUIZ_ANSWER, gesture=True)
+async def quiz_answer_button(update: Update, context: ContextTypes.DEFAULT_TYPE, gesture, correct=0):
+    get_recommender(context.bot_data).answered(user_record(update, context), gesture, correct == 1)
+    context.bot_data['users'].mark_dirty(update.effective_user.id)
+    await edit_page(update, quiz_result(update.effective_user.id, get_quiz_store(context.bot_data), gesture, correct == 1))
+
+
+@ROUTER.route(router.CATEGORIES)
+async def categories_button(update: Update, context: ContextTypes.DEFAULT_TYPE, page=0):
+    await edit_page(update, categories_page(CATALOG, page))
+
+
+@ROUTER.route(router.PAGE)
+async def page_button(update: Update, context: ContextTypes.DEFAULT_TYPE, scope=ALL_SCOPE, page=0):
+    try:
+        await edit_page(update, gestures_page(CATALOG, scope, page))
+    except IndexError:
+        # категории с таким номером после перезагрузки базы уже нет
+        await edit_page(update, categories_page(CATALOG, 0))
+
+
+@ROUTER.route(router.FILTER)
+async def filter_button(update: Update, context: ContextTypes.DEFAULT_TYPE, *choice):
+    from facets import filter_page
+    await edit_page(update, filter_page(FACETS, choice))
+
+
+@ROUTER.route(router.FILTER_PAGE)
+async def filter_page_button(update: Update, context: ContextTypes.DEFAULT_TYPE, page=0, *choice):
+    from facets import filter_results_page
+    await edit_page(update, filter_results_page(FACETS, CATALOG, choice, page))
+
+
+@ROUTER.route(router.SEARCH, aliases=('search',))
+async def search_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await edit_page(update, ("🔍 <b>ПОИСК</b>\n\nНапишите слово, и я найду жест.", BACK_KEYBOARD))
+
+
+@ROUTER.route(router.HELP, aliases=('help',))
+async def help_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await edit_page(update, (help_text(), BACK_KEYBOARD))
+
+
+@ROUTER.route(router.BACK, aliases=('back',))
+async def back_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await edit_page(update, (format_main_menu(update.effective_user.first_name), MAIN_KEYBOARD))
+
+
+# === ЗАПУСК ===
+
+def build_application(
+    token, base_url=None, concurrent_updates=CONCURRENT_UPDATES, db_path=DB_PATH,
+    users=None, rate_limiter=None, instrument=True, cluster=CLUSTER_WORKER, request=None, antiflood=None,
+):
+    """
+    Собрать приложение со всеми обработчиками.
+    users и rate_limiter заменяют хранилище UserStore и ограничитель по умолчанию,
+    antiflood — защиту от флуда (см. antiflood.py), False — без неё (для замеров);
+    request — транспорт запросов к Bot API (для замеров без сети);
+    instrument=False — без замеров обработчиков (для сравнения в бенчмарках);
+    cluster — (k, N), процесс k из N общего кластера (см. cluster.py).
+    """
+    workers = cluster[1] if cluster else 1
+    builder = (
+        Application.builder()
+        .token(token)
+        .concurrent_updates(ChatOrderedUpdateProcessor(concurrent_updates))
+        # общий лимит Telegram делится между процессами кластера
+        .rate_limiter(rate_limiter or PriorityRateLimiter(overall_rate=OVERALL_RATE / workers))
+        .post_init(start_metrics)
+        .post_shutdown(close_storage)
+    )
+    if base_url:
+        builder = builder.base_url(base_url)
+    if request:
+        builder = builder.request(request).get_updates_request(request)
+    application = builder.build()
+    application.bot_data['subscribers'] = SubscriberStore(db_path)
+    application.bot_data['users'] = users or UserStore(SQLiteBackend(db_path))
+    # тренировки, ролики и рекомендации открывают базу при первом обращении
+    application.bot_data['db_path'] = db_path
+    daily = daily_broadcast
+    if cluster:
+        from cluster import Cluster, ClusterStore, leader_only
+        daily = leader_only(daily_broadcast)
+        application.bot_data['cluster'] = Cluster(ClusterStore(db_path), *cluster)
+        application.bot_data['cluster'].on_leader.append(resume_broadcast)
+    if antiflood is not False:
+        from antiflood import Antiflood
+        application.bot_data['antiflood'] = antiflood or Antiflood()
+    metrics = application.bot_data['metrics'] = Metrics()
+    register_metrics(metrics, application)
+    job = metrics.wrap if instrument else (lambda name, callback: callback)
+    
+    hour, minute = map(int, BROADCAST_TIME.split(':'))
+    application.job_queue.run_daily(
+        job('daily_broadcast', daily),
+        time=dt_time(hour, minute, tzinfo=BROADCAST_TZ),
+        name='daily_broadcast'
+    )
+    application.job_queue.run_repeating(job('watch_corpus', watch_corpus), interval=WATCH_INTERVAL, name='watch_corpus')
+    application.job_queue.run_repeating(
+        job('flush_users', flush_users),
+        interval=application.bot_data['users'].flush_interval,
+        name='flush_users'
+    )
+    
+    if 'antiflood' in application.bot_data:
+        # раньше всех обработчиков: отброшенное дальше не идёт
+        application.add_handler(TypeHandler(Update, application.bot_data['antiflood'].guard), group=-1)
+    application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("help", help_command))
+    application.add_handler(CommandHandler("word", word_of_day_command))
+    application.add_handler(CommandHandler("quiz", quiz_command))
+    application.add_handler(CommandHandler("timezone", timezone_command))
+    application.add_handler(CommandHandler("subscribe", subscribe_command))
+    application.add_handler(CommandHandler("unsubscribe", unsubscribe_command))
+    application.add_handler(CommandHandler("warmup", warmup_command))
+    application.add_handler(CallbackQueryHandler(ROUTER.dispatch))
+    application.add_handler(InlineQueryHandler(inline_query))
+    application.add_handler(MessageHandler(filters.UpdateType.MESSAGE & filters.TEXT & ~filters.COMMAND, search_message))
+    
+    if instrument:
+        # нажатия кнопок считаются по действиям (см. router.py)
+        names = {ROUTER.dispatch: lambda update: f'button:{ROUTER.name(update.callback_query.data)}'}
+        if 'antiflood' in application.bot_data:
+            names[application.bot_data['antiflood'].guard] = 'antiflood'
+        metrics.instrument(application, names)
+    
+    return application
+
+
+def webhook_args():
+    """Параметры вебхука из окружения"""
+    if not WEBHOOK_URL:
+        logger.error("❌ WEBHOOK_URL not found!")
+        exit(1)
+    
+    url_path = f"webhook/{TOKEN.split(':')[0]}"
+    return dict(
+        listen='0.0.0.0',
+        port=PORT,
+        url_path=url_path,
+        webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{url_path}",
+        secret_token=WEBHOOK_SECRET,
+        allowed_updates=Update.ALL_TYPES
+    )
+
+
+def run_webhook(application):
+    """Приём обновлений через вебхук; остановка по SIGTERM/SIGINT штатная"""
+    application.run_webhook(**webhook_args())
+
+
+def run_cluster(application, mode):
+    """
+    Процесс кластера: вебхук принимает каждый процесс, getUpdates
+    опрашивает только ведущий; обработка — из общей очереди
+    """
+    from cluster import serve
+    
+    cluster = application.bot_data['cluster']
+    logger.info("Процесс кластера %d/%d", cluster.worker, cluster.workers)
+    if mode == 'webhook':
+        asyncio.run(serve(application, cluster, webhook=webhook_args()))
+    else:
+        asyncio.run(serve(application, cluster, polling=dict(allowed_updates=Update.ALL_TYPES)))
+
+
+def main():
+    """Запуск бота"""
+    parser = argparse.ArgumentParser(description="Слово дня — РЖЯ")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--webhook', dest='mode', action='store_const', const='webhook')
+    mode.add_argument('--polling', dest='mode', action='store_const', const='polling')
+    args = parser.parse_args()
+    
+    if not TOKEN:
+        logger.error("❌ BOT_TOKEN not found!")
+        exit(1)
     
-    if query.data == 'word_of_day':
-        word = get_word_of_day()
-        message = f"📅 <b>СЛОВО ДНЯ</b>\n\n{format_gesture_full(word)}"
-        
-        keyboard = [
-            [InlineKeyboardButton("🔄 Случайный жест", callback_data='random_gesture')],
-            [InlineKeyboardButton
+    application = build_application(TOKEN, base_url=TELEGRAM_API_URL)
+    
+    logger.info("🤟 Бот запущен!")
+    if CLUSTER_WORKER:
+        run_cluster(application, args.mode or BOT_MODE)
+    elif (args.mode or BOT_MODE) == 'webhook':
+        run_webhook(application)
+    else:
+        application.run_polling(allowed_updates=Update.ALL_TYPES)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""
+Рассылка «слова дня» всем подписчикам.
+
+Корзины подписчиков (см. subscribers.py) делятся между процессами
+(shard k из N берёт корзины с номером % N == k) и внутри процесса
+разбираются несколькими asyncio-воркерами. Каждый воркер читает свою
+корзину кусками и отправляет по порядку chat_id, а прогресс корзин
+периодически сохраняется одной транзакцией. Перезапущенная рассылка
+продолжает с сохранённых точек; при штатной остановке точки
+сохраняются перед выходом, поэтому повторных отправок нет.
+"""
+
+import asyncio
+import logging
+import time
+
+from telegram.error import Forbidden, TelegramError
+
+from rate_limiter import BROADCAST
+from subscribers import BUCKETS, START
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_INTERVAL = 1.0
+
+
+async def _finish(future):
+    """Дождаться future до конца, даже если нас при этом отменяют"""
+    while not future.done():
+        try:
+            await asyncio.shield(future)
+        except asyncio.CancelledError:
+            pass
+
+
+class BroadcastStats:
+    def __init__(self):
+        self.sent = 0
+        self.failed = 0
+        self.unsubscribed = 0
+        self.started = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def __repr__(self):
+        return (f"sent={self.sent} failed={self.failed} unsubscribed={self.unsubscribed} "
+                f"elapsed={self.elapsed:.1f}s")
+
+
+async def run_broadcast(
+    bot, store, broadcast_id, text, reply_markup=None,
+    shard=0, shards=1, workers=32, chunk_size=500, parse_mode='HTML',
+):
+    """Разослать text подписчикам корзин этого шарда; возвращает BroadcastStats"""
+    stats = BroadcastStats()
+    progress = store.progress(broadcast_id)
+    buckets = [b for b in range(BUCKETS) if b % shards == shard and not progress.get(b, (START, False))[1]]
+    checkpoints = {}
+    queue = asyncio.Queue()
+    for bucket in buckets:
+        queue.put_nowait(bucket)
+
+    async def send(chat_id):
+        try:
+            await bot.send_message(
+                chat_id, text, reply_markup=reply_markup, parse_mode=parse_mode,
+                rate_limit_args=BROADCAST
+            )
+            stats.sent += 1
+        except Forbidden:
+            # пользователь заблокировал бота
+            store.unsubscribe(chat_id)
+            stats.unsubscribed += 1
+        except TelegramError as exc:
+            # неверный запрос, сбой сети или RetryAfter после всех повторов:
+            # этот чат пропускаем, рассылка идёт дальше
+            logger.warning("Broadcast %s to %s failed: %s", broadcast_id, chat_id, exc)
+            stats.failed += 1
+
+    async def worker():
+        while not queue.empty():
+            bucket = queue.get_nowait()
+            after = progress.get(bucket, (START, False))[0]
+            for chunk in store.iter_bucket(bucket, after, chunk_size):
+                for chat_id in chunk:
+                    sending = asyncio.ensure_future(send(chat_id))
+                    try:
+                        await asyncio.shield(sending)
+                    except asyncio.CancelledError:
+                        # начатую отправку доводим до конца, чтобы контрольная
+                        # точка совпадала с тем, что действительно ушло
+                        await _finish(sending)
+                        if not sending.cancelled() and sending.exception() is None:
+                            checkpoints[bucket] = (chat_id, False)
+                        raise
+                    checkpoints[bucket] = (chat_id, False)
+            checkpoints[bucket] = (checkpoints.get(bucket, (after, False))[0], True)
+
+    def flush():
+        if checkpoints:
+            store.save_progress(broadcast_id, checkpoints)
+            checkpoints.clear()
+
+    async def checkpointer():
+        while True:
+            await asyncio.sleep(CHECKPOINT_INTERVAL)
+            flush()
+
+    ticker = asyncio.create_task(checkpointer())
+    tasks = [asyncio.create_task(worker()) for _ in range(min(workers, len(buckets)))]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        # при отмене воркеры досылают начатые сообщения — дожидаемся их,
+        # прежде чем сохранить контрольные точки
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await _finish(asyncio.ensure_future(asyncio.wait(tasks)))
+        ticker.cancel()
+        flush()
+    logger.info("Broadcast %s shard %d/%d: %r", broadcast_id, shard, shards, stats)
+    return stats
@@ -0,0 +1,99 @@
+"""
+Параллельная обработка обновлений с сохранением порядка внутри чата.
+
+Обновления разных чатов обрабатываются одновременно (не больше заданного
+предела), а обновления одного чата — строго по очереди, в порядке
+поступления. Подключается через ApplicationBuilder.concurrent_updates().
+"""
+
+import asyncio
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+# Сколько обновлений может ждать своей очереди, прежде чем PTB
+# перестанет создавать новые задачи
+MAX_PENDING_UPDATES = 10000
+
+
+def ordering_key(update):
+    """Ключ очереди: чат, иначе пользователь; None — порядок не важен"""
+    if isinstance(update, Update):
+        if update.inline_query:
+            # inline-запросы независимы, и новый не должен ждать старый
+            return None
+        if update.effective_chat:
+            return update.effective_chat.id
+        if update.effective_user:
+            return update.effective_user.id
+    return None
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Не больше max_concurrent_updates обработчиков сразу, по одному на чат"""
+
+    def __init__(self, max_concurrent_updates, max_pending_updates=MAX_PENDING_UPDATES):
+        # Семафор базового класса ограничивает только число ожидающих задач:
+        # если бы он ограничивал обработку, обновления одного «шумного» чата,
+        # стоящие в очереди за своим чатом, заняли бы все места
+        if max_concurrent_updates < 1:
+            raise ValueError("`max_concurrent_updates` must be a positive integer!")
+        self._limit = max_concurrent_updates
+        super().__init__(max(max_pending_updates, max_concurrent_updates))
+        self._slots = asyncio.Semaphore(max_concurrent_updates)
+        self._tails = {}
+        self.queue_depth = 0
+        self.in_flight = 0
+        self.processed = 0
+        self.on_processed = []  # функции (update), когда обработка обновления закончена
+
+    @property
+    def concurrency_limit(self):
+        """Сколько обработчиков может работать одновременно"""
+        return self._limit
+
+    def metrics(self):
+        """Текущие значения для мониторинга"""
+        return {
+            'queue_depth': self.queue_depth,
+            'in_flight': self.in_flight,
+            'processed': self.processed,
+            'active_chats': len(self._tails),
+        }
+
+    async def do_process_update(self, update, coroutine):
+        key = ordering_key(update)
+        previous = self._tails.get(key) if key is not None else None
+        done = asyncio.get_running_loop().create_future()
+        if key is not None:
+            self._tails[key] = done
+
+        self.queue_depth += 1
+        waiting = True
+        try:
+            if previous is not None:
+                await previous
+            async with self._slots:
+                self.queue_depth -= 1
+                waiting = False
+                self.in_flight += 1
+                try:
+                    await coroutine
+                finally:
+                    self.in_flight -= 1
+                    self.processed += 1
+                    for callback in self.on_processed:
+                        callback(update)
+        finally:
+            if waiting:
+                self.queue_depth -= 1
+                coroutine.close()
+            done.set_result(None)
+            if key is not None and self._tails.get(key) is done:
+                del self._tails[key]
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
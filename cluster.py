@@ -0,0 +1,480 @@
+"""
+Несколько процессов бота на одном потоке обновлений.
+
+Обновления принимаются как обычно (long polling или вебхук), но не
+обрабатываются сразу, а кладутся в общую очередь — таблицу SQLite рядом
+с остальными данными бота. Очередь разбита на PARTITIONS частей по чату
+(chat_id % PARTITIONS, для inline-запросов — по пользователю), и каждая
+часть принадлежит одному процессу: CLUSTER_WORKER=k/N берёт части
+p % N == k. Так обновления одного чата обрабатывает всегда один процесс
+и по порядку update_id, а дальше их порядок держит ChatOrderedUpdateProcessor.
+
+Обновление забирается из очереди одним UPDATE … RETURNING, поэтому
+дважды его не получит никто; update_id — первичный ключ, и повторно
+принятое обновление (после смены ведущего при polling или повтора
+вебхука) в очередь не попадает. Обработанные обновления отмечаются
+(done) пачками, и процесс, который берёт аренду части, возвращает в
+очередь то, что прежний владелец забрал и не успел обработать: упавший
+процесс не теряет обновлений. Повторно обработаны могут быть только те,
+что он закончил в последние мгновения перед падением, не успев отметить.
+
+Аренды (lease) в той же базе:
+    worker:k/N  — номер процесса: второй процесс с тем же k ждёт, пока
+                  аренда первого истечёт, и только потом забирает его части;
+    leader      — ведущий: только он опрашивает getUpdates (Telegram
+                  отдаёт обновления одному потребителю) и выполняет задачи
+                  по расписанию вроде ежедневной рассылки (см. leader_only).
+Аренда продлевается каждые RENEW_INTERVAL секунд и живёт LEASE_TTL, так
+что упавшего ведущего заменяют не позже чем через LEASE_TTL.
+
+Подписки, карточки тренировки и file_id роликов и так лежат в общей
+SQLite. Кэш записей пользователей (storage.py) у каждого процесса свой;
+это безопасно, пока пользователь пишет боту в личный чат — его
+обновления приходят в одну часть очереди.
+
+    CLUSTER_WORKER=0/2 python bot.py
+    CLUSTER_WORKER=1/2 python bot.py
+"""
+
+import asyncio
+import functools
+import json
+import logging
+import os
+import signal
+import socket
+import time
+
+from telegram import Update
+from telegram.ext import Updater
+
+from chat_scheduler import ordering_key
+from subscribers import connect
+
+logger = logging.getLogger(__name__)
+
+PARTITIONS = 64
+
+# Аренда, с: срок и период продления
+LEASE_TTL = 15.0
+RENEW_INTERVAL = 5.0
+
+# Пауза между опросами пустой очереди и размер одной выборки
+POLL_INTERVAL = 0.02
+CLAIM_BATCH = 100
+
+# Пауза перед повтором после ошибки SQLite (например, «database is locked»), с
+ERROR_BACKOFF = 1.0
+
+# Сколько хранить забранные обновления (защита от повторного приёма), с
+RETENTION = 3600
+
+LEADER = 'leader'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cluster_updates (
+    update_id INTEGER PRIMARY KEY,
+    part INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    received_at REAL NOT NULL,
+    claimed_by TEXT,
+    done INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS cluster_updates_pending ON cluster_updates (part, update_id) WHERE claimed_by IS NULL;
+CREATE TABLE IF NOT EXISTS cluster_leases (
+    name TEXT PRIMARY KEY,
+    holder TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+
+def parse_worker(value):
+    """'k/N' -> (k, N)"""
+    worker, workers = map(int, value.split('/'))
+    if not 0 <= worker < workers:
+        raise ValueError(f"CLUSTER_WORKER={value}: нужно 0 <= k < N")
+    return worker, workers
+
+
+def partition(update, partitions=PARTITIONS):
+    """Часть очереди обновления: по чату, иначе по пользователю"""
+    key = ordering_key(update)
+    if key is None and update.effective_user:
+        key = update.effective_user.id
+    return (key or 0) % partitions
+
+
+class ClusterStore:
+    """Общая очередь обновлений и аренды (SQLite)"""
+
+    def __init__(self, path, partitions=PARTITIONS):
+        self.path = path
+        self.partitions = partitions
+        self._db = connect(path)
+        columns = {row[1] for row in self._db.execute('PRAGMA table_info(cluster_updates)')}
+        if columns and 'done' not in columns:
+            # очередь от версии без отметок об обработке
+            self._db.execute('ALTER TABLE cluster_updates ADD COLUMN done INTEGER NOT NULL DEFAULT 0')
+        self._db.executescript(SCHEMA)
+        self._db.execute(
+            'CREATE INDEX IF NOT EXISTS cluster_updates_unfinished ON cluster_updates (part) '
+            'WHERE claimed_by IS NOT NULL AND done = 0'
+        )
+
+    def close(self):
+        self._db.close()
+
+    # --- Очередь ---
+
+    def push(self, updates):
+        """Добавить [(update_id, часть, JSON)]; возвращает число новых"""
+        now = time.time()
+        with self._db:
+            self._db.execute('BEGIN')
+            before = self._db.total_changes
+            self._db.executemany(
+                'INSERT OR IGNORE INTO cluster_updates (update_id, part, payload, received_at) VALUES (?, ?, ?, ?)',
+                ((update_id, part, payload, now) for update_id, part, payload in updates)
+            )
+            return self._db.total_changes - before
+
+    def claim(self, parts, holder, limit=CLAIM_BATCH):
+        """Забрать до limit обновлений из частей parts: [(update_id, JSON)] по возрастанию"""
+        marks = ','.join('?' * len(parts))
+        rows = self._db.execute(
+            f'UPDATE cluster_updates SET claimed_by = ? WHERE update_id IN ('
+            f'SELECT update_id FROM cluster_updates WHERE claimed_by IS NULL AND part IN ({marks}) '
+            f'ORDER BY update_id LIMIT ?) RETURNING update_id, payload',
+            (holder, *parts, limit)
+        ).fetchall()
+        rows.sort()
+        return rows
+
+    def finish(self, update_ids):
+        """Отметить обновления обработанными"""
+        with self._db:
+            self._db.execute('BEGIN')
+            self._db.executemany('UPDATE cluster_updates SET done = 1 WHERE update_id = ?',
+                                 ((update_id,) for update_id in update_ids))
+
+    def reclaim(self, parts, holder):
+        """
+        Вернуть в очередь обновления частей parts, которые забрал и не
+        успел обработать другой процесс; возвращает их число
+        """
+        marks = ','.join('?' * len(parts))
+        return self._db.execute(
+            f'UPDATE cluster_updates SET claimed_by = NULL WHERE claimed_by IS NOT NULL AND claimed_by != ? '
+            f'AND done = 0 AND part IN ({marks})',
+            (holder, *parts)
+        ).rowcount
+
+    def pending(self):
+        return self._db.execute('SELECT COUNT(*) FROM cluster_updates WHERE claimed_by IS NULL').fetchone()[0]
+
+    def purge(self, before):
+        """Удалить забранные обновления, принятые раньше before"""
+        return self._db.execute(
+            'DELETE FROM cluster_updates WHERE claimed_by IS NOT NULL AND received_at < ?', (before,)
+        ).rowcount
+
+    # --- Аренды ---
+
+    def acquire(self, name, holder, ttl=LEASE_TTL, now=None):
+        """Взять или продлить аренду; True, если она у holder"""
+        now = time.time() if now is None else now
+        cursor = self._db.execute(
+            'INSERT INTO cluster_leases (name, holder, expires_at) VALUES (?, ?, ?) '
+            'ON CONFLICT (name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at '
+            'WHERE cluster_leases.holder = excluded.holder OR cluster_leases.expires_at < ?',
+            (name, holder, now + ttl, now)
+        )
+        return cursor.rowcount == 1
+
+    def release(self, name, holder):
+        self._db.execute('DELETE FROM cluster_leases WHERE name = ? AND holder = ?', (name, holder))
+
+
+def leads(bot_data):
+    """Выполняет ли этот процесс задачи по расписанию (без кластера — всегда)"""
+    cluster = bot_data.get('cluster')
+    return cluster is None or cluster.is_leader
+
+
+def leader_only(callback):
+    """Задача JobQueue, которую в кластере выполняет только ведущий"""
+    @functools.wraps(callback)
+    async def wrapper(context):
+        if leads(context.bot_data):
+            return await callback(context)
+    return wrapper
+
+
+class Cluster:
+    """Участие процесса в кластере: приём, разбор очереди и аренды"""
+
+    def __init__(self, store, worker=0, workers=1, holder=None, lease_ttl=LEASE_TTL,
+                 renew_interval=RENEW_INTERVAL, poll_interval=POLL_INTERVAL):
+        self.store = store
+        self.worker = worker
+        self.workers = workers
+        self.holder = holder or f'{socket.gethostname()}:{os.getpid()}'
+        self.parts = tuple(p for p in range(store.partitions) if p % workers == worker)
+        self.lease_ttl = lease_ttl
+        self.renew_interval = renew_interval
+        self.poll_interval = poll_interval
+        self.slot = f'worker:{worker}/{workers}'
+        self.on_leader = []     # корутины (application), когда процесс стал ведущим
+
+        self.is_leader = False
+        self.holds_slot = False
+        self.received = 0
+        self.duplicates = 0
+        self.claimed = 0
+        self.elections = 0
+        self.errors = 0
+
+        self._ingress = None
+        self._unpushed = []     # принятое, но ещё не записанное в очередь
+        self._finished = []     # update_id обработанных, ещё не отмеченных в очереди
+        self._renewed = float('-inf')
+        self._updater = None
+        self._polling = None
+        self._tasks = []
+
+    def metrics(self):
+        """Текущие значения для мониторинга"""
+        return {
+            'leader': int(self.is_leader),
+            'holds_slot': int(self.holds_slot),
+            'partitions': len(self.parts),
+            'received': self.received,
+            'duplicates': self.duplicates,
+            'claimed': self.claimed,
+            'elections': self.elections,
+            'errors': self.errors,
+        }
+
+    # --- Приём ---
+
+    def _push(self, updates):
+        rows = [
+            (u.update_id, partition(u, self.store.partitions), json.dumps(u.to_dict(), ensure_ascii=False))
+            for u in updates if isinstance(u, Update)
+        ]
+        added = self.store.push(rows)
+        self.received += added
+        self.duplicates += len(rows) - added
+
+    @staticmethod
+    def _drain(queue):
+        updates = []
+        while not queue.empty():
+            updates.append(queue.get_nowait())
+        return updates
+
+    async def _ingest(self):
+        """Перекладывать принятые обновления в общую очередь пачками"""
+        while True:
+            if not self._unpushed:
+                self._unpushed.append(await self._ingress.get())
+            self._unpushed.extend(self._drain(self._ingress))
+            try:
+                self._push(self._unpushed)
+            except Exception:
+                # обновления остаются в _unpushed и уйдут следующей пачкой
+                self.errors += 1
+                logger.exception("Не удалось записать %d обновлений в общую очередь", len(self._unpushed))
+                await asyncio.sleep(ERROR_BACKOFF)
+                continue
+            self._unpushed = []
+
+    # --- Разбор очереди ---
+
+    def _processed(self, update):
+        """Обработчик ChatOrderedUpdateProcessor.on_processed"""
+        self._finished.append(update.update_id)
+
+    def _flush_finished(self):
+        if self._finished:
+            finished, self._finished = self._finished, []
+            try:
+                self.store.finish(finished)
+            except Exception:
+                self._finished = finished + self._finished
+                raise
+
+    async def _consume(self, application):
+        """Забирать обновления своих частей и передавать их приложению"""
+        while True:
+            if not self.holds_slot or application.update_queue.qsize() >= CLAIM_BATCH:
+                await asyncio.sleep(self.poll_interval)
+                continue
+            try:
+                self._flush_finished()
+                rows = self.store.claim(self.parts, self.holder)
+            except Exception:
+                self.errors += 1
+                logger.exception("Не удалось забрать обновления из общей очереди")
+                await asyncio.sleep(ERROR_BACKOFF)
+                continue
+            if not rows:
+                await asyncio.sleep(self.poll_interval)
+                continue
+            self.claimed += len(rows)
+            # без await между claim и очередью приложения: остановка не
+            # оборвёт пачку посередине
+            for update_id, payload in rows:
+                try:
+                    update = Update.de_json(json.loads(payload), application.bot)
+                except Exception:
+                    self.errors += 1
+                    logger.exception("Обновление %s не разобрано и пропущено", update_id)
+                    continue
+                application.update_queue.put_nowait(update)
+
+    # --- Аренды ---
+
+    async def _renew(self, application):
+        while True:
+            try:
+                await self._renew_once(application)
+            except Exception:
+                self.errors += 1
+                logger.exception("Не удалось продлить аренды процесса %s", self.holder)
+                if time.monotonic() - self._renewed >= self.lease_ttl:
+                    # аренды могли истечь и достаться другим процессам
+                    self.holds_slot = False
+                    if self.is_leader:
+                        self.is_leader = False
+                        await self._set_polling(False)
+                await asyncio.sleep(ERROR_BACKOFF)
+                continue
+            await asyncio.sleep(self.renew_interval)
+
+    async def _renew_once(self, application):
+        renewed = time.monotonic()
+        held = self.holds_slot
+        self.holds_slot = self.store.acquire(self.slot, self.holder, self.lease_ttl)
+        if self.holds_slot and not held:
+            # прежний владелец части мог упасть, не обработав забранное
+            reclaimed = self.store.reclaim(self.parts, self.holder)
+            if reclaimed:
+                logger.warning("Процесс %s вернул в очередь %d необработанных обновлений", self.holder, reclaimed)
+        leader = self.store.acquire(LEADER, self.holder, self.lease_ttl)
+        self._renewed = renewed
+        if leader and not self.is_leader:
+            self.elections += 1
+            self.is_leader = True
+            logger.info("Процесс %s стал ведущим", self.holder)
+            await self._set_polling(True)
+            for callback in self.on_leader:
+                await callback(application)
+        elif not leader and self.is_leader:
+            self.is_leader = False
+            logger.warning("Процесс %s больше не ведущий", self.holder)
+            await self._set_polling(False)
+        if leader:
+            self.store.purge(time.time() - RETENTION)
+
+    async def _set_polling(self, on):
+        if self._polling is None or on == self._updater.running:
+            return
+        if on:
+            await self._updater.start_polling(**self._polling)
+        else:
+            await self._updater.stop()
+
+    # --- Запуск ---
+
+    async def start(self, application, polling=None, webhook=None):
+        """
+        Начать работу. polling — аргументы Updater.start_polling (опрос
+        ведёт только ведущий), webhook — аргументы start_webhook (вебхук
+        принимает каждый процесс); без обоих процесс только разбирает очередь.
+        """
+        self._ingress = asyncio.Queue()
+        self._updater = Updater(application.bot, self._ingress)
+        await self._updater.initialize()
+        if hasattr(application.update_processor, 'on_processed'):
+            application.update_processor.on_processed.append(self._processed)
+        self._polling = polling
+        if webhook is not None:
+            await self._updater.start_webhook(**webhook)
+        self._tasks = [
+            asyncio.create_task(self._ingest(), name='Cluster:ingest'),
+            asyncio.create_task(self._renew(application), name='Cluster:renew'),
+            asyncio.create_task(self._consume(application), name='Cluster:consume'),
+        ]
+        for task in self._tasks:
+            task.add_done_callback(self._task_done)
+
+    def _task_done(self, task):
+        """
+        Цикл остановился сам (ошибки внутри циклов перехватываются, так что
+        это непредвиденный сбой): без него процесс только держал бы свои
+        части, поэтому остальные циклы останавливаются, а аренды отдаются.
+        """
+        if task.cancelled() or task.exception() is None:
+            return
+        logger.error("Цикл %s кластера остановился", task.get_name(), exc_info=task.exception())
+        for other in self._tasks:
+            other.cancel()
+        self.is_leader = self.holds_slot = False
+        try:
+            self.store.release(LEADER, self.holder)
+            self.store.release(self.slot, self.holder)
+        except Exception:
+            # аренды истекут сами через LEASE_TTL
+            logger.exception("Не удалось освободить аренды процесса %s", self.holder)
+
+    async def stop(self):
+        # Updater.shutdown() закрыл бы и бота, а приложению он ещё нужен,
+        # чтобы доработать уже забранные обновления
+        if self._updater is not None and self._updater.running:
+            await self._updater.stop()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._ingress is not None:
+            # принятое, но ещё не переложенное — достанется другим процессам
+            self._push(self._unpushed + self._drain(self._ingress))
+            self._unpushed = []
+        self.store.release(LEADER, self.holder)
+        self.is_leader = self.holds_slot = False
+
+    def close(self):
+        """
+        После того как приложение доработало забранные обновления: отметить
+        их и отдать части. Раньше нельзя — новый владелец вернул бы в
+        очередь то, что ещё обрабатывается здесь.
+        """
+        self._flush_finished()
+        self.store.release(self.slot, self.holder)
+
+
+async def serve(application, cluster, polling=None, webhook=None, stop_signals=(signal.SIGINT, signal.SIGTERM)):
+    """Работать в кластере до сигнала остановки (вместо run_polling/run_webhook)"""
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in stop_signals:
+        loop.add_signal_handler(sig, stopping.set)
+
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+    await cluster.start(application, polling=polling, webhook=webhook)
+    try:
+        await stopping.wait()
+    finally:
+        await cluster.stop()
+        await application.stop()
+        cluster.close()
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
@@ -0,0 +1,378 @@
+"""
+Горячая перезагрузка базы жестов.
+
+Бот следит за временем изменения gestures.json. Новая версия читается,
+проверяется, компилируется в gestures.bin и индексируется в фоновом
+потоке, а обработчикам подменяется одним синхронным присваиванием —
+готовым неизменяемым снимком (Snapshot). Пока снимок собирается, бот
+продолжает отвечать по старому; если новая версия не прошла проверку,
+старая остаётся на месте.
+
+Перестраивается только то, что зависит от изменённых жестов: поисковый
+индекс копируется и обновляется по ним, подписи каталога перечитываются
+только у них, а кэш сообщений (см. reload_gestures в bot.py) рендерит
+заново только их.
+
+Категории не задаются отдельно: они выводятся из поля category жестов,
+а фасетный индекс (см. facets.py) строится и сверяется с данными в
+каждом снимке.
+
+Построенные индексы (поиск, категории, каталог, фасеты, таблица похожих
+жестов для рекомендаций — см. recommender.py) сохраняются в
+gestures.snapshot рядом с gestures.bin, и при старте бот загружает их
+оттуда, а не строит заново. Снимок помнит хэш gestures.bin и к другой
+версии базы не подходит — тогда индексы строятся и файл пишется заново.
+Поисковый индекс — самая тяжёлая часть снимка, а первому обновлению
+(/start) он не нужен: он хранится отдельно упакованным и распаковывается
+при первом поиске (см. PickledIndex).
+
+Сборка вручную (на Heroku — при сборке slug, см. bin/post_compile):
+    python corpus.py build [gestures.json] [gestures.bin] [gestures.snapshot]
+"""
+
+import gc
+import json
+import logging
+import os
+import pickle
+import sys
+import threading
+import time
+from typing import Mapping, NamedTuple
+
+from facets import FacetIndex
+from gesture_store import DEFAULT_COMPILED, DEFAULT_SOURCE, GestureStore, compile_corpus, load_source, normalize_key
+from pagination import Catalog
+from recommender import Similarity
+from search import SearchIndex
+
+logger = logging.getLogger(__name__)
+
+# Как часто проверять, не изменился ли исходник (с)
+WATCH_INTERVAL = 2.0
+
+DEFAULT_SNAPSHOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gestures.snapshot')
+
+# Версия формата файла снимка: старые файлы просто строятся заново
+SNAPSHOT_FORMAT = 3
+
+# Поля жеста и их типы
+SCHEMA = {
+    'gesture_name': str,
+    'main_meaning': str,
+    'alternative_meanings': list,
+    'description': str,
+    'examples': list,
+    'category': str,
+    'difficulty': str,
+    'tips': str,
+    'common_mistakes': str,
+}
+ALTERNATIVE_SCHEMA = {'word': str, 'context': str, 'example': str, 'difference': str}
+
+
+def validate(gestures):
+    """Проверить корпус; ValueError со списком всех ошибок"""
+    errors = []
+    if not isinstance(gestures, dict) or not gestures:
+        raise ValueError("корпус должен быть непустым объектом {слово: жест}")
+    seen = {}
+    for word, gesture in gestures.items():
+        key = normalize_key(word)
+        if key in seen:
+            errors.append(f"{word!r}: совпадает с {seen[key]!r} после нормализации")
+        seen[key] = word
+        if not isinstance(gesture, dict):
+            errors.append(f"{word!r}: жест должен быть объектом")
+            continue
+        for field, kind in SCHEMA.items():
+            if not isinstance(gesture.get(field), kind):
+                errors.append(f"{word!r}: поле {field} должно быть {kind.__name__}")
+        if isinstance(gesture.get('main_meaning'), str) and not gesture['main_meaning'].strip():
+            errors.append(f"{word!r}: пустое main_meaning")
+        for i, alt in enumerate(gesture.get('alternative_meanings') or ()):
+            if not isinstance(alt, dict) or any(not isinstance(alt.get(f), k) for f, k in ALTERNATIVE_SCHEMA.items()):
+                errors.append(f"{word!r}: alternative_meanings[{i}] неполное")
+    if errors:
+        raise ValueError("; ".join(errors[:20]) + (f" … и ещё {len(errors) - 20}" if len(errors) > 20 else ""))
+
+
+def derive_categories(gestures):
+    """{категория: [ключи]} в порядке первого появления в корпусе"""
+    categories = {}
+    for word, gesture in gestures.items():
+        categories.setdefault(gesture['category'], []).append(normalize_key(word))
+    return categories
+
+
+class Snapshot(NamedTuple):
+    """Согласованная версия базы и всего, что из неё построено"""
+    version: int
+    gestures: Mapping
+    categories: dict
+    search: SearchIndex     # из файла — PickledIndex
+    catalog: Catalog
+    keys: tuple             # ключи по возрастанию
+    facets: FacetIndex
+    similarity: Similarity
+    changed: tuple = ()
+    removed: tuple = ()
+
+
+class PickledIndex:
+    """
+    Поисковый индекс из файла снимка, распакованный при первом обращении;
+    в остальном ведёт себя как SearchIndex
+    """
+
+    def __init__(self, data):
+        self._data = data
+        self._index = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Распакованный SearchIndex (распаковка — один раз, из любого потока)"""
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    gc.disable()
+                    try:
+                        self._index = pickle.loads(self._data)
+                    finally:
+                        gc.enable()
+                    self._data = None
+                    # индекс живёт до перезагрузки базы: сборщику мусора незачем его обходить
+                    gc.freeze()
+        return self._index
+
+    def pickled(self):
+        """Индекс в виде для файла снимка: нераспакованный — как был прочитан"""
+        with self._lock:
+            if self._data is not None:
+                return self._data
+        return pickle.dumps(self._index, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def __len__(self):
+        return len(self.load())
+
+    def __getattr__(self, name):
+        return getattr(self.load(), name)
+
+
+def build_facets(keys, records, categories, catalog):
+    """Фасетный индекс, сверенный с данными; ValueError при расхождении"""
+    facets = FacetIndex(keys, records)
+    facets.check(records, categories, catalog)
+    return facets
+
+
+def initial_snapshot(gestures):
+    """Снимок для старта: всё строится с нуля"""
+    # записи декодируются один раз и мимо LRU-кэша хранилища
+    records = {key: json.loads(record) for key, record in gestures.raw_items()}
+    categories = derive_categories(records)
+    keys = tuple(sorted(records))
+    catalog = Catalog(gestures, categories, {key: records[key]['main_meaning'] for key in keys})
+    facets = build_facets(keys, records, categories, catalog)
+    return Snapshot(0, gestures, categories, SearchIndex(gestures), catalog, keys, facets, Similarity(keys, records))
+
+
+def diff(old, new):
+    """
+    (изменённые и новые, удалённые) ключи. Оба хранилища обходятся
+    слиянием по возрастанию ключа и сравниваются байты записей, так что
+    ничего не декодируется.
+    """
+    changed, removed = [], []
+    old_items, new_items = old.sorted_raw(), new.sorted_raw()
+    old_item, new_item = next(old_items, None), next(new_items, None)
+    while old_item is not None or new_item is not None:
+        if new_item is None or (old_item is not None and old_item[0] < new_item[0]):
+            removed.append(old_item[0])
+            old_item = next(old_items, None)
+        elif old_item is None or new_item[0] < old_item[0]:
+            changed.append(new_item[0])
+            new_item = next(new_items, None)
+        else:
+            if old_item[1] != new_item[1]:
+                changed.append(new_item[0])
+            old_item, new_item = next(old_items, None), next(new_items, None)
+    return tuple(changed), tuple(removed)
+
+
+def save_snapshot(snapshot, path):
+    """
+    Записать индексы снимка (атомарно, через временный файл). Сначала
+    идёт заголовок с хэшем базы, чтобы проверить его, не читая остальное.
+    """
+    header = {'format': SNAPSHOT_FORMAT, 'digest': snapshot.gestures.digest()}
+    search = snapshot.search
+    state = {
+        'categories': snapshot.categories,
+        # отдельно упакованным, чтобы при старте его можно было не распаковывать
+        'search': (
+            search.pickled() if isinstance(search, PickledIndex)
+            else pickle.dumps(search, protocol=pickle.HIGHEST_PROTOCOL)
+        ),
+        'catalog': snapshot.catalog,
+        'keys': snapshot.keys,
+        'facets': snapshot.facets,
+        'similarity': snapshot.similarity,
+    }
+    tmp_path = f'{path}.tmp{os.getpid()}'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def load_snapshot(gestures, path):
+    """Снимок из файла или None, если файла нет, он повреждён или от другой базы"""
+    try:
+        with open(path, 'rb') as f:
+            header = pickle.load(f)
+            if header.get('format') != SNAPSHOT_FORMAT or header.get('digest') != gestures.digest():
+                return None
+            # миллионы мелких объектов индекса: сборщик мусора только мешает
+            gc.disable()
+            try:
+                state = pickle.load(f)
+            finally:
+                gc.enable()
+    except FileNotFoundError:
+        return None
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, TypeError) as exc:
+        logger.warning("Снимок базы %s не читается: %s", path, exc)
+        return None
+    return Snapshot(
+        0, gestures, state['categories'], PickledIndex(state['search']), state['catalog'], state['keys'], state['facets'],
+        state['similarity']
+    )
+
+
+def open_snapshot(gestures, path=DEFAULT_SNAPSHOT):
+    """Снимок для старта: из файла, а если он не подходит — собранный и записанный заново"""
+    snapshot = load_snapshot(gestures, path)
+    if snapshot is None:
+        logger.warning("Снимок базы %s отсутствует или устарел, индексы строятся заново", path)
+        snapshot = initial_snapshot(gestures)
+        try:
+            save_snapshot(snapshot, path)
+        except OSError as exc:
+            logger.warning("Снимок базы не записан: %s", exc)
+    return snapshot
+
+
+def build_snapshot(current, source, compiled):
+    """Собрать следующий снимок из исходника (выполняется в фоновом потоке)"""
+    raw = load_source(source)
+    validate(raw)
+    compile_corpus(raw, compiled)
+    gestures = GestureStore(compiled)
+    changed, removed = diff(current.gestures, gestures)
+
+    search = current.search.copy()
+    for key in removed:
+        search.remove(key)
+    for key in changed:
+        search.add(key, gestures[key])
+    records = {normalize_key(word): gesture for word, gesture in raw.items()}
+    categories = derive_categories(records)
+    keys = tuple(key for key, _ in gestures.sorted_raw())
+    catalog = current.catalog.updated(gestures, categories, changed, keys)
+    facets = build_facets(keys, records, categories, catalog)
+    return Snapshot(
+        current.version + 1, gestures, categories, search, catalog, keys, facets, Similarity(keys, records),
+        changed, removed
+    )
+
+
+class CorpusWatcher:
+    """Следит за исходником базы и собирает новые снимки в фоне"""
+
+    def __init__(self, source, compiled, snapshot_path=None):
+        self.source = source
+        self.compiled = compiled
+        self.snapshot_path = snapshot_path
+        self._mtime = self._source_mtime()
+        self._lock = threading.Lock()
+
+        self.reloads = 0
+        self.failures = 0
+        self.last_build_seconds = 0.0
+        self.last_swap_seconds = 0.0
+        self.last_changed = 0
+
+    def metrics(self):
+        """Текущие значения для мониторинга"""
+        return {
+            'reloads': self.reloads,
+            'failures': self.failures,
+            'last_build_seconds': self.last_build_seconds,
+            'last_swap_seconds': self.last_swap_seconds,
+            'last_changed': self.last_changed,
+        }
+
+    def _source_mtime(self):
+        try:
+            return os.stat(self.source).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def changed(self):
+        """Изменился ли исходник с последней сборки"""
+        return self._source_mtime() != self._mtime
+
+    def build(self, current):
+        """
+        Новый снимок или None, если исходник не менялся или не прошёл
+        проверку (тогда остаётся текущий). Вызывается в фоновом потоке.
+        """
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            mtime = self._source_mtime()
+            if mtime == self._mtime:
+                return None
+            started = time.perf_counter()
+            try:
+                snapshot = build_snapshot(current, self.source, self.compiled)
+            except (OSError, ValueError) as exc:
+                self.failures += 1
+                logger.error("Новая версия базы жестов отклонена: %s", exc)
+                return None
+            finally:
+                # неудачную версию не пробуем снова, пока файл не изменится
+                self._mtime = mtime
+            self.last_build_seconds = time.perf_counter() - started
+            self.last_changed = len(snapshot.changed) + len(snapshot.removed)
+            if self.snapshot_path:
+                # чтобы следующий старт не строил индексы заново
+                try:
+                    save_snapshot(snapshot, self.snapshot_path)
+                except OSError as exc:
+                    logger.warning("Снимок базы не записан: %s", exc)
+            return snapshot
+        finally:
+            self._lock.release()
+
+    def swapped(self, seconds):
+        """Отметить подмену снимка и её длительность"""
+        self.reloads += 1
+        self.last_swap_seconds = seconds
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] != 'build':
+        print("Использование: python corpus.py build [gestures.json] [gestures.bin] [gestures.snapshot]")
+        sys.exit(2)
+    source = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_SOURCE
+    compiled = sys.argv[3] if len(sys.argv) > 3 else DEFAULT_COMPILED
+    snapshot_path = sys.argv[4] if len(sys.argv) > 4 else DEFAULT_SNAPSHOT
+    started = time.perf_counter()
+    raw = load_source(source)
+    validate(raw)
+    compile_corpus(raw, compiled)
+    snapshot = initial_snapshot(GestureStore(compiled))
+    save_snapshot(snapshot, snapshot_path)
+    print(f"✅ {snapshot_path}: {len(snapshot.keys)} жестов за {time.perf_counter() - started:.1f} с")
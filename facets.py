@@ -0,0 +1,233 @@
+"""
+Фасетный индекс жестов: подбор по категории, сложности и т. п.
+
+Номер жеста — его место в отсортированном списке ключей базы (тот же
+порядок, что у каталога «Все жесты»). Для каждого значения каждого
+фасета хранится битовое множество — целое число, у которого бит i
+означает «жест номер i имеет это значение». Фильтр «Эмоции + Лёгкий» —
+пересечение двух таких чисел, то есть одна операция & над строкой в
+несколько килобайт даже на десятках тысяч жестов.
+
+Индекс строится вместе со снимком базы (см. corpus.py) и там же
+сверяется с данными: если индекс, категории или каталог разошлись с
+записями жестов, check() бросает ValueError и версия не принимается.
+
+Выбор пользователя целиком лежит в callback_data кнопки, как и курсор
+в pagination.py: действие FILTER — экран фильтра, FILTER_PAGE — страница
+найденных жестов (см. router.py). Выбор — номера значений по фасетам,
+0 — «любое», i + 1 — значение номер i.
+"""
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+import router
+from pagination import ALL_SCOPE, PAGE_SIZE, nav_row, page_buttons, page_count
+
+# Поля жеста, по которым можно фильтровать, и их подписи
+FACETS = ('category', 'difficulty')
+FACET_TITLES = {'category': 'Категория', 'difficulty': 'Сложность'}
+
+# Сколько разных выборов помнить готовыми списками номеров
+MATCHES_CACHE_SIZE = 256
+
+# Номера установленных битов для каждого значения байта
+_BYTE_BITS = tuple(tuple(bit for bit in range(8) if byte >> bit & 1) for byte in range(256))
+
+
+def to_bitset(positions, size):
+    """Битовое множество из номеров; строится через bytearray за O(size)"""
+    buf = bytearray((size + 7) // 8)
+    for i in positions:
+        buf[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(buf, 'little')
+
+
+def from_bitset(bits):
+    """Номера установленных битов по возрастанию"""
+    out = []
+    for byte_index, byte in enumerate(bits.to_bytes((bits.bit_length() + 7) // 8, 'little')):
+        if byte:
+            base = byte_index * 8
+            out.extend(base + bit for bit in _BYTE_BITS[byte])
+    return out
+
+
+def _members(keys, gestures, facets):
+    """{фасет: {значение: [номера]}}, значения — в порядке первого появления"""
+    position = {key: i for i, key in enumerate(keys)}
+    members = {facet: {} for facet in facets}
+    for key, gesture in gestures.items():
+        i = position[key]
+        for facet in facets:
+            members[facet].setdefault(gesture[facet], []).append(i)
+    return members
+
+
+class FacetIndex:
+    """Битовые множества жестов по значениям фасетов"""
+
+    def __init__(self, keys, gestures, facets=FACETS):
+        """keys — ключи по возрастанию; gestures — {ключ: жест} в порядке корпуса"""
+        self.keys = keys
+        self.facets = facets
+        self.all = (1 << len(keys)) - 1
+        members = _members(keys, gestures, facets)
+        self.values = {facet: tuple(members[facet]) for facet in facets}
+        self._bits = {
+            facet: {value: to_bitset(positions, len(keys)) for value, positions in members[facet].items()}
+            for facet in facets
+        }
+        self._matches = {}
+
+    def bits(self, facet, value):
+        """Множество жестов со значением фасета (0, если значения нет)"""
+        return self._bits[facet].get(value, 0)
+
+    def select(self, selection):
+        """Пересечение по выбору {фасет: значение}; None и отсутствие — «любое»"""
+        bits = self.all
+        for facet, value in selection.items():
+            if value is not None:
+                bits &= self.bits(facet, value)
+        return bits
+
+    def count(self, selection):
+        return self.select(selection).bit_count()
+
+    def matches(self, selection):
+        """Номера подходящих жестов по возрастанию (с кэшем)"""
+        cache_key = tuple(selection.get(facet) for facet in self.facets)
+        found = self._matches.get(cache_key)
+        if found is None:
+            if len(self._matches) >= MATCHES_CACHE_SIZE:
+                self._matches.pop(next(iter(self._matches)))
+            found = self._matches[cache_key] = tuple(from_bitset(self.select(selection)))
+        return found
+
+    def check(self, gestures, categories=None, catalog=None):
+        """
+        Сверить индекс с данными; ValueError со всеми расхождениями.
+        Каждый фасет должен разбивать базу без пересечений и пропусков,
+        биты — совпадать с полями жестов, категории навигации — с
+        фасетом category, а каталог — идти в том же порядке ключей.
+        """
+        errors = []
+        if len(gestures) != len(self.keys):
+            errors.append(f"жестов {len(gestures)}, в индексе {len(self.keys)}")
+        else:
+            members = _members(self.keys, gestures, self.facets)
+            for facet in self.facets:
+                bits = self._bits[facet]
+                union = total = 0
+                for value, value_bits in bits.items():
+                    union |= value_bits
+                    total += value_bits.bit_count()
+                if union != self.all or total != len(self.keys):
+                    errors.append(f"{facet}: значения не разбивают базу")
+                if set(bits) != set(members[facet]):
+                    errors.append(f"{facet}: значения {sorted(set(bits) ^ set(members[facet]))} есть только с одной стороны")
+                for value, positions in members[facet].items():
+                    if bits.get(value) != to_bitset(positions, len(self.keys)):
+                        errors.append(f"{facet}={value!r}: жесты не совпадают с данными")
+        if categories is not None and 'category' in self.facets:
+            position = {key: i for i, key in enumerate(self.keys)}
+            if set(categories) != set(self._bits['category']):
+                errors.append("категории навигации не совпадают с полем category")
+            for name, keys in categories.items():
+                if any(key not in position for key in keys):
+                    errors.append(f"категория {name!r}: ключи, которых нет в базе")
+                elif to_bitset((position[key] for key in keys), len(self.keys)) != self.bits('category', name):
+                    errors.append(f"категория {name!r}: жесты не совпадают с индексом")
+        if catalog is not None and tuple(key for key, _ in catalog.entries(ALL_SCOPE)) != self.keys:
+            errors.append("каталог идёт не в порядке ключей индекса")
+        if errors:
+            raise ValueError("Индекс фасетов расходится с базой: " + "; ".join(errors[:20]))
+
+    def metrics(self):
+        """Текущие значения для мониторинга"""
+        return {
+            'gestures': len(self.keys),
+            'values': {facet: len(values) for facet, values in self.values.items()},
+            'cached_matches': len(self._matches),
+        }
+
+
+# --- Кнопки ---
+
+def filter_data(choice, page=None):
+    """callback_data экрана фильтра или, с page, страницы результатов"""
+    if page is None:
+        return router.callback_data(router.FILTER, *choice)
+    return router.callback_data(router.FILTER_PAGE, page, *choice)
+
+
+def resolve(index, choice):
+    """
+    Выбор из номеров кнопки: {фасет: значение}. Номера от старой версии
+    базы, которых уже нет, считаются «любым».
+    """
+    choice = tuple(choice) + (0,) * (len(index.facets) - len(choice))
+    selection = {}
+    for facet, i in zip(index.facets, choice):
+        values = index.values[facet]
+        selection[facet] = values[i - 1] if 0 < i <= len(values) else None
+    return selection
+
+
+def _normalized(index, choice):
+    """Номера выбора, у которых устаревшие значения заменены на 0"""
+    selection = resolve(index, choice)
+    return tuple(0 if selection[facet] is None else choice[i] for i, facet in enumerate(index.facets))
+
+
+def _summary(index, selection):
+    return "\n".join(
+        f"{FACET_TITLES.get(facet, facet)}: <b>{selection[facet] or 'любая'}</b>" for facet in index.facets
+    )
+
+
+def filter_page(index, choice, row_width=2):
+    """Текст и клавиатура экрана фильтра: значения фасетов и число подходящих"""
+    choice = _normalized(index, choice)
+    selection = resolve(index, choice)
+    total = index.count(selection)
+
+    keyboard = []
+    for n, facet in enumerate(index.facets):
+        row = []
+        for i, value in enumerate(index.values[facet], 1):
+            chosen = choice[n] == i
+            # повторное нажатие на выбранное значение снимает его
+            next_choice = choice[:n] + (0 if chosen else i,) + choice[n + 1:]
+            row.append(InlineKeyboardButton(f"✅ {value}" if chosen else value, callback_data=filter_data(next_choice)))
+            if len(row) == row_width:
+                keyboard.append(row)
+                row = []
+        if row:
+            keyboard.append(row)
+    if total:
+        keyboard.append([InlineKeyboardButton(f"📖 Показать ({total})", callback_data=filter_data(choice, 0))])
+    if any(choice):
+        keyboard.append([InlineKeyboardButton("🔄 Сбросить", callback_data=filter_data((0,) * len(choice)))])
+    keyboard.append([InlineKeyboardButton("◀️ В меню", callback_data=router.callback_data(router.BACK))])
+
+    text = f"🎚 <b>ПОДБОР ЖЕСТОВ</b>\n\n{_summary(index, selection)}\n\nПодходит жестов: {total}"
+    return text, InlineKeyboardMarkup(keyboard)
+
+
+def filter_results_page(index, catalog, choice, page, size=PAGE_SIZE):
+    """Текст и клавиатура страницы жестов, подходящих под выбор"""
+    choice = _normalized(index, choice)
+    selection = resolve(index, choice)
+    matches = index.matches(selection)
+    page = min(max(page, 0), page_count(len(matches), size) - 1)
+
+    entries = catalog.entries(ALL_SCOPE)
+    keyboard = list(page_buttons([entries[i] for i in matches[page * size:(page + 1) * size]], 0, size))
+    nav = nav_row(len(matches), page, lambda p: filter_data(choice, p), size)
+    if nav:
+        keyboard.append(nav)
+    keyboard.append([InlineKeyboardButton("◀️ К фильтру", callback_data=filter_data(choice))])
+
+    text = f"🎚 <b>ПОДБОР ЖЕСТОВ</b>\n\n{_summary(index, selection)}\n\nНайдено: {len(matches)}"
+    return text, InlineKeyboardMarkup(keyboard)
@@ -0,0 +1,190 @@
+"""
+Хранилище жестов в бинарном файле с таблицей смещений.
+
+Корпус (gestures.json) компилируется в gestures.bin, который бот
+открывает через mmap: страницы файла делят между собой все процессы
+бота, а записи декодируются только когда обработчик к ним обращается.
+
+Формат файла (little-endian):
+    заголовок   MAGIC, версия u16, число записей u32
+    записи      N × (смещение ключа u32, длина ключа u16,
+                     смещение записи u32, длина записи u32) — в порядке корпуса
+    индекс      N × u32 — номера записей, отсортированные по ключу
+    данные      ключи (UTF-8) и записи (компактный JSON)
+
+Сборка вручную:
+    python gesture_store.py build [gestures.json] [gestures.bin]
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from collections import OrderedDict
+from collections.abc import Mapping
+
+MAGIC = b'RZHYA'
+VERSION = 1
+
+HEADER = struct.Struct('<5sHI')
+ENTRY = struct.Struct('<IHII')
+SLOT = struct.Struct('<I')
+
+DEFAULT_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gestures.json')
+DEFAULT_COMPILED = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gestures.bin')
+
+
+def normalize_key(word):
+    """Ключ жеста: нижний регистр, ё → е, без пробелов по краям"""
+    return word.strip().lower().replace('ё', 'е')
+
+
+def load_source(path=DEFAULT_SOURCE):
+    """Прочитать исходный корпус жестов"""
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compile_corpus(gestures, path):
+    """Записать корпус в бинарный файл (атомарно, через временный файл)"""
+    keys = []
+    records = []
+    for word, gesture in gestures.items():
+        keys.append(normalize_key(word).encode('utf-8'))
+        records.append(json.dumps(gesture, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+    count = len(keys)
+    if len(set(keys)) != count:
+        raise ValueError("Ключи жестов совпадают после нормализации")
+
+    data_start = HEADER.size + count * (ENTRY.size + SLOT.size)
+    entries = []
+    blob = bytearray()
+    for key, record in zip(keys, records):
+        key_offset = data_start + len(blob)
+        blob += key
+        record_offset = data_start + len(blob)
+        blob += record
+        entries.append(ENTRY.pack(key_offset, len(key), record_offset, len(record)))
+
+    order = sorted(range(count), key=keys.__getitem__)
+
+    tmp_path = f'{path}.tmp{os.getpid()}'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, count))
+        f.writelines(entries)
+        f.writelines(SLOT.pack(i) for i in order)
+        f.write(blob)
+    os.replace(tmp_path, path)
+
+
+class GestureStore(Mapping):
+    """Только-для-чтения словарь жестов поверх mmap-файла"""
+
+    def __init__(self, path=DEFAULT_COMPILED, cache_size=256):
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self._count = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path}: неизвестный формат файла жестов")
+        self._entries_at = HEADER.size
+        self._index_at = self._entries_at + self._count * ENTRY.size
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self.path = path
+
+    def close(self):
+        self._mm.close()
+
+    def digest(self):
+        """Хэш содержимого файла: по нему проверяется, что снимок индексов от этой базы"""
+        return hashlib.blake2b(self._mm, digest_size=16).hexdigest()
+
+    def _entry(self, i):
+        return ENTRY.unpack_from(self._mm, self._entries_at + i * ENTRY.size)
+
+    def _key(self, i):
+        key_offset, key_length, _, _ = self._entry(i)
+        return self._mm[key_offset:key_offset + key_length]
+
+    def _find(self, key):
+        """Номер записи по ключу — бинарный поиск по отсортированному индексу"""
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            i = SLOT.unpack_from(self._mm, self._index_at + mid * SLOT.size)[0]
+            current = self._key(i)
+            if current == key:
+                return i
+            if current < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return -1
+
+    def __getitem__(self, word):
+        key = normalize_key(word)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            return cached
+
+        i = self._find(key.encode('utf-8'))
+        if i < 0:
+            raise KeyError(word)
+        _, _, record_offset, record_length = self._entry(i)
+        gesture = json.loads(self._mm[record_offset:record_offset + record_length])
+
+        self._cache[key] = gesture
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+        return gesture
+
+    def raw_items(self):
+        """Пары (ключ, байты записи) в порядке корпуса; кэш не трогает"""
+        for i in range(self._count):
+            key_offset, key_length, record_offset, record_length = self._entry(i)
+            yield (self._mm[key_offset:key_offset + key_length].decode('utf-8'),
+                   self._mm[record_offset:record_offset + record_length])
+
+    def sorted_raw(self):
+        """Пары (ключ, байты записи) по возрастанию ключа; кэш не трогает"""
+        for slot in range(self._count):
+            i = SLOT.unpack_from(self._mm, self._index_at + slot * SLOT.size)[0]
+            key_offset, key_length, record_offset, record_length = self._entry(i)
+            yield (self._mm[key_offset:key_offset + key_length].decode('utf-8'),
+                   self._mm[record_offset:record_offset + record_length])
+
+    def __contains__(self, word):
+        return isinstance(word, str) and self._find(normalize_key(word).encode('utf-8')) >= 0
+
+    def __iter__(self):
+        for i in range(self._count):
+            yield self._key(i).decode('utf-8')
+
+    def __len__(self):
+        return self._count
+
+
+def is_stale(source, compiled):
+    """Нужно ли пересобрать бинарный файл"""
+    return not os.path.exists(compiled) or os.path.getmtime(compiled) < os.path.getmtime(source)
+
+
+def open_store(source=DEFAULT_SOURCE, compiled=DEFAULT_COMPILED):
+    """Открыть хранилище, при необходимости пересобрав его из исходника"""
+    if is_stale(source, compiled):
+        compile_corpus(load_source(source), compiled)
+    return GestureStore(compiled)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] != 'build':
+        print("Использование: python gesture_store.py build [gestures.json] [gestures.bin]")
+        sys.exit(2)
+    source = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_SOURCE
+    compiled = sys.argv[3] if len(sys.argv) > 3 else DEFAULT_COMPILED
+    compile_corpus(load_source(source), compiled)
+    print(f"✅ {compiled}: {len(GestureStore(compiled))} жестов")
@@ -0,0 +1,120 @@
+"""
+Inline-режим: «@bot привет» в любом чате.
+
+Telegram присылает запрос на каждое нажатие клавиши, причём разные
+пользователи набирают одни и те же слова, проходя одни и те же префиксы.
+Поэтому готовые ответы кэшируются по нормализованному запросу (набору
+основ слов) в LRU: повторный префикс отвечается без поиска. Если ответа
+в кэше нет, обработчик немного ждёт, и если за это время пользователь
+набрал следующую букву, устаревший запрос не обрабатывается вовсе — даже
+если на следующую ответ нашёлся в кэше сразу.
+
+Inline-режим включается у @BotFather командой /setinline.
+"""
+
+import asyncio
+import hashlib
+from collections import OrderedDict
+
+from telegram import InlineQueryResultArticle, InputTextMessageContent
+
+from search import tokenize
+
+RESULTS = 20
+CACHE_SIZE = 10000
+
+# Сколько ждать следующей буквы, прежде чем искать (с)
+DEBOUNCE = 0.25
+
+# Подсказки Telegram: сколько он может сам хранить ответ (с). Ответ
+# зависит только от текста запроса, поэтому он не персональный
+CACHE_TIME = 300
+EMPTY_CACHE_TIME = 60
+
+
+def query_key(query):
+    """Ключ кэша: основы слов запроса без учёта порядка и повторов"""
+    return ' '.join(sorted(set(tokenize(query))))
+
+
+class InlineSearch:
+    """Ответы на inline-запросы с LRU-кэшем и отсевом устаревших запросов"""
+
+    def __init__(self, index, render, cache_size=CACHE_SIZE, debounce=DEBOUNCE):
+        """
+        index — SearchIndex, render(ключ жеста) — InlineQueryResultArticle
+        """
+        self.index = index
+        self.render = render
+        self.cache_size = cache_size
+        self.debounce = debounce
+        self._cache = OrderedDict()
+        self._latest = {}       # user_id -> id последнего запроса
+
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+
+    def metrics(self):
+        """Текущие значения для мониторинга"""
+        return {
+            'cached': len(self._cache),
+            'hits': self.hits,
+            'misses': self.misses,
+            'skipped': self.skipped,
+        }
+
+    def clear(self):
+        """Сбросить кэш (после замены базы жестов)"""
+        self._cache.clear()
+
+    def cached(self, key):
+        results = self._cache.get(key)
+        if results is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+        return results
+
+    def results(self, query, key=None):
+        """Ответ на запрос: из кэша или поиском"""
+        key = query_key(query) if key is None else key
+        results = self.cached(key)
+        if results is None:
+            self.misses += 1
+            results = tuple(self.render(gesture) for gesture, _ in self.index.search(query, limit=RESULTS))
+            self._cache[key] = results
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return results
+
+    async def answer(self, user_id, query_id, query):
+        """
+        Результаты для запроса или None, если пока ждали, пришёл запрос
+        новее и этот отвечать не нужно.
+        """
+        key = query_key(query)
+        results = self.cached(key)
+        if results is not None:
+            # ответ уже есть: более ранний запрос, который ещё ждёт, устарел
+            self._latest.pop(user_id, None)
+            return results
+        self._latest[user_id] = query_id
+        try:
+            await asyncio.sleep(self.debounce)
+            if self._latest.get(user_id) != query_id:
+                self.skipped += 1
+                return None
+        finally:
+            if self._latest.get(user_id) == query_id:
+                del self._latest[user_id]
+        return self.results(query, key)
+
+
+def gesture_article(key, title, description, text):
+    """Карточка жеста в списке inline-результатов"""
+    return InlineQueryResultArticle(
+        id=hashlib.blake2b(key.encode(), digest_size=16).hexdigest(),
+        title=title,
+        description=description,
+        input_message_content=InputTextMessageContent(text, parse_mode='HTML'),
+    )
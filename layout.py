@@ -0,0 +1,197 @@
+"""
+Размер сообщений: разбиение длинного текста и правки без лишних запросов.
+
+Telegram ограничивает текст сообщения 4096 символами, а подпись к
+ролику — 1024, причём считает их в единицах UTF-16 (эмодзи вроде 🤟 —
+две единицы) и по тексту после разбора разметки: теги <b> в счёт не
+идут. paginate() собирает сообщение из разделов и, если оно не
+помещается, делит его на страницы по границам разделов; раздел длиннее
+страницы делится по строкам, а строка — по словам.
+
+Нажатие кнопки часто не меняет сообщение: «Слово дня» второй раз,
+страница категорий, на которой пользователь уже стоит. Telegram
+присылает с нажатием само сообщение, и Editor сравнивает с ним новый
+текст вместе с разметкой (entities сообщения) и клавиатуру: если они
+совпадают, editMessageText не отправляется — иначе он вернул бы ошибку «message is not modified»
+впустую потраченным запросом. Сравнение идёт по сообщению из Telegram,
+а не по памяти процесса, поэтому оно верно и после перезапуска, и в
+кластере (см. cluster.py).
+
+Проверка: python -m doctest layout.py
+"""
+
+import html
+import re
+
+from telegram.error import BadRequest
+
+MESSAGE_LIMIT = 4096
+CAPTION_LIMIT = 1024
+
+_TAG = re.compile(r'<[^>]+>')
+_TAG_SPLIT = re.compile(r'(<[^>]+>)')
+_TAG_PARTS = re.compile(r'<(/?)(\w+)[^>]*>')
+_WORD = re.compile(r'\S+\s*')
+
+
+def utf16_len(text):
+    """
+    Длина в единицах UTF-16, как её считает Telegram.
+
+    >>> len('🤟 да'), utf16_len('🤟 да')
+    (4, 5)
+    """
+    return len(text.encode('utf-16-le')) // 2
+
+
+def visible_text(text):
+    """
+    Текст HTML-сообщения, каким его видит пользователь (и получает бот).
+
+    >>> visible_text('🤟 <b>Да</b> &amp; нет\\n\\n')
+    '🤟 Да & нет'
+    """
+    return html.unescape(_TAG.sub('', text)).strip()
+
+
+def telegram_html(text):
+    """
+    HTML-текст в том виде, в каком его вернёт Telegram (Message.text_html):
+    без пробелов по краям, текст между тегами экранирован заново.
+
+    >>> telegram_html('🤟 <b>Да</b> &amp; "нет"\\n\\n')
+    '🤟 <b>Да</b> &amp; &quot;нет&quot;'
+    """
+    parts = _TAG_SPLIT.split(text)
+    parts[::2] = [html.escape(html.unescape(part)) for part in parts[::2]]
+    return ''.join(parts).strip()
+
+
+def visible_len(text):
+    return utf16_len(visible_text(text))
+
+
+def _length(piece):
+    """Видимая длина куска вместе с пробелами по краям: сумма по кускам не меньше длины страницы"""
+    return utf16_len(html.unescape(_TAG.sub('', piece)))
+
+
+def _pieces(section, limit):
+    """Раздел по строкам, а слишком длинные строки — по словам, кусками не длиннее limit"""
+    if visible_len(section) <= limit:
+        return [section]
+    pieces = []
+    for line in section.splitlines(keepends=True):
+        if visible_len(line) <= limit:
+            pieces.append(line)
+            continue
+        chunk, size = '', 0
+        for word in _WORD.findall(line):
+            length = _length(word)
+            if chunk and size + length > limit:
+                pieces.append(chunk)
+                chunk, size = '', 0
+            chunk += word
+            size += length
+        if chunk:
+            pieces.append(chunk)
+    return pieces
+
+
+def _balanced(pages):
+    """Теги, открытые на одной странице и закрытые на следующей, закрыть и открыть заново"""
+    balanced = []
+    opened = []         # (имя, открывающий тег)
+    for page in pages:
+        prefix = ''.join(tag for _, tag in opened)
+        for match in _TAG_PARTS.finditer(page):
+            closing, name = match.group(1), match.group(2).lower()
+            if not closing:
+                opened.append((name, match.group(0)))
+            elif opened and opened[-1][0] == name:
+                opened.pop()
+        suffix = ''.join(f'</{name}>' for name, _ in reversed(opened))
+        balanced.append(prefix + page + suffix)
+    return balanced
+
+
+def paginate(sections, limit=MESSAGE_LIMIT):
+    """
+    Разделы, склеенные в страницы не длиннее limit; раздел не рвётся,
+    если помещается на страницу целиком.
+
+    >>> paginate(['один\\n\\n', 'два\\n\\n', 'три'], limit=8)
+    ('один', 'два\\n\\nтри')
+    >>> paginate(['<b>очень длинная строка</b>'], limit=12)
+    ('<b>очень</b>', '<b>длинная</b>', '<b>строка</b>')
+    """
+    text = ''.join(sections)
+    if utf16_len(text) <= limit:
+        # разметка только добавляет длину: помещается и без разбора
+        return (text,)
+    pages = []
+    page, size = '', 0
+    for section in sections:
+        for piece in _pieces(section, limit):
+            length = _length(piece)
+            if page and size + length > limit:
+                pages.append(page.strip())
+                page, size = '', 0
+            page += piece
+            size += length
+    if page.strip() or not pages:
+        pages.append(page.strip())
+    return tuple(_balanced(pages))
+
+
+def _markup_bytes(reply_markup):
+    return len(reply_markup.to_json().encode('utf-8')) if reply_markup is not None else 0
+
+
+class Editor:
+    """editMessageText, который не отправляется, если сообщение не изменится"""
+
+    def __init__(self):
+        self.edits = 0
+        self.skipped = 0
+        self.saved_bytes = 0
+        self.not_modified = 0
+
+    def metrics(self):
+        """Текущие значения для мониторинга"""
+        return {
+            'edits': self.edits,
+            'skipped': self.skipped,
+            'saved_bytes': self.saved_bytes,
+            'not_modified': self.not_modified,
+        }
+
+    @staticmethod
+    def unchanged(message, text, reply_markup):
+        """
+        Показывает ли message уже этот текст с этой разметкой и клавиатурой.
+        Без entities сообщения разметку не сравнить — тогда считается, что
+        изменилось, и повтор отсечёт ошибка «message is not modified»
+        """
+        current = getattr(message, 'text', None)
+        if current is None or getattr(message, 'entities', None) is None or message.reply_markup != reply_markup:
+            return False
+        # клавиатура и видимый текст сравниваются первыми: это дешевле, чем собирать HTML из entities
+        return current == visible_text(text) and message.text_html == telegram_html(text)
+
+    async def edit(self, query, text, reply_markup=None, parse_mode='HTML'):
+        """Изменить сообщение нажатой кнопки; False, если менять было нечего"""
+        if self.unchanged(query.message, text, reply_markup):
+            self.skipped += 1
+            self.saved_bytes += len(text.encode('utf-8')) + _markup_bytes(reply_markup)
+            return False
+        try:
+            await query.edit_message_text(text, reply_markup=reply_markup, parse_mode=parse_mode)
+        except BadRequest as exc:
+            # сообщение совпало, хотя сравнить его не удалось (например, без entities) — не ошибка
+            if 'not modified' not in str(exc).lower():
+                raise
+            self.not_modified += 1
+            return False
+        self.edits += 1
+        return True
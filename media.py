@@ -0,0 +1,256 @@
+"""
+Видео жестов: перекодирование, однократная загрузка и file_id.
+
+Исходные ролики (поле gif_path жеста, путь относительно MEDIA_DIR)
+заранее перекодируются ffmpeg в компактные MP4 без звука — варианты из
+VARIANTS. Каждый вариант загружается в Telegram один раз: file_id из
+ответа сохраняется в SQLite вместе с хэшем файла, и дальше жест
+отправляется по file_id без передачи байтов. Если файл перекодировали
+заново (хэш изменился), он будет загружен ещё раз.
+
+Загрузка требует чата: ролики отправляются в служебный чат MEDIA_CHAT_ID
+(например, закрытый канал, где бот — администратор).
+
+    python media.py transcode [gestures.json] [media]   # ffmpeg, офлайн
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+from telegram.error import BadRequest, TelegramError
+
+from gesture_store import normalize_key
+from subscribers import connect
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MEDIA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'media')
+
+
+class MediaVariant(NamedTuple):
+    """Вариант ролика: ширина кадра, качество (CRF) и частота кадров"""
+    width: int
+    crf: int
+    fps: int
+
+
+VARIANTS = {
+    # основной: отправляется как анимация (зацикленное видео без звука)
+    'animation': MediaVariant(width=480, crf=28, fps=24),
+    # лёгкий: для медленных сетей и превью
+    'small': MediaVariant(width=240, crf=32, fps=15),
+}
+
+DEFAULT_VARIANT = 'animation'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS media (
+    gesture TEXT NOT NULL,
+    variant TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    file_id TEXT NOT NULL,
+    PRIMARY KEY (gesture, variant)
+);
+"""
+
+
+def variant_path(media_dir, variant, gesture_key):
+    """Где лежит перекодированный ролик"""
+    return os.path.join(media_dir, variant, f'{gesture_key}.mp4')
+
+
+def file_digest(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# --- Перекодирование (офлайн) ---
+
+def ffmpeg_command(source, target, variant):
+    """Команда ffmpeg: H.264 без звука, чётная ширина, moov в начале файла"""
+    return [
+        'ffmpeg', '-y', '-loglevel', 'error', '-i', source,
+        '-an',
+        '-vf', f'scale={variant.width}:-2:flags=lanczos,fps={variant.fps}',
+        '-c:v', 'libx264', '-preset', 'slow', '-crf', str(variant.crf),
+        '-pix_fmt', 'yuv420p', '-movflags', '+faststart',
+        target,
+    ]
+
+
+def transcode(source, target, variant):
+    """Перекодировать, если цель старше источника; True — файл обновлён"""
+    if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(source):
+        return False
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    partial = target + '.part.mp4'
+    subprocess.run(ffmpeg_command(source, partial, variant), check=True)
+    os.replace(partial, target)
+    return True
+
+
+def transcode_corpus(gestures, media_dir=DEFAULT_MEDIA_DIR, workers=None):
+    """Перекодировать ролики всех жестов во все варианты; возвращает число обновлённых"""
+    jobs = []
+    for word, gesture in gestures.items():
+        if not gesture.get('gif_path'):
+            continue
+        source = os.path.join(media_dir, gesture['gif_path'])
+        for name, variant in VARIANTS.items():
+            jobs.append((source, variant_path(media_dir, name, normalize_key(word)), variant))
+    # ffmpeg сам многопоточный, поэтому процессов немного
+    workers = workers or max(1, (os.cpu_count() or 2) // 2)
+    with ThreadPoolExecutor(workers) as pool:
+        return sum(pool.map(lambda job: transcode(*job), jobs))
+
+
+# --- file_id ---
+
+class MediaStore:
+    """file_id загруженных роликов: (жест, вариант) -> (хэш файла, file_id)"""
+
+    def __init__(self, path):
+        self.path = path
+        self._db = connect(path)
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    def get(self, gesture, variant=DEFAULT_VARIANT):
+        row = self._db.execute(
+            'SELECT digest, file_id FROM media WHERE gesture = ? AND variant = ?', (gesture, variant)
+        ).fetchone()
+        return tuple(row) if row else None
+
+    def save(self, gesture, variant, digest, file_id):
+        self._db.execute(
+            'INSERT INTO media (gesture, variant, digest, file_id) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT (gesture, variant) DO UPDATE SET digest = excluded.digest, file_id = excluded.file_id',
+            (gesture, variant, digest, file_id)
+        )
+
+    def forget(self, gesture, variant=DEFAULT_VARIANT):
+        self._db.execute('DELETE FROM media WHERE gesture = ? AND variant = ?', (gesture, variant))
+
+
+class WarmupStats:
+    def __init__(self):
+        self.uploaded = 0
+        self.cached = 0
+        self.missing = 0
+        self.failed = 0
+
+    def __repr__(self):
+        return (f"uploaded={self.uploaded} cached={self.cached} "
+                f"missing={self.missing} failed={self.failed}")
+
+
+class MediaLibrary:
+    """Отправка роликов жестов: по file_id, а если его нет — загрузкой"""
+
+    def __init__(self, store, media_dir=DEFAULT_MEDIA_DIR, upload_chat_id=None, concurrency=4):
+        self.store = store
+        self.media_dir = media_dir
+        self.upload_chat_id = upload_chat_id
+        self.concurrency = concurrency
+        self._uploads = {}      # (жест, вариант) -> задача загрузки, чтобы не грузить дважды
+
+    def available(self, gesture_key, variant=DEFAULT_VARIANT):
+        """Есть ли у жеста ролик (загруженный или готовый к загрузке)"""
+        return (self.store.get(gesture_key, variant) is not None
+                or os.path.exists(variant_path(self.media_dir, variant, gesture_key)))
+
+    async def _upload(self, bot, chat_id, gesture_key, variant, digest, path):
+        with open(path, 'rb') as f:
+            message = await bot.send_animation(chat_id, f, filename=os.path.basename(path))
+        file_id = message.animation.file_id
+        self.store.save(gesture_key, variant, digest, file_id)
+        return message
+
+    async def upload(self, bot, gesture_key, variant=DEFAULT_VARIANT, chat_id=None):
+        """
+        Загрузить ролик, если его file_id нет или файл изменился;
+        возвращает file_id или None, если ролика нет.
+        """
+        path = variant_path(self.media_dir, variant, gesture_key)
+        known = self.store.get(gesture_key, variant)
+        if not os.path.exists(path):
+            return known[1] if known else None
+        digest = file_digest(path)
+        if known and known[0] == digest:
+            return known[1]
+
+        task = self._uploads.get((gesture_key, variant))
+        if task is None:
+            target = chat_id if chat_id is not None else self.upload_chat_id
+            task = asyncio.ensure_future(self._upload(bot, target, gesture_key, variant, digest, path))
+            self._uploads[(gesture_key, variant)] = task
+            task.add_done_callback(lambda _: self._uploads.pop((gesture_key, variant), None))
+        message = await asyncio.shield(task)
+        return message.animation.file_id
+
+    async def send(self, bot, chat_id, gesture_key, variant=DEFAULT_VARIANT, **kwargs):
+        """Отправить ролик жеста в чат; None, если ролика нет"""
+        known = self.store.get(gesture_key, variant)
+        if known is not None:
+            try:
+                return await bot.send_animation(chat_id, known[1], **kwargs)
+            except BadRequest as exc:
+                # file_id мог устареть (например, бот сменил токен)
+                logger.warning("file_id for %s/%s rejected: %s", gesture_key, variant, exc)
+                self.store.forget(gesture_key, variant)
+        path = variant_path(self.media_dir, variant, gesture_key)
+        if not os.path.exists(path):
+            return None
+        # первая отправка сразу служит загрузкой
+        digest = file_digest(path)
+        with open(path, 'rb') as f:
+            message = await bot.send_animation(chat_id, f, filename=os.path.basename(path), **kwargs)
+        self.store.save(gesture_key, variant, digest, message.animation.file_id)
+        return message
+
+    async def warm_up(self, bot, gesture_keys, variants=tuple(VARIANTS)):
+        """Заранее загрузить все ролики, не больше concurrency загрузок сразу"""
+        stats = WarmupStats()
+        slots = asyncio.Semaphore(self.concurrency)
+
+        async def one(key, variant):
+            path = variant_path(self.media_dir, variant, key)
+            if not os.path.exists(path):
+                stats.missing += 1
+                return
+            known = self.store.get(key, variant)
+            if known and known[0] == file_digest(path):
+                stats.cached += 1
+                return
+            async with slots:
+                try:
+                    await self.upload(bot, key, variant)
+                    stats.uploaded += 1
+                except TelegramError as exc:
+                    logger.warning("Upload of %s/%s failed: %s", key, variant, exc)
+                    stats.failed += 1
+
+        await asyncio.gather(*(one(key, variant) for key in gesture_keys for variant in variants))
+        return stats
+
+
+if __name__ == '__main__':
+    from gesture_store import DEFAULT_SOURCE, load_source
+
+    if len(sys.argv) < 2 or sys.argv[1] != 'transcode':
+        print("Использование: python media.py transcode [gestures.json] [media]")
+        sys.exit(2)
+    source = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_SOURCE
+    media_dir = sys.argv[3] if len(sys.argv) > 3 else DEFAULT_MEDIA_DIR
+    print(f"✅ Перекодировано роликов: {transcode_corpus(load_source(source), media_dir)}")
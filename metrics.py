@@ -0,0 +1,246 @@
+"""
+Метрики бота в текстовом формате Prometheus.
+
+Каждый обработчик приложения (и задачи JobQueue) оборачивается: время
+вызова раскладывается на собственные вычисления, ожидание в очереди
+ограничителя и ожидание ответа Bot API. Ограничитель (rate_limiter.py)
+сообщает о каждом запросе через record_api_wait, а к вызову обработчика
+запрос привязывается через contextvars — без передачи чего-либо в
+аргументах. Считаются также вызовы и ошибки по каждому обработчику (для
+кнопок — по действию, см. router.py).
+
+Словари metrics() остальных модулей (очередь обновлений, ограничитель,
+хранилище, поиск…) подключаются через collect() и выводятся как gauge.
+
+Всё отдаётся по HTTP на METRICS_HOST:METRICS_PORT/metrics. Накладные
+расходы — пара perf_counter и bisect на вызов (benchmarks/bench_metrics.py),
+так что обёртка включена всегда.
+"""
+
+import asyncio
+import logging
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from telegram.ext import ApplicationHandlerStop
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм, с
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PREFIX = 'bot'
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class _Wait:
+    """Сколько текущий вызов обработчика ждал ограничитель и Bot API"""
+    __slots__ = ('limiter', 'api')
+
+    def __init__(self):
+        self.limiter = 0.0
+        self.api = 0.0
+
+
+_current = ContextVar('metrics_wait', default=None)
+
+
+def record_api_wait(limiter, api):
+    """Учесть запрос к Bot API в вызове обработчика, внутри которого он сделан"""
+    wait = _current.get()
+    if wait is not None:
+        wait.limiter += limiter
+        wait.api += api
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами; накопительные суммы — при выводе"""
+
+    __slots__ = ('bounds', 'counts', 'sum')
+
+    def __init__(self, bounds=BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.bounds + (float('inf'),), self.counts):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            yield f'{name}_bucket{{{labels},le="{le}"}} {cumulative}'
+        yield f'{name}_sum{{{labels}}} {self.sum!r}'
+        yield f'{name}_count{{{labels}}} {cumulative}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class _Handler:
+    """Метрики одного обработчика"""
+    __slots__ = ('total', 'compute', 'limiter', 'api', 'errors')
+
+    def __init__(self, bounds):
+        self.total = Histogram(bounds)
+        self.compute = Histogram(bounds)
+        self.limiter = Histogram(bounds)
+        self.api = Histogram(bounds)
+        self.errors = 0
+
+
+class Metrics:
+    """Реестр метрик: обработчики, счётчики и словари metrics() модулей"""
+
+    def __init__(self, bounds=BUCKETS):
+        self.bounds = bounds
+        self._handlers = {}
+        self._collectors = []
+        self._server = None
+
+    def _handler(self, name):
+        handler = self._handlers.get(name)
+        if handler is None:
+            handler = self._handlers[name] = _Handler(self.bounds)
+        return handler
+
+    def observe(self, name, total, limiter=0.0, api=0.0, error=False):
+        handler = self._handler(name)
+        handler.total.observe(total)
+        handler.compute.observe(max(0.0, total - limiter - api))
+        handler.limiter.observe(limiter)
+        handler.api.observe(api)
+        if error:
+            handler.errors += 1
+
+    def wrap(self, name, callback):
+        """
+        Обёртка корутины-обработчика. name — строка или функция от
+        первого аргумента (update), если имя зависит от обновления.
+        """
+        label = name if callable(name) else (lambda _: name)
+
+        async def instrumented(*args):
+            wait = _Wait()
+            token = _current.set(wait)
+            started = time.perf_counter()
+            error = False
+            try:
+                return await callback(*args)
+            except ApplicationHandlerStop:
+                raise
+            except Exception:
+                error = True
+                raise
+            finally:
+                elapsed = time.perf_counter() - started
+                _current.reset(token)
+                self.observe(label(args[0] if args else None), elapsed, wait.limiter, wait.api, error)
+
+        instrumented.__name__ = getattr(callback, '__name__', 'handler')
+        instrumented.__wrapped__ = callback
+        return instrumented
+
+    def instrument(self, application, names=None):
+        """
+        Обернуть все обработчики приложения. names — {callback: имя или
+        функция от update}; по умолчанию имя — __name__ callback'а.
+        """
+        names = names or {}
+        for handlers in application.handlers.values():
+            for handler in handlers:
+                if getattr(handler.callback, '__wrapped__', None) is not None:
+                    continue
+                handler.callback = self.wrap(names.get(handler.callback, handler.callback.__name__), handler.callback)
+
+    def collect(self, name, source):
+        """Выводить словарь source() как gauge с префиксом name"""
+        self._collectors.append((name, source))
+
+    # --- Вывод ---
+
+    def render(self):
+        """Все метрики в текстовом формате Prometheus"""
+        lines = []
+        handlers = sorted(self._handlers.items())
+        parts = (
+            ('handler_seconds', 'Время обработчика целиком', 'total'),
+            ('handler_compute_seconds', 'Собственные вычисления обработчика', 'compute'),
+            ('handler_limiter_seconds', 'Ожидание в очереди ограничителя', 'limiter'),
+            ('handler_api_seconds', 'Ожидание ответа Bot API', 'api'),
+        )
+        for metric, help_text, part in parts:
+            name = f'{PREFIX}_{metric}'
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} histogram')
+            for handler_name, handler in handlers:
+                lines.extend(getattr(handler, part).lines(name, f'handler="{_escape(handler_name)}"'))
+        for metric, help_text, value in (
+            ('handler_calls_total', 'Вызовы обработчика', lambda h: h.total.count),
+            ('handler_errors_total', 'Исключения в обработчике', lambda h: h.errors),
+        ):
+            name = f'{PREFIX}_{metric}'
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} counter')
+            lines.extend(f'{name}{{handler="{_escape(n)}"}} {value(h)}' for n, h in handlers)
+
+        for prefix, source in self._collectors:
+            try:
+                values = source()
+            except Exception:
+                logger.exception("Метрики %s недоступны", prefix)
+                continue
+            for key, value in values.items():
+                name = f'{PREFIX}_{prefix}_{key}'
+                if isinstance(value, dict):
+                    samples = [(f'{{key="{_escape(k)}"}}', v) for k, v in value.items()]
+                else:
+                    samples = [('', value)]
+                samples = [(labels, v) for labels, v in samples if isinstance(v, (int, float))]
+                if samples:
+                    lines.append(f'# TYPE {name} gauge')
+                    lines.extend(f'{name}{labels} {float(v)!r}' for labels, v in samples)
+        return '\n'.join(lines) + '\n'
+
+    # --- HTTP ---
+
+    async def _respond(self, reader, writer):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), 5)
+            while (await asyncio.wait_for(reader.readline(), 5)).strip():
+                pass
+            parts = request_line.decode('latin-1').split()
+            if len(parts) >= 2 and parts[0] == 'GET' and parts[1].split('?')[0] == '/metrics':
+                status, content_type, body = '200 OK', CONTENT_TYPE, self.render().encode('utf-8')
+            else:
+                status, content_type, body = '404 Not Found', 'text/plain', b'not found\n'
+            writer.write(
+                f'HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n'
+                f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode('latin-1') + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host, port):
+        """Запустить HTTP-эндпоинт /metrics"""
+        self._server = await asyncio.start_server(self._respond, host, port)
+        logger.info("Метрики: http://%s:%d/metrics", host, port)
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
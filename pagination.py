@@ -0,0 +1,115 @@
+"""
+Постраничные списки жестов и категорий.
+
+Списки ключей заранее отсортированы и хранятся кортежами, поэтому
+страница N — это срез длиной в размер страницы. Курсор (что листаем и
+какая страница) целиком лежит в callback_data кнопки (см. router.py),
+так что бот не хранит состояние пользователя между нажатиями.
+"""
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+import router
+
+PAGE_SIZE = 8
+
+# Область 0 — все жесты, область i + 1 — категория номер i
+ALL_SCOPE = 0
+
+
+def page_data(scope, page):
+    """callback_data для страницы области"""
+    return router.callback_data(router.PAGE, scope, page)
+
+
+def categories_data(page):
+    return router.callback_data(router.CATEGORIES, page)
+
+
+def page_count(total, size=PAGE_SIZE):
+    return max(1, -(-total // size))
+
+
+class Catalog:
+    """Отсортированные массивы (ключ, подпись) для всех жестов и каждой категории"""
+
+    def __init__(self, gestures, categories, labels=None):
+        if labels is None:
+            labels = {key: gestures[key]['main_meaning'] for key in gestures}
+
+        def entries(keys):
+            return tuple(sorted((key, labels[key]) for key in keys if key in labels))
+
+        self.category_names = tuple(categories)
+        self._scopes = (entries(labels),) + tuple(entries(categories[name]) for name in self.category_names)
+
+    def updated(self, gestures, categories, changed, keys=None):
+        """
+        Каталог новой базы: подписи перечитываются только у изменённых
+        жестов; keys — все ключи новой базы, если уже известны.
+        """
+        labels = dict(self._scopes[ALL_SCOPE])
+        labels.update((key, gestures[key]['main_meaning']) for key in changed)
+        return Catalog(gestures, categories, {key: labels[key] for key in (keys or gestures)})
+
+    def scope_title(self, scope):
+        return '📖 ВСЕ ЖЕСТЫ' if scope == ALL_SCOPE else f'📂 {self.category_names[scope - 1]}'
+
+    def entries(self, scope):
+        """Весь отсортированный массив области; IndexError для неизвестной области"""
+        return self._scopes[scope]
+
+
+def page_buttons(entries, page, size=PAGE_SIZE):
+    """Кнопки жестов одной страницы — по одной на строку"""
+    for key, label in entries[page * size:(page + 1) * size]:
+        yield [InlineKeyboardButton(label, callback_data=router.gesture_data(router.GESTURE, key))]
+
+
+def nav_row(total, page, make_data, size=PAGE_SIZE):
+    """Строка ◀️ N/M ▶️; пустая, если страница одна"""
+    pages = page_count(total, size)
+    if pages == 1:
+        return []
+    row = []
+    if page > 0:
+        row.append(InlineKeyboardButton("◀️", callback_data=make_data(page - 1)))
+    # кнопка «N/M» ничего не делает
+    row.append(InlineKeyboardButton(f"{page + 1}/{pages}", callback_data=router.callback_data(router.NOOP)))
+    if page < pages - 1:
+        row.append(InlineKeyboardButton("▶️", callback_data=make_data(page + 1)))
+    return row
+
+
+def gestures_page(catalog, scope, page, size=PAGE_SIZE):
+    """Текст и клавиатура страницы жестов области"""
+    entries = catalog.entries(scope)
+    page = min(max(page, 0), page_count(len(entries), size) - 1)
+
+    keyboard = list(page_buttons(entries, page, size))
+    nav = nav_row(len(entries), page, lambda p: page_data(scope, p), size)
+    if nav:
+        keyboard.append(nav)
+    back = categories_data(0) if scope != ALL_SCOPE else router.callback_data(router.BACK)
+    keyboard.append([InlineKeyboardButton("◀️ Назад", callback_data=back)])
+
+    text = f"<b>{catalog.scope_title(scope)}</b>\n\nВыберите жест:"
+    return text, InlineKeyboardMarkup(keyboard)
+
+
+def categories_page(catalog, page, size=PAGE_SIZE):
+    """Текст и клавиатура страницы списка категорий"""
+    names = catalog.category_names
+    page = min(max(page, 0), page_count(len(names), size) - 1)
+
+    start = page * size
+    keyboard = [
+        [InlineKeyboardButton(f"📂 {name}", callback_data=page_data(start + i + 1, 0))]
+        for i, name in enumerate(names[start:start + size])
+    ]
+    nav = nav_row(len(names), page, categories_data, size)
+    if nav:
+        keyboard.append(nav)
+    keyboard.append([InlineKeyboardButton("◀️ В меню", callback_data=router.callback_data(router.BACK))])
+
+    return "📚 <b>КАТЕГОРИИ ЖЕСТОВ</b>\n\nВыберите тему:", InlineKeyboardMarkup(keyboard)
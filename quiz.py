@@ -0,0 +1,240 @@
+"""
+Тренировка с интервальным повторением (SM-2).
+
+Пользователь видит описание жеста и выбирает его значение из нескольких
+вариантов; неверные варианты берутся из той же категории. После ответа
+карточка получает новый интервал по алгоритму SM-2.
+
+Карточки лежат в SQLite с индексом (user_id, due) — это отсортированная
+очередь повторения каждого пользователя: следующая карточка находится
+одним спуском по индексу. Таблица learners хранит ближайший срок
+повторения пользователя с индексом по нему, так что выборка «кому пора
+повторять» для напоминаний не просматривает карточки.
+"""
+
+import random
+import time
+from typing import NamedTuple
+
+from subscribers import connect
+
+DAY = 24 * 60 * 60
+
+# Оценки ответа по шкале SM-2 (0–5)
+CORRECT = 4
+WRONG = 1
+
+START_EASE = 2.5
+MIN_EASE = 1.3
+
+OPTIONS = 4
+
+# Сколько случайных жестов перебрать, прежде чем искать полным просмотром
+DRAWS = 32
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cards (
+    user_id INTEGER NOT NULL,
+    gesture TEXT NOT NULL,
+    ease REAL NOT NULL,
+    interval REAL NOT NULL,
+    repetitions INTEGER NOT NULL,
+    due INTEGER NOT NULL,
+    PRIMARY KEY (user_id, gesture)
+);
+CREATE INDEX IF NOT EXISTS cards_due ON cards (user_id, due);
+CREATE TABLE IF NOT EXISTS learners (
+    user_id INTEGER PRIMARY KEY,
+    next_due INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS learners_due ON learners (next_due);
+"""
+
+
+class Card(NamedTuple):
+    """Состояние карточки: лёгкость, интервал в днях, повторений подряд, срок"""
+    ease: float = START_EASE
+    interval: float = 0.0
+    repetitions: int = 0
+    due: int = 0
+
+
+def sm2(card, quality, now):
+    """Новое состояние карточки после ответа с оценкой quality (0–5)"""
+    if quality < 3:
+        repetitions, interval = 0, 1.0
+    else:
+        repetitions = card.repetitions + 1
+        if repetitions == 1:
+            interval = 1.0
+        elif repetitions == 2:
+            interval = 6.0
+        else:
+            interval = card.interval * card.ease
+    ease = max(MIN_EASE, card.ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    return Card(ease, interval, repetitions, int(now + interval * DAY))
+
+
+class Question(NamedTuple):
+    gesture: str
+    prompt: str
+    options: tuple
+    answer: int         # номер верного варианта в options
+
+
+class QuizStore:
+    """Карточки пользователей и их сроки повторения"""
+
+    def __init__(self, path):
+        self.path = path
+        self._db = connect(path)
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    def card(self, user_id, gesture):
+        row = self._db.execute(
+            'SELECT ease, interval, repetitions, due FROM cards WHERE user_id = ? AND gesture = ?',
+            (user_id, gesture)
+        ).fetchone()
+        return Card(*row) if row else None
+
+    def next_due(self, user_id, now):
+        """Самая просроченная карточка пользователя или None"""
+        row = self._db.execute(
+            'SELECT gesture FROM cards WHERE user_id = ? AND due <= ? ORDER BY due LIMIT 1',
+            (user_id, int(now))
+        ).fetchone()
+        return row[0] if row else None
+
+    def soonest(self, user_id):
+        """Карточка с ближайшим сроком (для повторения раньше срока)"""
+        row = self._db.execute(
+            'SELECT gesture FROM cards WHERE user_id = ? ORDER BY due LIMIT 1', (user_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def seen(self, user_id):
+        return {row[0] for row in self._db.execute('SELECT gesture FROM cards WHERE user_id = ?', (user_id,))}
+
+    def has_card(self, user_id, gesture):
+        return self._db.execute(
+            'SELECT 1 FROM cards WHERE user_id = ? AND gesture = ?', (user_id, gesture)
+        ).fetchone() is not None
+
+    def save(self, user_id, gesture, card):
+        """Записать карточку и пересчитать ближайший срок пользователя"""
+        with self._db:
+            self._db.execute('BEGIN')
+            self._db.execute(
+                'INSERT INTO cards (user_id, gesture, ease, interval, repetitions, due) VALUES (?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (user_id, gesture) DO UPDATE SET ease = excluded.ease, '
+                'interval = excluded.interval, repetitions = excluded.repetitions, due = excluded.due',
+                (user_id, gesture, *card)
+            )
+            self._db.execute(
+                'INSERT INTO learners (user_id, next_due) '
+                'SELECT ?, MIN(due) FROM cards WHERE user_id = ? '
+                'ON CONFLICT (user_id) DO UPDATE SET next_due = excluded.next_due',
+                (user_id, user_id)
+            )
+
+    def save_many(self, cards):
+        """Записать много карточек одной транзакцией: [(user_id, gesture, Card)]"""
+        cards = list(cards)
+        with self._db:
+            self._db.execute('BEGIN')
+            self._db.executemany(
+                'INSERT INTO cards (user_id, gesture, ease, interval, repetitions, due) VALUES (?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (user_id, gesture) DO UPDATE SET ease = excluded.ease, '
+                'interval = excluded.interval, repetitions = excluded.repetitions, due = excluded.due',
+                ((user_id, gesture, *card) for user_id, gesture, card in cards)
+            )
+            self._db.executemany(
+                'INSERT INTO learners (user_id, next_due) '
+                'SELECT ?, MIN(due) FROM cards WHERE user_id = ? '
+                'ON CONFLICT (user_id) DO UPDATE SET next_due = excluded.next_due',
+                ((user_id, user_id) for user_id in {user_id for user_id, _, _ in cards})
+            )
+
+    def due_learners(self, now, limit=1000):
+        """user_id тех, кому пора повторять, начиная с самых просроченных"""
+        return [row[0] for row in self._db.execute(
+            'SELECT user_id FROM learners WHERE next_due <= ? ORDER BY next_due LIMIT ?',
+            (int(now), limit)
+        )]
+
+    def due_count(self, user_id, now):
+        return self._db.execute(
+            'SELECT COUNT(*) FROM cards WHERE user_id = ? AND due <= ?', (user_id, int(now))
+        ).fetchone()[0]
+
+
+class Quiz:
+    """Выбор следующей карточки, вопросы и ответы по текущей базе жестов"""
+
+    def __init__(self, gestures, categories, rng=None, keys=None):
+        """keys — ключи базы по возрастанию, если уже известны"""
+        self.gestures = gestures
+        self.rng = rng or random.Random()
+        self._keys = tuple(keys) if keys is not None else tuple(sorted(gestures))
+        present = set(self._keys)
+        # жест -> ключи его категории (кандидаты в неверные варианты);
+        # список общий на категорию, сам жест отсеивается при выборе
+        self._neighbours = {}
+        for keys in categories.values():
+            keys = [key for key in keys if key in present]
+            for key in keys:
+                self._neighbours[key] = keys
+
+    def next_card(self, store, user_id, now=None):
+        """Просроченная карточка, иначе новый жест, иначе ближайшая по сроку"""
+        now = time.time() if now is None else now
+        gesture = store.next_due(user_id, now)
+        if gesture in self.gestures:
+            return gesture
+        # пока пользователь знает малую часть базы, новый жест находится
+        # за пару случайных проб без чтения всех его карточек
+        for _ in range(DRAWS):
+            gesture = self.rng.choice(self._keys)
+            if not store.has_card(user_id, gesture):
+                return gesture
+        seen = store.seen(user_id)
+        unseen = [key for key in self._keys if key not in seen]
+        if unseen:
+            return self.rng.choice(unseen)
+        gesture = store.soonest(user_id)
+        return gesture if gesture in self.gestures else self.rng.choice(self._keys)
+
+    def question(self, gesture):
+        """Вопрос по жесту: описание и варианты значения"""
+        record = self.gestures[gesture]
+        meanings = [record['main_meaning']] + [alt['word'] for alt in record['alternative_meanings']]
+        correct = self.rng.choice(meanings)
+        taken = {meaning.upper() for meaning in meanings}
+
+        # сначала соседи по категории, недостающее — из всей базы
+        distractors = []
+        for pool in (self._neighbours.get(gesture, ()), self._keys):
+            if not pool:
+                continue
+            for _ in range(DRAWS):
+                if len(distractors) == OPTIONS - 1:
+                    break
+                word = self.gestures[self.rng.choice(pool)]['main_meaning']
+                if word.upper() not in taken:
+                    distractors.append(word)
+                    taken.add(word.upper())
+
+        options = distractors + [correct]
+        self.rng.shuffle(options)
+        prompt = f"✋ {record['gesture_name']}\n\n📝 {record['description']}"
+        return Question(gesture, prompt, tuple(options), options.index(correct))
+
+    def answer(self, store, user_id, gesture, correct, now=None):
+        """Учесть ответ; возвращает новое состояние карточки"""
+        now = time.time() if now is None else now
+        card = sm2(store.card(user_id, gesture) or Card(), CORRECT if correct else WRONG, now)
+        store.save(user_id, gesture, card)
+        return card
@@ -0,0 +1,347 @@
+"""
+Ограничитель исходящих запросов к Bot API.
+
+Telegram разрешает примерно 30 сообщений в секунду на бота, около одного
+в секунду в личный чат и 20 в минуту в группу; при превышении приходит
+429 с retry_after. Ограничитель держит корзины токенов (общую и на каждый
+чат), пропускает интерактивные ответы раньше рассылок, сам выдерживает
+паузу retry_after и склеивает подряд идущие правки одного сообщения.
+
+Приоритет задаётся через rate_limit_args:
+
+    await bot.send_message(chat_id, text, rate_limit_args=BROADCAST)
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import OrderedDict, deque
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from metrics import record_api_wait
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 0
+BROADCAST = 1
+
+# Методы, которые правят уже отправленное сообщение: из нескольких
+# ожидающих правок одного сообщения достаточно отправить последнюю
+EDIT_METHODS = frozenset({'editMessageText', 'editMessageCaption', 'editMessageReplyMarkup'})
+
+# Общий лимит Telegram на бота, сообщений в секунду
+OVERALL_RATE = 30.0
+
+
+class TokenBucket:
+    """Корзина токенов: rate токенов в секунду, не больше capacity"""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now):
+        """Через сколько секунд появится токен (0 — уже есть)"""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+
+class _Coalesced:
+    """Результат правки, которую заменила более новая"""
+    __slots__ = ('result',)
+
+    def __init__(self, result):
+        self.result = result
+
+
+# Ответ заменённой правке, чья замена отменена, пока ждала очереди:
+# встать в очередь заново и отправить себя самой
+_REQUEUE = object()
+
+
+class _Request:
+    __slots__ = ('priority', 'seq', 'chat_id', 'edit_key', 'future', 'followers', 'dropped')
+
+    def __init__(self, priority, seq, chat_id, edit_key, future, followers):
+        self.priority = priority
+        self.seq = seq
+        self.chat_id = chat_id
+        self.edit_key = edit_key
+        self.future = future
+        self.followers = followers
+        self.dropped = False
+
+
+class PriorityRateLimiter(BaseRateLimiter):
+    """Корзины токенов (общая и по чатам) + очередь с приоритетами"""
+
+    def __init__(
+        self,
+        overall_rate=OVERALL_RATE,
+        chat_rate=1.0,
+        chat_burst=3,
+        group_rate=20 / 60,
+        group_burst=20,
+        max_retries=3,
+        max_idle_chats=10000,
+    ):
+        self.overall_rate = overall_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.group_burst = group_burst
+        self.max_retries = max_retries
+        self.max_idle_chats = max_idle_chats
+
+        self._overall = None
+        self._chat_buckets = OrderedDict()   # от давно использованных к недавним
+        self._pending = {}          # chat_id -> deque ожидающих запросов
+        self._ready = []            # (приоритет, seq, chat_id) — голова очереди чата готова
+        self._delayed = []          # (момент готовности, chat_id)
+        self._edits = {}            # (chat_id, message_id, метод) -> ожидающая правка
+        self._seq = itertools.count()
+        self._wakeup = None
+        self._paused_until = 0.0
+        self._scheduler = None
+
+        self.sent = 0
+        self.coalesced = 0
+        self.retried = 0
+
+    async def initialize(self):
+        # ExtBot зовёт initialize при каждой своей инициализации (Application
+        # и Updater), а не только при первой
+        if self._scheduler is not None:
+            return
+        self._overall = TokenBucket(self.overall_rate, self.overall_rate, time.monotonic())
+        self._wakeup = asyncio.Event()
+        self._scheduler = asyncio.create_task(self._run(), name='PriorityRateLimiter:scheduler')
+
+    async def shutdown(self):
+        if self._scheduler:
+            self._scheduler.cancel()
+            try:
+                await self._scheduler
+            except asyncio.CancelledError:
+                pass
+            self._scheduler = None
+
+    def metrics(self):
+        """Текущие значения для мониторинга"""
+        return {
+            'queued': sum(len(queue) for queue in self._pending.values()),
+            'sent': self.sent,
+            'coalesced': self.coalesced,
+            'retried': self.retried,
+        }
+
+    # --- Корзины ---
+
+    def _chat_bucket(self, chat_id, now):
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) >= self.max_idle_chats:
+                self._forget_idle_chats(now)
+            if isinstance(chat_id, str) or chat_id < 0:
+                bucket = TokenBucket(self.group_rate, self.group_burst, now)
+            else:
+                bucket = TokenBucket(self.chat_rate, self.chat_burst, now)
+            self._chat_buckets[chat_id] = bucket
+        else:
+            self._chat_buckets.move_to_end(chat_id)
+        return bucket
+
+    def _forget_idle_chats(self, now):
+        """
+        Убрать давно не использованные корзины: корзина, которая успела
+        наполниться и не ждёт запросов, ничем не отличается от новой.
+        """
+        while self._chat_buckets:
+            chat_id, bucket = next(iter(self._chat_buckets.items()))
+            if chat_id in self._pending:
+                break
+            bucket._refill(now)
+            if bucket.tokens < bucket.capacity:
+                break
+            del self._chat_buckets[chat_id]
+
+    def _schedule_head(self, chat_id, now):
+        queue = self._pending.get(chat_id)
+        while queue and queue[0].dropped:
+            queue.popleft()
+        if not queue:
+            self._pending.pop(chat_id, None)
+            return
+        delay = self._chat_bucket(chat_id, now).delay(now)
+        if delay:
+            heapq.heappush(self._delayed, (now + delay, chat_id))
+        else:
+            head = queue[0]
+            heapq.heappush(self._ready, (head.priority, head.seq, chat_id))
+
+    # --- Планировщик ---
+
+    async def _sleep(self, seconds):
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+
+            while self._delayed and self._delayed[0][0] <= now:
+                _, chat_id = heapq.heappop(self._delayed)
+                self._schedule_head(chat_id, now)
+
+            if not self._ready:
+                await self._sleep(self._delayed[0][0] - now if self._delayed else None)
+                continue
+
+            delay = self._overall.delay(now)
+            if delay:
+                await asyncio.sleep(delay)
+                continue
+
+            _, _, chat_id = heapq.heappop(self._ready)
+            queue = self._pending.get(chat_id)
+            request = queue.popleft() if queue else None
+            if request is None or request.dropped:
+                self._schedule_head(chat_id, now)
+                continue
+
+            self._overall.take(now)
+            self._chat_bucket(chat_id, now).take(now)
+            if request.edit_key is not None and self._edits.get(request.edit_key) is request:
+                del self._edits[request.edit_key]
+            if not request.future.done():
+                request.future.set_result(None)
+            self._schedule_head(chat_id, now)
+
+    def _enqueue(self, chat_id, priority, edit_key, followers, retry=False):
+        loop = asyncio.get_running_loop()
+        request = _Request(priority, next(self._seq), chat_id, edit_key, loop.create_future(), followers)
+
+        if edit_key is not None:
+            previous = self._edits.get(edit_key)
+            if previous is not None and not previous.future.done():
+                # Старая правка ещё не ушла: её отправитель получит результат новой
+                previous.dropped = True
+                followers.append(previous.future)
+                followers.extend(previous.followers)
+                self.coalesced += 1
+            self._edits[edit_key] = request
+
+        queue = self._pending.get(chat_id)
+        if queue is None:
+            self._pending[chat_id] = deque((request,))
+            self._schedule_head(chat_id, time.monotonic())
+            self._wakeup.set()
+        elif retry:
+            queue.appendleft(request)
+        else:
+            queue.append(request)
+        return request
+
+    # --- BaseRateLimiter ---
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chat_id = data.get('chat_id')
+        if chat_id is None:
+            # answerCallbackQuery, answerInlineQuery и служебные методы
+            # не расходуют лимит сообщений
+            started = time.perf_counter()
+            try:
+                return await callback(*args, **kwargs)
+            finally:
+                record_api_wait(0.0, time.perf_counter() - started)
+        try:
+            chat_id = int(chat_id)
+        except (TypeError, ValueError):
+            pass
+
+        priority = rate_limit_args if rate_limit_args is not None else INTERACTIVE
+        edit_key = None
+        if endpoint in EDIT_METHODS and data.get('message_id') is not None:
+            edit_key = (chat_id, data['message_id'], endpoint)
+
+        followers = []
+        for attempt in range(self.max_retries + 1):
+            outcome = _REQUEUE
+            while outcome is _REQUEUE:
+                request = self._enqueue(chat_id, priority, edit_key, followers, retry=attempt > 0)
+                # ожидание в очереди и сам запрос идут в метрики вызвавшего обработчика
+                queued = time.perf_counter()
+                try:
+                    outcome = await request.future
+                except BaseException:
+                    self._abandon(request, followers)
+                    raise
+                finally:
+                    record_api_wait(time.perf_counter() - queued, 0.0)
+            if isinstance(outcome, _Coalesced):
+                return outcome.result
+            started = time.perf_counter()
+            try:
+                result = await callback(*args, **kwargs)
+            except RetryAfter as exc:
+                if attempt == self.max_retries:
+                    self._resolve(followers, exception=exc)
+                    raise
+                retry_after = getattr(exc.retry_after, 'total_seconds', lambda: exc.retry_after)()
+                logger.info("Rate limit hit. Retrying after %s seconds", retry_after)
+                self.retried += 1
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+                continue
+            except BaseException as exc:
+                self._resolve(followers, exception=exc)
+                raise
+            finally:
+                record_api_wait(0.0, time.perf_counter() - started)
+            self.sent += 1
+            self._resolve(followers, result=result)
+            return result
+
+    def _abandon(self, request, followers):
+        """
+        Запрос отменён, пока ждал очереди: убрать его, а заменённые им
+        правки вернуть в очередь. Будятся от старых к новым, чтобы
+        последней снова встала самая новая и её текст остался итоговым.
+        """
+        request.dropped = True
+        if request.edit_key is not None and self._edits.get(request.edit_key) is request:
+            del self._edits[request.edit_key]
+        for future in reversed(followers):
+            if not future.done():
+                future.set_result(_REQUEUE)
+
+    @staticmethod
+    def _resolve(followers, result=None, exception=None):
+        for future in followers:
+            if future.done():
+                continue
+            if exception is not None:
+                future.set_exception(exception)
+            else:
+                future.set_result(_Coalesced(result))
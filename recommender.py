@@ -0,0 +1,379 @@
+"""
+Какой жест показать пользователю следующим («🔄 Случайный жест»).
+
+Таблица похожих жестов считается заранее, вместе со снимком базы (см.
+corpus.py), и хранится в снимке:
+    confused — жесты, которые путают друг с другом: из common_mistakes
+               вида «Не путайте с 'думать'» (в обе стороны);
+    similar  — до NEIGHBORS жестов той же категории, ближайших по
+               сложности.
+Во время работы рекомендация — несколько обращений к этим таблицам и к
+фасетному индексу (facets.py), без перебора базы.
+
+Про пользователя хранятся два множества номеров жестов — просмотренные
+и те, на которых он ошибся в тренировке. Номера постоянные: они
+выдаются ключам один раз и лежат в SQLite (GestureNumbers), поэтому
+переживают и перезапуск, и правку базы, в отличие от позиций в
+отсортированном списке ключей. Множества хранятся в записи пользователя
+(storage.py) упакованными: разности соседних номеров в varint и base64 —
+несколько десятков байт даже на большой базе.
+
+Выбор: сначала непросмотренные жесты, которые путают с теми, где
+пользователь ошибается, и похожие на них; затем похожие на недавно
+просмотренные. Вес умножается на близость сложности к уровню
+пользователя — самому лёгкому уровню, который он ещё не прошёл на
+LEVEL_DONE. Если кандидатов нет, берётся случайный непросмотренный жест
+любимой категории и нужного уровня через пересечение битовых множеств,
+а когда просмотрено всё — просто случайный.
+"""
+
+import base64
+import random
+import re
+from array import array
+from collections import Counter
+
+from facets import from_bitset, to_bitset
+from search import tokenize
+from subscribers import connect
+
+# Уровни сложности по возрастанию; неизвестные идут после них
+DIFFICULTY_ORDER = ('Лёгкий', 'Средний', 'Сложный')
+
+# Сколько похожих жестов хранить для каждого
+NEIGHBORS = 8
+
+# Доля просмотренных жестов уровня, после которой предлагается следующий
+LEVEL_DONE = 0.7
+
+# Сколько последних ошибок и просмотров учитывать
+STRUGGLING_LIMIT = 16
+RECENT_VIEWS = 3
+
+# Веса источников кандидатов
+CONFUSED_WEIGHT = 4.0
+STRUGGLING_SIMILAR_WEIGHT = 1.5
+SIMILAR_WEIGHT = 1.0
+
+# Сколько раз пробовать случайный номер, прежде чем раскладывать множество
+SAMPLE_TRIES = 32
+
+# Множитель веса по разнице между сложностью жеста и уровнем пользователя
+LEVEL_FACTORS = {0: 1.0, 1: 0.5}
+FAR_LEVEL_FACTOR = 0.2
+
+_QUOTED = re.compile(r"['\"«‘]([^'\"»’]+)['\"»’]")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS gesture_numbers (
+    key TEXT PRIMARY KEY,
+    number INTEGER NOT NULL UNIQUE
+);
+"""
+
+
+# --- Упакованные множества номеров ---
+
+def pack(numbers, ordered=False):
+    """
+    Номера в строку: varint разностей по возрастанию (ordered=True —
+    как есть, в порядке списка).
+
+    >>> pack([3, 5, 300])
+    'AwKnAg'
+    >>> unpack(pack([3, 5, 300]))
+    [3, 5, 300]
+    >>> unpack(pack([7, 2], ordered=True), ordered=True)
+    [7, 2]
+    """
+    out = bytearray()
+    previous = 0
+    for n in (numbers if ordered else sorted(numbers)):
+        value = n if ordered else n - previous
+        previous = n
+        while value >= 0x80:
+            out.append(value & 0x7f | 0x80)
+            value >>= 7
+        out.append(value)
+    return base64.b64encode(bytes(out)).rstrip(b'=').decode('ascii')
+
+
+def unpack(data, ordered=False):
+    """Номера из строки pack(); пустая строка или None — пустой список"""
+    if not data:
+        return []
+    numbers = []
+    n = shift = previous = 0
+    for byte in base64.b64decode(data + '=' * (-len(data) % 4)):
+        n |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        previous = n if ordered else previous + n
+        numbers.append(previous)
+        n = shift = 0
+    return numbers
+
+
+# --- Таблица похожих жестов (строится вместе со снимком) ---
+
+def _level(difficulty):
+    try:
+        return DIFFICULTY_ORDER.index(difficulty)
+    except ValueError:
+        return len(DIFFICULTY_ORDER)
+
+
+def _confusions(keys, records, limit):
+    """
+    {позиция: позиции жестов, с которыми его путают} по common_mistakes —
+    сначала те, что названы в самом жесте, затем те, где назван он; не
+    больше limit на жест
+    """
+    position = {key: i for i, key in enumerate(keys)}
+    by_stems = {}
+    for i, key in enumerate(keys):
+        by_stems.setdefault(' '.join(tokenize(key)), i)
+    named, named_by = {}, {}
+    for i, key in enumerate(keys):
+        for word in _QUOTED.findall(records[key].get('common_mistakes', '')):
+            j = position.get(word.strip().lower())
+            if j is None:
+                j = by_stems.get(' '.join(tokenize(word)))
+            if j is not None and j != i:
+                named.setdefault(i, []).append(j)
+                named_by.setdefault(j, []).append(i)
+    confused = {}
+    for i in named.keys() | named_by.keys():
+        partners = dict.fromkeys(named.get(i, []) + named_by.get(i, [])[:limit])
+        confused[i] = tuple(partners)[:limit]
+    return confused
+
+
+class Similarity:
+    """Заранее посчитанные соседи жестов по позициям в списке ключей"""
+
+    def __init__(self, keys, records, neighbors=NEIGHBORS):
+        """keys — ключи по возрастанию; records — {ключ: жест}"""
+        self.neighbors = neighbors
+        self.levels = bytes(_level(records[key]['difficulty']) for key in keys)
+        self.level_sizes = dict(Counter(self.levels))
+        self.level_bits = {
+            level: to_bitset((i for i, other in enumerate(self.levels) if other == level), len(keys))
+            for level in self.level_sizes
+        }
+        names = {}
+        self.categories = array('H', (names.setdefault(records[key]['category'], len(names)) for key in keys))
+        self.category_names = tuple(names)
+        self.confused = _confusions(keys, records, neighbors)
+
+        groups = {}
+        for i, key in enumerate(keys):
+            groups.setdefault((records[key]['category'], self.levels[i]), []).append(i)
+        similar = array('i', [-1]) * (len(keys) * neighbors)
+        for (category, level), members in groups.items():
+            # сначала тот же уровень (по кругу от самого жеста), затем соседние
+            nearby = [groups.get((category, other), ()) for other in (level + 1, level - 1)]
+            for n, i in enumerate(members):
+                picked = [members[(n + k) % len(members)] for k in range(1, min(len(members), neighbors + 1))]
+                for group in nearby:
+                    take = min(len(group), neighbors - len(picked))
+                    picked.extend(group[(n + k) % len(group)] for k in range(take))
+                similar[i * neighbors:i * neighbors + len(picked)] = array('i', picked)
+        self._similar = similar
+
+    def similar(self, i):
+        """Позиции похожих жестов"""
+        row = self._similar[i * self.neighbors:(i + 1) * self.neighbors]
+        return [j for j in row if j >= 0]
+
+    def metrics(self):
+        """Текущие значения для мониторинга"""
+        return {
+            'gestures': len(self.levels),
+            'confused': sum(len(js) for js in self.confused.values()),
+            'table_bytes': self._similar.itemsize * len(self._similar),
+        }
+
+
+# --- Постоянные номера жестов ---
+
+class GestureNumbers:
+    """Номера ключей жестов, которые не меняются от версии к версии базы (SQLite)"""
+
+    def __init__(self, path):
+        self.path = path
+        self._db = connect(path)
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    def assign(self, keys):
+        """Номера для keys (новым ключам — следующие свободные), в том же порядке"""
+        numbers = dict(self._db.execute('SELECT key, number FROM gesture_numbers'))
+        new = [key for key in keys if key not in numbers]
+        if new:
+            start = max(numbers.values(), default=-1) + 1
+            rows = [(key, start + i) for i, key in enumerate(new)]
+            with self._db:
+                self._db.execute('BEGIN')
+                self._db.executemany('INSERT OR IGNORE INTO gesture_numbers (key, number) VALUES (?, ?)', rows)
+            numbers = dict(self._db.execute('SELECT key, number FROM gesture_numbers'))
+        return tuple(numbers[key] for key in keys)
+
+
+# --- Рекомендации ---
+
+class Recommender:
+    """Следующий жест для пользователя по его просмотрам и ошибкам"""
+
+    def __init__(self, keys, similarity, facets, numbers=None, rng=None):
+        self.rng = rng or random.Random()
+        self.recommended = Counter()
+        self._numbers = numbers
+        self.publish(keys, similarity, facets)
+
+    def attach(self, numbers):
+        """Подключить хранилище постоянных номеров (при сборке приложения)"""
+        self._numbers = numbers
+        self.publish(self.keys, self.similarity, self.facets)
+
+    def publish(self, keys, similarity, facets):
+        """Перейти на новую версию базы (из того же снимка, что и остальные индексы)"""
+        numbers = self._numbers.assign(keys) if self._numbers is not None else tuple(range(len(keys)))
+        position_of = array('i', [-1]) * (max(numbers, default=-1) + 1)
+        for i, number in enumerate(numbers):
+            position_of[number] = i
+        # одним присваиванием: обработчики видят либо старую версию, либо новую
+        self._version = (keys, similarity, facets, {key: i for i, key in enumerate(keys)}, numbers, position_of)
+
+    @property
+    def keys(self):
+        return self._version[0]
+
+    @property
+    def similarity(self):
+        return self._version[1]
+
+    @property
+    def facets(self):
+        return self._version[2]
+
+    def metrics(self):
+        """Текущие значения для мониторинга"""
+        return dict(self.similarity.metrics(), recommended=dict(self.recommended))
+
+    # --- Учёт ---
+
+    def _number(self, key):
+        _, _, _, position, numbers, _ = self._version
+        i = position.get(key)
+        return None if i is None else numbers[i]
+
+    def _positions(self, packed, ordered=False):
+        """Позиции текущей версии по упакованным номерам; удалённые жесты пропускаются"""
+        position_of = self._version[5]
+        return [
+            position_of[n] for n in unpack(packed, ordered)
+            if n < len(position_of) and position_of[n] >= 0
+        ]
+
+    def viewed(self, record, key):
+        """Отметить просмотр в записи пользователя; True, если запись изменилась"""
+        number = self._number(key)
+        if number is None:
+            return False
+        seen = unpack(record.get('seen'))
+        if number in seen:
+            return False
+        seen.append(number)
+        record['seen'] = pack(seen)
+        return True
+
+    def answered(self, record, key, correct):
+        """Ответ тренировки: ошибка ставит жест первым в «трудные», верный ответ убирает его оттуда"""
+        number = self._number(key)
+        if number is None:
+            return
+        self.viewed(record, key)
+        struggling = [n for n in unpack(record.get('struggling'), ordered=True) if n != number]
+        if not correct:
+            struggling.insert(0, number)
+        record['struggling'] = pack(struggling[:STRUGGLING_LIMIT], ordered=True)
+
+    # --- Выбор ---
+
+    def _target_level(self, seen):
+        """Самый лёгкий уровень, где просмотрено меньше LEVEL_DONE жестов"""
+        levels = self.similarity.levels
+        seen_by_level = Counter(levels[i] for i in seen)
+        for level, total in sorted(self.similarity.level_sizes.items()):
+            if seen_by_level[level] < LEVEL_DONE * total:
+                return level
+        return max(levels, default=0)
+
+    def _candidates(self, record, seen, target):
+        """{позиция: вес} непросмотренных соседей трудных и недавних жестов"""
+        similarity = self.similarity
+        position = self._version[3]
+        levels = similarity.levels
+        weights = Counter()
+
+        def add(j, weight):
+            if j not in seen:
+                weights[j] += weight * LEVEL_FACTORS.get(abs(levels[j] - target), FAR_LEVEL_FACTOR)
+
+        for i in self._positions(record.get('struggling'), ordered=True)[:RECENT_VIEWS]:
+            for j in similarity.confused.get(i, ()):
+                add(j, CONFUSED_WEIGHT)
+            for j in similarity.similar(i):
+                add(j, STRUGGLING_SIMILAR_WEIGHT)
+        for key in record.get('history', ())[-RECENT_VIEWS:]:
+            i = position.get(key)
+            if i is not None:
+                for j in similarity.similar(i):
+                    add(j, SIMILAR_WEIGHT)
+        return weights
+
+    def _unseen(self, record, seen, target):
+        """Случайный непросмотренный жест: любимой категории и уровня, уровня, любой"""
+        keys, similarity, facets, position, _, _ = self._version
+        unseen = facets.all & ~to_bitset(seen, len(keys))
+        level = unseen & similarity.level_bits.get(target, 0)
+        options = [('level', level), ('unseen', unseen)]
+        categories = Counter(
+            similarity.categories[position[key]] for key in record.get('history', ()) if key in position
+        )
+        if categories:
+            favourite = similarity.category_names[categories.most_common(1)[0][0]]
+            options.insert(0, ('favourite', level & facets.bits('category', favourite)))
+        for source, bits in options:
+            if bits:
+                return self._random_bit(bits), source
+        return None, 'random'
+
+    def _random_bit(self, bits, tries=SAMPLE_TRIES):
+        """Случайный установленный бит: сначала наугад, для редких множеств — перебором"""
+        size = bits.bit_length()
+        for _ in range(tries):
+            i = self.rng.randrange(size)
+            if bits >> i & 1:
+                return i
+        positions = from_bitset(bits)
+        return positions[self.rng.randrange(len(positions))]
+
+    def recommend(self, record):
+        """Ключ жеста, который стоит показать пользователю с записью record"""
+        keys = self.keys
+        seen = set(self._positions(record.get('seen')))
+        target = self._target_level(seen)
+        weights = self._candidates(record, seen, target)
+        if weights:
+            i, source = self.rng.choices(tuple(weights), tuple(weights.values()))[0], 'similar'
+        else:
+            i, source = self._unseen(record, seen, target)
+            if i is None:
+                i = self.rng.randrange(len(keys))
+        self.recommended[source] += 1
+        return keys[i]
@@ -0,0 +1,82 @@
+"""
+Кэш готовых сообщений о жестах.
+
+Тексты жестов не меняются, пока не изменилась база, поэтому каждый
+собирается один раз — при первом обращении (или сразу, для ключей,
+переданных в конструктор), а дальше обработчики только читают словарь.
+Отрисовка по требованию не задерживает старт на большой базе.
+
+Отрисовка может вернуть не строку, а список разделов: тогда сообщение
+делится на страницы по лимиту варианта (см. layout.py), а text — первая
+из них.
+"""
+
+from typing import Callable, Iterable, NamedTuple, Optional, Sequence, Union
+
+from telegram import InlineKeyboardMarkup
+
+from layout import MESSAGE_LIMIT, paginate
+
+
+class Variant(NamedTuple):
+    """Способ отрисовки жеста: текст (или разделы) и клавиатура под ним"""
+    render: Callable[[str], Union[str, Sequence[str]]]
+    keyboard: Optional[InlineKeyboardMarkup] = None
+    limit: int = MESSAGE_LIMIT
+
+
+class Rendered(NamedTuple):
+    """Готовое сообщение: HTML-текст и клавиатура; pages — все страницы, text — первая"""
+    text: str
+    reply_markup: Optional[InlineKeyboardMarkup]
+    pages: tuple = ()
+
+
+def render(variant: Variant, gesture_key: str) -> Rendered:
+    output = variant.render(gesture_key)
+    pages = paginate([output] if isinstance(output, str) else output, variant.limit)
+    return Rendered(pages[0], variant.keyboard, pages)
+
+
+class RenderCache:
+    """Кэш сообщений по ключу (gesture_key, variant)"""
+
+    def __init__(self, keys: Iterable[str], variants: dict):
+        """keys — жесты, которые отрисовать сразу; остальные — при первом обращении"""
+        self._variants = dict(variants)
+        self._entries = self._build(keys)
+
+    def _build(self, keys):
+        entries = {}
+        for key in keys:
+            for name, variant in self._variants.items():
+                entries[(key, name)] = render(variant, key)
+        return entries
+
+    def get(self, gesture_key: str, variant: str = 'full') -> Rendered:
+        """Готовое сообщение; KeyError, если жеста нет"""
+        rendered = self._entries.get((gesture_key, variant))
+        if rendered is None:
+            # отрисовка читает жест из базы и бросает KeyError, если его нет
+            rendered = self._entries[(gesture_key, variant)] = render(self._variants[variant], gesture_key)
+        return rendered
+
+    def text(self, gesture_key: str, variant: str = 'full') -> str:
+        return self.get(gesture_key, variant).text
+
+    def __contains__(self, item):
+        return item in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def invalidate(self, changed: Iterable[str], removed: Iterable[str] = ()):
+        """
+        Забыть записи изменённых и удалённых жестов; изменённые будут
+        отрисованы заново при следующем обращении.
+
+        Новый словарь собирается целиком и подменяется одной операцией,
+        так что обработчики никогда не видят наполовину обновлённый кэш.
+        """
+        dropped = set(changed) | set(removed)
+        self._entries = {k: v for k, v in self._entries.items() if k[0] not in dropped}
@@ -0,0 +1,311 @@
+"""
+Маршрутизация нажатий кнопок и компактная callback_data.
+
+Telegram ограничивает callback_data 64 байтами, а ключи жестов —
+кириллица, то есть по два байта на букву. Поэтому кнопки несут не ключ,
+а номер жеста, упакованный вместе с номером действия и аргументами:
+
+    '.' + base64url(действие u8, отпечаток u16, аргументы varint...)
+
+Номер жеста — место ключа в отсортированном списке ключей базы, а
+отпечаток — хэш этого списка: пока набор ключей не менялся (правка
+описаний не в счёт), номера остаются верными и после перезапуска. Router
+помнит несколько последних наборов, так что кнопки из сообщений,
+отправленных до перезагрузки базы, продолжают работать; если жест с тех
+пор удалён или набор слишком старый, кнопка считается устаревшей.
+
+Обработчик выбирается по номеру действия из словаря, без цепочки
+сравнений. Число аргументов сверяется с сигнатурой обработчика: кнопка
+другой версии бота с лишними или недостающими аргументами считается
+устаревшей, а не роняет обработчик. Старые текстовые callback_data ('back', 'gesture_<ключ>' и
+т. п.) из уже отправленных сообщений тоже понимаются.
+
+Проверка: python -m pytest tests/test_router.py (вместе с доктестами кодека)
+"""
+
+import base64
+import hashlib
+import inspect
+import logging
+from bisect import bisect_left
+from collections import OrderedDict
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# Признак упакованных данных: символа нет ни в base64url, ни в старых callback_data
+MARK = '.'
+
+MAX_DATA = 64
+
+# Сколько последних наборов ключей помнить для старых кнопок
+HISTORY = 4
+
+# Сколько разных callback_data помнить расшифрованными: кнопки меню и
+# страниц нажимают снова и снова
+DECODE_CACHE_SIZE = 4096
+
+# Действия кнопок. Номер — первый байт callback_data; номера не менять
+# и не переиспользовать: кнопки со старыми номерами остаются в чатах.
+NOOP = 0
+BACK = 1
+WORD_OF_DAY = 2
+RANDOM_GESTURE = 3
+GESTURE = 4             # номер жеста
+QUIZ = 5
+QUIZ_ANSWER = 6         # номер жеста, верно ли (0/1)
+CATEGORIES = 7          # страница
+PAGE = 8                # область, страница (см. pagination.py)
+SEARCH = 9
+HELP = 10
+FILTER = 11             # выбор по фасетам (см. facets.py)
+FILTER_PAGE = 12        # страница, выбор по фасетам
+GESTURE_PAGE = 13       # номер жеста, вариант, страница (длинное описание, см. layout.py)
+
+
+def _varint(n):
+    if n < 0:
+        raise ValueError(f"аргумент callback_data должен быть неотрицательным: {n}")
+    out = bytearray()
+    while n >= 0x80:
+        out.append(n & 0x7f | 0x80)
+        n >>= 7
+    out.append(n)
+    return out
+
+
+def encode(action, *args, tag=0):
+    """
+    Упаковать действие и аргументы в callback_data.
+
+    >>> encode(PAGE, 3, 12)
+    '.CAAAAww'
+    >>> decode(encode(GESTURE, 29999, tag=0xbeef))
+    (4, 48879, (29999,))
+    >>> len(encode(FILTER_PAGE, 1000, 5, 2, tag=65535))
+    11
+    >>> encode(PAGE, -1)
+    Traceback (most recent call last):
+    ...
+    ValueError: аргумент callback_data должен быть неотрицательным: -1
+    """
+    payload = bytearray((action,)) + tag.to_bytes(2, 'little')
+    for arg in args:
+        payload += _varint(arg)
+    data = MARK + base64.urlsafe_b64encode(payload).rstrip(b'=').decode('ascii')
+    if len(data) > MAX_DATA:
+        raise ValueError(f"callback_data длиннее {MAX_DATA} байт")
+    return data
+
+
+@lru_cache(maxsize=DECODE_CACHE_SIZE)
+def decode(data):
+    """
+    (действие, отпечаток, аргументы) из callback_data; ValueError, если
+    это не упакованные данные или они повреждены.
+
+    >>> decode('.CAAAAww')
+    (8, 0, (3, 12))
+    >>> decode('back')
+    Traceback (most recent call last):
+    ...
+    ValueError: не упакованная callback_data: 'back'
+    >>> decode('.CAAAgA')
+    Traceback (most recent call last):
+    ...
+    ValueError: обрезанная callback_data: '.CAAAgA'
+    """
+    if not data.startswith(MARK):
+        raise ValueError(f"не упакованная callback_data: {data!r}")
+    body = data[1:]
+    try:
+        payload = base64.urlsafe_b64decode(body + '=' * (-len(body) % 4))
+    except ValueError:
+        raise ValueError(f"повреждённая callback_data: {data!r}") from None
+    if len(payload) < 3:
+        raise ValueError(f"обрезанная callback_data: {data!r}")
+    rest = payload[3:]
+    if rest.isascii():
+        # все аргументы меньше 128 — по байту на аргумент
+        return payload[0], int.from_bytes(payload[1:3], 'little'), tuple(rest)
+    args = []
+    n = shift = 0
+    for byte in rest:
+        n |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            args.append(n)
+            n = shift = 0
+    if shift:
+        raise ValueError(f"обрезанная callback_data: {data!r}")
+    return payload[0], int.from_bytes(payload[1:3], 'little'), tuple(args)
+
+
+def fingerprint(keys):
+    """Отпечаток набора ключей (u16)"""
+    return int.from_bytes(hashlib.blake2b('\0'.join(keys).encode('utf-8'), digest_size=2).digest(), 'little')
+
+
+class GestureIds:
+    """Номера жестов для callback_data и их расшифровка, в том числе для старых наборов ключей"""
+
+    def __init__(self, history=HISTORY):
+        self.history = history
+        self.tag = 0
+        self.keys = ()
+        self._sets = OrderedDict()      # отпечаток -> ключи по возрастанию
+
+    def publish(self, keys):
+        """Сделать текущим набор ключей новой версии базы (ключи по возрастанию)"""
+        tag = fingerprint(keys)
+        self._sets[tag] = keys
+        self._sets.move_to_end(tag)
+        while len(self._sets) > self.history:
+            self._sets.popitem(last=False)
+        self.tag, self.keys = tag, keys
+
+    def _index(self, key):
+        i = bisect_left(self.keys, key)
+        return i if i < len(self.keys) and self.keys[i] == key else -1
+
+    def __contains__(self, key):
+        return self._index(key) >= 0
+
+    def id(self, key):
+        """Номер жеста в текущем наборе; KeyError, если жеста нет"""
+        i = self._index(key)
+        if i < 0:
+            raise KeyError(key)
+        return i
+
+    def key(self, tag, gesture_id):
+        """Ключ по номеру из кнопки или None, если кнопка устарела"""
+        keys = self._sets.get(tag)
+        if keys is None or not 0 <= gesture_id < len(keys):
+            return None
+        key = keys[gesture_id]
+        if tag != self.tag and key not in self:
+            return None
+        return key
+
+
+GESTURE_IDS = GestureIds()
+
+
+def _arity(handler):
+    """(наименьшее, наибольшее) число аргументов обработчика после update и context"""
+    low = high = 0
+    for parameter in tuple(inspect.signature(handler).parameters.values())[2:]:
+        if parameter.kind == parameter.VAR_POSITIONAL:
+            high = float('inf')
+        elif parameter.kind in (parameter.POSITIONAL_ONLY, parameter.POSITIONAL_OR_KEYWORD):
+            high += 1
+            if parameter.default is parameter.empty:
+                low += 1
+    return low, high
+
+
+def callback_data(action, *args):
+    """callback_data кнопки без жеста"""
+    return encode(action, *args)
+
+
+def gesture_data(action, key, *args):
+    """callback_data кнопки жеста: номер жеста идёт первым аргументом"""
+    return encode(action, GESTURE_IDS.id(key), *args, tag=GESTURE_IDS.tag)
+
+
+class Router:
+    """
+    Таблица действий: номер действия -> обработчик(update, context, *аргументы).
+    У действий с жестом первым аргументом приходит уже ключ жеста.
+    """
+
+    def __init__(self, stale, ids=GESTURE_IDS):
+        """stale(update, context) — ответ на устаревшую или непонятную кнопку"""
+        self.ids = ids
+        self._stale = stale
+        self._routes = {}
+        self._aliases = {}      # старая текстовая callback_data -> (действие, аргументы)
+        self._prefixes = {}     # старый префикс перед ключом жеста -> действие
+
+        self.dispatched = 0
+        self.stale = 0
+
+    def route(self, action, gesture=False, aliases=()):
+        """Декоратор: обработчик действия; aliases — его старые текстовые callback_data"""
+        def register(handler):
+            if action in self._routes:
+                raise ValueError(f"действие {action} уже занято обработчиком {self._routes[action][0].__name__}")
+            self._routes[action] = (handler, gesture, _arity(handler))
+            for alias in aliases:
+                self.alias(alias, action)
+            return handler
+        return register
+
+    def alias(self, data, action, *args):
+        """Старая текстовая callback_data, которая значит действие с аргументами"""
+        self._aliases[data] = (action, args)
+
+    def legacy_prefix(self, prefix, action):
+        """Старые callback_data вида <префикс><ключ жеста>"""
+        self._prefixes[prefix] = action
+
+    def resolve(self, data):
+        """(обработчик, аргументы) или None, если кнопка устарела"""
+        if data.startswith(MARK):
+            try:
+                action, tag, args = decode(data)
+            except ValueError:
+                return None
+            route = self._routes.get(action)
+            if route is None:
+                return None
+            handler, gesture, (low, high) = route
+            if not low <= len(args) <= high:
+                return None
+            if gesture:
+                key = self.ids.key(tag, args[0]) if args else None
+                if key is None:
+                    return None
+                args = (key,) + args[1:]
+            return handler, args
+
+        alias = self._aliases.get(data)
+        if alias is not None:
+            action, args = alias
+            return self._routes[action][0], args
+        for prefix, action in self._prefixes.items():
+            if data.startswith(prefix):
+                key = data[len(prefix):]
+                return (self._routes[action][0], (key,)) if key in self.ids else None
+        return None
+
+    def name(self, data):
+        """Имя обработчика, которому достанется нажатие (для метрик)"""
+        found = self.resolve(data or '')
+        return found[0].__name__ if found is not None else self._stale.__name__
+
+    async def dispatch(self, update, context):
+        """Обработчик CallbackQueryHandler"""
+        query = update.callback_query
+        found = self.resolve(query.data or '')
+        if found is None:
+            self.stale += 1
+            logger.debug("Устаревшая кнопка: %r", query.data)
+            await self._stale(update, context)
+            return
+        self.dispatched += 1
+        handler, args = found
+        await query.answer()
+        await handler(update, context, *args)
+
+    def metrics(self):
+        """Текущие значения для мониторинга"""
+        return {
+            'actions': len(self._routes),
+            'dispatched': self.dispatched,
+            'stale': self.stale,
+            'key_sets': len(self.ids._sets),
+        }
@@ -0,0 +1,290 @@
+"""
+Поиск жестов по свободному тексту.
+
+Индексируются main_meaning, все alternative_meanings[].word, примеры
+и описание. Слова приводятся к нижнему регистру, ё → е и обрезаются
+лёгким стеммером, поэтому «люблю», «любить» и «любовь» дают одну основу.
+Запрос не перебирает базу: точные совпадения берутся из инвертированного
+индекса, начала слов — бинарным поиском по словарю основ, опечатки —
+через триграммный индекс словаря. У коротких основ («прив», «нет»)
+триграмм слишком мало, и одна неверная буква меняет большую их часть:
+для них все варианты с одной правкой ещё и проверяются по словарю.
+"""
+
+import bisect
+import heapq
+import math
+import re
+from functools import lru_cache
+
+# Вес поля: совпадение в основном значении важнее, чем в описании
+FIELD_WEIGHTS = {
+    'main_meaning': 10.0,
+    'alternative': 6.0,
+    'examples': 2.0,
+    'description': 1.0,
+}
+
+# Насколько ценится неточное совпадение по сравнению с точным
+PREFIX_FACTOR = 0.7
+FUZZY_FACTOR = 0.6
+FUZZY_THRESHOLD = 0.5
+
+# Основы не длиннее этой ищутся ещё и с опечаткой в одну букву, с таким
+# коэффициентом похожести
+MAX_EDIT_STEM = 5
+EDIT_SIMILARITY = 0.8
+
+# Сколько основ словаря может раскрыть одно начало слова
+MAX_PREFIX_TERMS = 16
+
+# Сколько лучших жестов на основу участвует в ранжировании: частые слова
+# вроде «рука» встречаются в тысячах описаний, и перебирать их все незачем
+MAX_POSTINGS = 64
+
+MIN_STEM = 3
+
+TOKEN_RE = re.compile(r'[а-яa-z0-9]+')
+
+CYRILLIC = 'абвгдежзийклмнопрстуфхцчшщъыьэюя'
+LATIN = 'abcdefghijklmnopqrstuvwxyz0123456789'
+
+REFLEXIVE = ('ся', 'сь')
+
+# Окончания и суффиксы, от длинных к коротким
+ENDINGS = sorted((
+    'ировать', 'ывать', 'ивать', 'овать', 'ующий', 'ающий', 'яющий',
+    'ениям', 'ением', 'ость', 'ости', 'ение', 'ения', 'ями', 'ами', 'ими', 'ыми',
+    'ого', 'его', 'ому', 'ему', 'ешь', 'ишь', 'ете', 'ите', 'ать', 'ять', 'еть',
+    'ить', 'уть', 'ала', 'ало', 'али', 'яла', 'ило', 'ила', 'ели', 'овь',
+    'аю', 'яю', 'ет', 'ит', 'ут', 'ют', 'ат', 'ят', 'ой', 'ый', 'ий', 'ая', 'яя',
+    'ое', 'ее', 'ые', 'ие', 'ую', 'юю', 'ам', 'ям', 'ах', 'ях', 'ов', 'ев', 'ей',
+    'ом', 'ем', 'ал', 'ил', 'ел',
+    'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й',
+), key=len, reverse=True)
+
+# Те же окончания по длинам (от длинных к коротким): проверка слова —
+# несколько поисков в множествах вместо перебора всего списка
+ENDINGS_BY_LENGTH = tuple(
+    (length, frozenset(e for e in ENDINGS if len(e) == length))
+    for length in sorted({len(e) for e in ENDINGS}, reverse=True)
+)
+
+LABIALS = 'бпвмф'
+
+# Основы повторяются из жеста в жест, так что их удобно помнить
+STEM_CACHE_SIZE = 1 << 16
+
+
+def normalize(text):
+    """Нижний регистр и ё → е"""
+    return text.lower().replace('ё', 'е')
+
+
+@lru_cache(maxsize=STEM_CACHE_SIZE)
+def stem(word):
+    """
+    Лёгкий стеммер для русского: отрезает возвратную частицу и окончание,
+    а также вставное «л» после губных (люблю → люб, ловлю → лов).
+    """
+    for suffix in REFLEXIVE:
+        if word.endswith(suffix) and len(word) - len(suffix) >= MIN_STEM:
+            word = word[:-len(suffix)]
+            break
+    for length, endings in ENDINGS_BY_LENGTH:
+        if len(word) - length >= MIN_STEM and word[-length:] in endings:
+            word = word[:-length]
+            break
+    if len(word) > MIN_STEM and word[-1] == 'л' and word[-2] in LABIALS:
+        word = word[:-1]
+    return word
+
+
+def tokenize(text):
+    """Основы слов текста (однобуквенные предлоги отбрасываются)"""
+    return [stem(token) for token in TOKEN_RE.findall(normalize(text)) if len(token) > 1]
+
+
+def trigrams(term):
+    padded = f' {term} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edits(term):
+    """
+    Все слова на расстоянии одной правки от term (удаление, замена или
+    вставка буквы того же алфавита).
+
+    >>> 'прив' in edits('прев'), 'нет' in edits('нэт'), 'нет' in edits('нт'), 'нет' in edits('нет')
+    (True, True, True, False)
+    """
+    alphabet = CYRILLIC if any(char in CYRILLIC for char in term) else LATIN
+    variants = set()
+    for i in range(len(term) + 1):
+        head, tail = term[:i], term[i:]
+        if tail:
+            variants.add(head + tail[1:])
+            variants.update(head + char + tail[1:] for char in alphabet)
+        variants.update(head + char + tail for char in alphabet)
+    variants.discard(term)
+    return variants
+
+
+def gesture_fields(gesture):
+    """Пары (поле, текст), по которым ищется жест"""
+    yield 'main_meaning', gesture['main_meaning']
+    for alt in gesture['alternative_meanings']:
+        yield 'alternative', alt['word']
+    for example in gesture['examples']:
+        yield 'examples', example
+    yield 'description', gesture['description']
+
+
+class SearchIndex:
+    """Инвертированный индекс основ + триграммы словаря для опечаток"""
+
+    def __init__(self, gestures=None):
+        self._postings = {}   # основа -> {ключ жеста: вес лучшего поля}
+        self._grams = {}      # триграмма -> множество основ
+        self._docs = {}       # ключ жеста -> множество его основ
+        self._top = {}        # основа -> лучшие MAX_POSTINGS пар (ключ, вес)
+        self._vocabulary = []
+        self._vocabulary_dirty = False
+        if gestures is not None:
+            for key in gestures:
+                self.add(key, gestures[key])
+            self._sorted_vocabulary()
+
+    def __len__(self):
+        return len(self._docs)
+
+    def copy(self):
+        """
+        Независимая копия для обновления в фоне: поиск по исходному индексу
+        её не меняет, так что копировать можно, пока он отвечает на запросы.
+        """
+        clone = SearchIndex()
+        clone._postings = {term: dict(postings) for term, postings in self._postings.items()}
+        clone._grams = {gram: set(terms) for gram, terms in self._grams.items()}
+        clone._docs = dict(self._docs)
+        clone._vocabulary = self._vocabulary
+        clone._vocabulary_dirty = self._vocabulary_dirty
+        return clone
+
+    def add(self, key, gesture):
+        """Проиндексировать жест (повторный вызов заменяет старую запись)"""
+        if key in self._docs:
+            self.remove(key)
+        terms = {}
+        for field, text in gesture_fields(gesture):
+            weight = FIELD_WEIGHTS[field]
+            for term in tokenize(text):
+                if weight > terms.get(term, 0.0):
+                    terms[term] = weight
+        for term, weight in terms.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                for gram in trigrams(term):
+                    self._grams.setdefault(gram, set()).add(term)
+                self._vocabulary_dirty = True
+            postings[key] = weight
+            self._top.pop(term, None)
+        self._docs[key] = set(terms)
+
+    def remove(self, key):
+        """Убрать жест из индекса"""
+        for term in self._docs.pop(key, ()):
+            postings = self._postings[term]
+            del postings[key]
+            self._top.pop(term, None)
+            if not postings:
+                del self._postings[term]
+                for gram in trigrams(term):
+                    terms = self._grams[gram]
+                    terms.discard(term)
+                    if not terms:
+                        del self._grams[gram]
+                self._vocabulary_dirty = True
+
+    def _sorted_vocabulary(self):
+        if self._vocabulary_dirty:
+            self._vocabulary = sorted(self._postings)
+            self._vocabulary_dirty = False
+        return self._vocabulary
+
+    def _top_postings(self, term):
+        top = self._top.get(term)
+        if top is None:
+            postings = self._postings[term]
+            idf = math.log(1.0 + len(self._docs) / len(postings))
+            best = heapq.nlargest(MAX_POSTINGS, postings.items(), key=lambda item: item[1])
+            top = self._top[term] = [(key, weight * idf) for key, weight in best]
+        return top
+
+    def _prefix_terms(self, term):
+        vocabulary = self._sorted_vocabulary()
+        i = bisect.bisect_right(vocabulary, term)
+        end = min(len(vocabulary), i + MAX_PREFIX_TERMS)
+        while i < end and vocabulary[i].startswith(term):
+            yield vocabulary[i]
+            i += 1
+
+    def _fuzzy_terms(self, term):
+        """
+        Похожие основы по коэффициенту Дайса на триграммах.
+
+        Чтобы не считать пересечения с огромными списками частых триграмм,
+        используется префиксный фильтр: у подходящей основы обязательно есть
+        общая триграмма среди самых редких триграмм запроса.
+        """
+        grams = trigrams(term)
+        need = math.ceil(FUZZY_THRESHOLD * len(grams) / (2.0 - FUZZY_THRESHOLD))
+        rarest = sorted(grams, key=lambda gram: len(self._grams.get(gram, ())))
+        candidates = set()
+        for gram in rarest[:len(grams) - need + 1]:
+            candidates.update(self._grams.get(gram, ()))
+        gram_terms = [self._grams.get(gram, ()) for gram in grams]
+        for candidate in candidates:
+            shared = sum(1 for terms in gram_terms if candidate in terms)
+            similarity = 2.0 * shared / (len(grams) + len(candidate))
+            if similarity >= FUZZY_THRESHOLD:
+                yield candidate, similarity
+
+    def _edit_terms(self, term):
+        """Основы словаря на расстоянии одной правки от короткой основы"""
+        for variant in edits(term):
+            if variant in self._postings:
+                yield variant
+
+    def _term_matches(self, term):
+        """Основы словаря, подходящие к основе запроса, с коэффициентом"""
+        matches = {}
+        if term in self._postings:
+            matches[term] = 1.0
+        if len(term) >= MIN_STEM:
+            for candidate in self._prefix_terms(term):
+                matches.setdefault(candidate, PREFIX_FACTOR)
+        if not matches and len(term) >= MIN_STEM:
+            for candidate, similarity in self._fuzzy_terms(term):
+                matches[candidate] = FUZZY_FACTOR * similarity
+            if len(term) <= MAX_EDIT_STEM:
+                for candidate in self._edit_terms(term):
+                    factor = FUZZY_FACTOR * EDIT_SIMILARITY
+                    if factor > matches.get(candidate, 0.0):
+                        matches[candidate] = factor
+        return matches
+
+    def search(self, query, limit=10):
+        """Список (ключ жеста, очки), лучшие первыми"""
+        scores = {}
+        for term in dict.fromkeys(tokenize(query)):
+            best = {}
+            for candidate, factor in self._term_matches(term).items():
+                for key, weight in self._top_postings(candidate):
+                    score = weight * factor
+                    if score > best.get(key, 0.0):
+                        best[key] = score
+            for key, score in best.items():
+                scores[key] = scores.get(key, 0.0) + score
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
@@ -0,0 +1,149 @@
+"""
+Состояние пользователей: часовой пояс, история просмотров и т. п.
+
+Запись — словарь, который хранится в бэкенде целиком (SQLite или
+память). UserStore читает записи через LRU-кэш и не пишет их сразу:
+изменённые записи помечаются «грязными» и сбрасываются в бэкенд одной
+транзакцией раз в flush_interval секунд и при остановке бота.
+
+    record = users.get(user_id)
+    record['timezone'] = 'Asia/Omsk'
+    users.mark_dirty(user_id)
+"""
+
+import json
+import time
+from collections import OrderedDict
+
+from subscribers import connect
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY,
+    data TEXT NOT NULL,
+    updated_at INTEGER NOT NULL
+);
+"""
+
+
+class MemoryBackend:
+    """Бэкенд в памяти — для тестов и замеров"""
+
+    def __init__(self):
+        self._records = {}
+        self.writes = 0
+
+    def load(self, user_id):
+        data = self._records.get(user_id)
+        return json.loads(data) if data is not None else None
+
+    def save_many(self, records):
+        self.writes += 1
+        for user_id, record in records.items():
+            self._records[user_id] = json.dumps(record, ensure_ascii=False)
+
+    def close(self):
+        pass
+
+
+class SQLiteBackend:
+    """Записи пользователей в SQLite (WAL), по JSON-строке на пользователя"""
+
+    def __init__(self, path):
+        self.path = path
+        self._db = connect(path)
+        self._db.executescript(SCHEMA)
+        self.writes = 0
+
+    def load(self, user_id):
+        row = self._db.execute('SELECT data FROM users WHERE user_id = ?', (user_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_many(self, records):
+        """Записать {user_id: запись} одной транзакцией"""
+        now = int(time.time())
+        with self._db:
+            self._db.execute('BEGIN')
+            self._db.executemany(
+                'INSERT INTO users (user_id, data, updated_at) VALUES (?, ?, ?) '
+                'ON CONFLICT (user_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at',
+                ((user_id, json.dumps(record, ensure_ascii=False), now)
+                 for user_id, record in records.items())
+            )
+        self.writes += 1
+
+    def close(self):
+        self._db.close()
+
+
+class UserStore:
+    """Кэш записей пользователей с отложенной пакетной записью"""
+
+    def __init__(self, backend, cache_size=10000, flush_interval=5.0, write_behind=True):
+        self.backend = backend
+        self.cache_size = cache_size
+        self.flush_interval = flush_interval
+        self.write_behind = write_behind
+        self._cache = OrderedDict()     # от давно прочитанных к недавним
+        self._dirty = {}                # user_id -> запись, ещё не сохранённая
+
+        self.hits = 0
+        self.misses = 0
+        self.flushed = 0
+
+    def metrics(self):
+        """Текущие значения для мониторинга"""
+        return {
+            'cached': len(self._cache),
+            'dirty': len(self._dirty),
+            'hits': self.hits,
+            'misses': self.misses,
+            'flushed': self.flushed,
+            'writes': self.backend.writes,
+        }
+
+    def get(self, user_id):
+        """Запись пользователя; новому пользователю — пустой словарь"""
+        record = self._cache.get(user_id)
+        if record is not None:
+            self._cache.move_to_end(user_id)
+            self.hits += 1
+            return record
+        # вытесненная из кэша, но ещё не сохранённая запись
+        record = self._dirty.get(user_id)
+        if record is None:
+            self.misses += 1
+            record = self.backend.load(user_id) or {}
+        self._cache[user_id] = record
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return record
+
+    def mark_dirty(self, user_id):
+        """Запись изменена — сохранить при следующем сбросе"""
+        self._dirty[user_id] = self.get(user_id)
+        if not self.write_behind:
+            self.flush()
+
+    def update(self, user_id, **fields):
+        self.get(user_id).update(fields)
+        self.mark_dirty(user_id)
+
+    def flush(self):
+        """Сохранить все изменённые записи; возвращает их число"""
+        if not self._dirty:
+            return 0
+        dirty, self._dirty = self._dirty, {}
+        try:
+            self.backend.save_many(dirty)
+        except Exception:
+            # не теряем изменения: следующий сброс попробует снова
+            dirty.update(self._dirty)
+            self._dirty = dirty
+            raise
+        self.flushed += len(dirty)
+        return len(dirty)
+
+    def close(self):
+        self.flush()
+        self.backend.close()
@@ -0,0 +1,121 @@
+"""
+Подписчики на «слово дня» и прогресс рассылок (SQLite).
+
+Подписчики разложены по BUCKETS корзинам (chat_id % BUCKETS) с индексом
+(корзина, chat_id): рассылка читает каждую корзину кусками по ключу, не
+загружая весь список в память, а её прогресс хранится по корзинам.
+"""
+
+import sqlite3
+import time
+
+BUCKETS = 64
+
+# Контрольная точка корзины, по которой ещё ничего не отправлено: меньше
+# любого chat_id, в том числе отрицательных id групп
+START = -2 ** 63
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS subscribers (
+    chat_id INTEGER PRIMARY KEY,
+    bucket INTEGER NOT NULL,
+    subscribed_at INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS subscribers_bucket ON subscribers (bucket, chat_id);
+CREATE TABLE IF NOT EXISTS broadcast_progress (
+    broadcast_id TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    last_chat_id INTEGER NOT NULL,
+    done INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (broadcast_id, bucket)
+);
+"""
+
+
+def connect(path):
+    """Соединение SQLite в режиме WAL"""
+    connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    return connection
+
+
+class SubscriberStore:
+    """Подписчики и контрольные точки рассылок"""
+
+    def __init__(self, path):
+        self.path = path
+        self._db = connect(path)
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    # --- Подписки ---
+
+    def subscribe(self, chat_id):
+        """True, если подписка новая"""
+        cursor = self._db.execute(
+            'INSERT OR IGNORE INTO subscribers (chat_id, bucket, subscribed_at) VALUES (?, ?, ?)',
+            (chat_id, chat_id % BUCKETS, int(time.time()))
+        )
+        return cursor.rowcount == 1
+
+    def subscribe_many(self, chat_ids):
+        now = int(time.time())
+        with self._db:
+            self._db.execute('BEGIN')
+            self._db.executemany(
+                'INSERT OR IGNORE INTO subscribers (chat_id, bucket, subscribed_at) VALUES (?, ?, ?)',
+                ((chat_id, chat_id % BUCKETS, now) for chat_id in chat_ids)
+            )
+
+    def unsubscribe(self, chat_id):
+        """True, если подписка была"""
+        cursor = self._db.execute('DELETE FROM subscribers WHERE chat_id = ?', (chat_id,))
+        return cursor.rowcount == 1
+
+    def is_subscribed(self, chat_id):
+        return self._db.execute('SELECT 1 FROM subscribers WHERE chat_id = ?', (chat_id,)).fetchone() is not None
+
+    def count(self):
+        return self._db.execute('SELECT COUNT(*) FROM subscribers').fetchone()[0]
+
+    def iter_bucket(self, bucket, after=START, chunk_size=500):
+        """Куски chat_id корзины по возрастанию, начиная после after"""
+        while True:
+            rows = self._db.execute(
+                'SELECT chat_id FROM subscribers WHERE bucket = ? AND chat_id > ? ORDER BY chat_id LIMIT ?',
+                (bucket, after, chunk_size)
+            ).fetchall()
+            if not rows:
+                return
+            chunk = [row[0] for row in rows]
+            yield chunk
+            after = chunk[-1]
+
+    # --- Прогресс рассылок ---
+
+    def progress(self, broadcast_id):
+        """{корзина: (последний отправленный chat_id, завершена ли)}"""
+        rows = self._db.execute(
+            'SELECT bucket, last_chat_id, done FROM broadcast_progress WHERE broadcast_id = ?',
+            (broadcast_id,)
+        )
+        return {bucket: (last_chat_id, bool(done)) for bucket, last_chat_id, done in rows}
+
+    def save_progress(self, broadcast_id, checkpoints):
+        """Записать контрольные точки одной транзакцией: {корзина: (chat_id, done)}"""
+        with self._db:
+            self._db.execute('BEGIN')
+            self._db.executemany(
+                'INSERT INTO broadcast_progress (broadcast_id, bucket, last_chat_id, done) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (broadcast_id, bucket) DO UPDATE SET last_chat_id = excluded.last_chat_id, '
+                'done = excluded.done',
+                ((broadcast_id, bucket, last_chat_id, int(done))
+                 for bucket, (last_chat_id, done) in checkpoints.items())
+            )
+
+    def is_finished(self, broadcast_id, buckets=range(BUCKETS)):
+        progress = self.progress(broadcast_id)
+        return all(progress.get(bucket, (START, False))[1] for bucket in buckets)
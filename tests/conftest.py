@@ -0,0 +1,2 @@
+def pytest_configure(config):
+    config.addinivalue_line('markers', "slow: запускает процессы бота, идёт десятки секунд (-m 'not slow' — без них)")
@@ -0,0 +1,42 @@
+"""Защита от флуда: какие обновления расходуют токены и что получают отброшенные"""
+
+import asyncio
+
+from telegram import Update, User
+from telegram.ext import ApplicationHandlerStop
+
+from antiflood import THROTTLED, Antiflood
+from benchmarks.updates import edited_update, message_update
+
+
+def test_edited_messages_spend_tokens():
+    antiflood = Antiflood(rate=1.0, burst=2)
+    updates = [Update.de_json(edited_update(message_update(1, f'слово {i}')), None) for i in range(3)]
+    assert [antiflood.check(update, now=0.0) for update in updates] == [None, None, THROTTLED]
+
+
+def test_every_dropped_press_is_answered():
+    antiflood = Antiflood(rate=0.001, burst=1, duplicate_window=0)
+    answers = []
+
+    class Query:
+        def __init__(self, data):
+            self.data = data
+            self.message = None
+            self.inline_message_id = 'inline'
+            self.from_user = User(1, 'User1', False)
+
+        async def answer(self, text=None):
+            answers.append(text)
+
+    async def press_all():
+        for i in range(4):
+            update = Update(i, callback_query=Query(i))
+            try:
+                await antiflood.guard(update, None)
+            except ApplicationHandlerStop:
+                pass
+
+    asyncio.run(press_all())
+    # первое нажатие прошло, на первое сверх лимита — NOTICE, на остальные — пустой ответ
+    assert answers == [antiflood.notice, None, None]
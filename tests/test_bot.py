@@ -0,0 +1,62 @@
+"""Обновления через всё приложение: заглушка Bot API в том же процессе"""
+
+import asyncio
+
+from telegram import Update
+
+import bot
+import router
+from benchmarks.bench_ingress import unlimited_rate_limiter
+from benchmarks.fake_bot_api import FakeBotAPI
+from benchmarks.harness import InProcessRequest, stopped
+from benchmarks.updates import callback_update, edited_update, message_update
+
+
+def process(tmp_path, updates, **kwargs):
+    """Прогнать обновления; (ошибки обработчиков, вызванные методы API)"""
+    async def run():
+        api = FakeBotAPI()
+        application = bot.build_application(
+            api.token, db_path=str(tmp_path / 'bot.db'), rate_limiter=unlimited_rate_limiter(),
+            request=InProcessRequest(api), **kwargs
+        )
+        errors = []
+
+        async def on_error(update, context):
+            errors.append(context.error)
+
+        application.add_error_handler(on_error)
+        await application.initialize()
+        await application.start()
+        try:
+            for data in updates:
+                await application.process_update(Update.de_json(data, application.bot))
+        finally:
+            await stopped(application)
+        return errors, [method for method, _, _ in api.calls]
+
+    return asyncio.run(run())
+
+
+def test_text_message_searches(tmp_path):
+    errors, calls = process(tmp_path, [message_update(1, 'привет')])
+    assert errors == []
+    assert calls.count('sendMessage') == 1
+
+
+def test_edited_message_is_ignored(tmp_path):
+    errors, calls = process(tmp_path, [edited_update(message_update(1, 'привет'))])
+    assert errors == []
+    assert 'sendMessage' not in calls
+
+
+def test_features_built_on_first_use(tmp_path):
+    # тренировка и рекомендации открывают свои базы только при первом нажатии
+    updates = [
+        message_update(1, '/start'),
+        callback_update(1, bot.callback_data(router.QUIZ)),
+        callback_update(1, bot.callback_data(router.RANDOM_GESTURE)),
+    ]
+    errors, calls = process(tmp_path, updates)
+    assert errors == []
+    assert calls.count('editMessageText') == 2
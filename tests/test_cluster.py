@@ -0,0 +1,42 @@
+"""Кластер: обновления не теряются и не удваиваются, когда процесс падает"""
+
+import asyncio
+import signal
+import time
+
+import pytest
+
+from benchmarks.bench_cluster import run
+from benchmarks.updates import update_stream
+from cluster import Cluster, ClusterStore
+
+UPDATES = 300
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize('victim', [0, 1], ids=['leader', 'worker'])
+@pytest.mark.parametrize('restart', [signal.SIGKILL, signal.SIGTERM], ids=['kill', 'term'])
+def test_restart_keeps_every_update_once(restart, victim):
+    _, count, twice, missing = asyncio.run(
+        run(2, update_stream(UPDATES, 50, seed=victim), 0.0, restart=restart, victim=victim)
+    )
+    assert (count, twice, missing) == (UPDATES, 0, 0)
+
+
+def test_new_holder_reclaims_unfinished_updates(tmp_path):
+    store = ClusterStore(str(tmp_path / 'bot.db'), partitions=2)
+    store.push([(1, 0, '{}'), (2, 0, '{}'), (3, 1, '{}')])
+    # упавший процесс забрал обновления части 0 и успел обработать одно
+    assert store.acquire('worker:0/2', 'dead', ttl=60, now=time.time())
+    assert [row[0] for row in store.claim((0,), 'dead')] == [1, 2]
+    store.finish([1])
+
+    cluster = Cluster(store, worker=0, workers=2, holder='new', lease_ttl=1)
+    # пока аренда упавшего действует, его части не трогаются
+    asyncio.run(cluster._renew_once(None))
+    assert not cluster.holds_slot
+    store.release('worker:0/2', 'dead')
+    asyncio.run(cluster._renew_once(None))
+    assert cluster.holds_slot
+    assert [row[0] for row in store.claim((0,), 'new')] == [2]
+    store.close()
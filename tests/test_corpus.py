@@ -0,0 +1,24 @@
+"""Снимок индексов базы: поисковый индекс распаковывается при первом поиске"""
+
+from corpus import PickledIndex, initial_snapshot, load_snapshot, save_snapshot
+from gesture_store import DEFAULT_SOURCE, open_store
+
+
+def test_snapshot_search_is_loaded_on_first_use(tmp_path):
+    gestures = open_store(DEFAULT_SOURCE, str(tmp_path / 'gestures.bin'))
+    built = initial_snapshot(gestures)
+    path = str(tmp_path / 'gestures.snapshot')
+    save_snapshot(built, path)
+
+    loaded = load_snapshot(gestures, path)
+    assert isinstance(loaded.search, PickledIndex)
+    assert loaded.search._index is None
+
+    # нераспакованный индекс записывается как был прочитан
+    save_snapshot(loaded, path)
+    assert loaded.search._index is None
+
+    query = built.keys[0]
+    assert load_snapshot(gestures, path).search.search(query) == built.search.search(query)
+    assert len(loaded.search) == len(built.search)
+    assert loaded.search.copy().search(query) == built.search.search(query)
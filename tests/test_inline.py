@@ -0,0 +1,34 @@
+"""Inline-режим: кэш ответов и отсев устаревших запросов"""
+
+import asyncio
+
+from inline import InlineSearch
+
+
+class Index:
+    def __init__(self):
+        self.queries = []
+
+    def search(self, query, limit=10):
+        self.queries.append(query)
+        return [(query, 1.0)]
+
+
+def test_cache_hit_supersedes_waiting_query():
+    index = Index()
+    inline = InlineSearch(index, lambda key: key, debounce=0.05)
+
+    async def typing():
+        await inline.answer(2, 'q0', 'привет')
+        # пользователь набирает «пр», а «привет» уже в кэше
+        waiting = asyncio.create_task(inline.answer(1, 'q1', 'пр'))
+        await asyncio.sleep(0)
+        cached = await inline.answer(1, 'q2', 'привет')
+        return await waiting, cached
+
+    waiting, cached = asyncio.run(typing())
+    assert waiting is None
+    assert cached == ('привет',)
+    assert index.queries == ['привет']
+    assert inline.metrics()['skipped'] == 1
+    assert inline._latest == {}
@@ -0,0 +1,59 @@
+"""Правки сообщений: повтор не отправляется, смена одной разметки — отправляется"""
+
+import asyncio
+import doctest
+
+from telegram import Message
+from telegram.error import BadRequest
+
+import layout
+from benchmarks.bench_layout import shown_message
+from layout import Editor
+
+
+class Query:
+    def __init__(self, message, error=None):
+        self.message = message
+        self.error = error
+        self.sent = []
+
+    async def edit_message_text(self, text, reply_markup=None, parse_mode=None):
+        self.sent.append(text)
+        if self.error:
+            raise self.error
+
+
+def edit(query, text):
+    editor = Editor()
+    changed = asyncio.run(editor.edit(query, text))
+    return changed, editor.metrics()
+
+
+def test_doctests():
+    assert doctest.testmod(layout).failed == 0
+
+
+def test_same_message_is_skipped():
+    text = '🤟 <b>Привет</b> &amp; "пока"\n\n'
+    query = Query(shown_message(text))
+    changed, metrics = edit(query, text)
+    assert not changed and query.sent == [] and metrics['skipped'] == 1
+
+
+def test_formatting_only_change_is_sent():
+    query = Query(shown_message('🤟 <b>Привет</b>'))
+    changed, metrics = edit(query, '🤟 <i>Привет</i>')
+    assert changed and query.sent == ['🤟 <i>Привет</i>'] and metrics['edits'] == 1
+
+    query = Query(shown_message('🤟 Привет'))
+    assert edit(query, '🤟 <b>Привет</b>')[0]
+
+
+def test_without_entities_edit_is_sent():
+    # сравнить разметку не с чем: повтор отсекает ответ Telegram
+    message = Message(1, None, None, text='Привет')
+    message._unfreeze()
+    message.entities = None
+    query = Query(message, BadRequest('Message is not modified'))
+    changed, metrics = edit(query, 'Привет')
+    assert not changed and query.sent == ['Привет'] and metrics['not_modified'] == 1
@@ -0,0 +1,172 @@
+"""Маршрутизация кнопок: кодек callback_data и устаревшие кнопки"""
+
+import asyncio
+import doctest
+
+import pytest
+
+import router
+from router import GESTURE, NOOP, PAGE, QUIZ_ANSWER, GestureIds, Router, encode
+
+
+async def stale(update, context):
+    pass
+
+
+async def show_gesture(update, context, key):
+    pass
+
+
+async def page(update, context, scope, number):
+    pass
+
+
+async def answer(update, context, key, correct):
+    pass
+
+
+async def noop(update, context):
+    pass
+
+
+@pytest.fixture
+def ids():
+    ids = GestureIds(history=2)
+    ids.publish(('вода', 'дом', 'привет'))
+    return ids
+
+
+@pytest.fixture
+def table(ids):
+    table = Router(stale, ids)
+    table.route(GESTURE, gesture=True)(show_gesture)
+    table.route(PAGE)(page)
+    table.route(QUIZ_ANSWER, gesture=True)(answer)
+    table.route(NOOP, aliases=('noop',))(noop)
+    table.legacy_prefix('gesture_', GESTURE)
+    table.alias('all_gestures', PAGE, 0, 0)
+    return table
+
+
+def test_doctests():
+    assert doctest.testmod(router).failed == 0
+
+
+def test_current_gesture(ids, table):
+    assert table.resolve(encode(GESTURE, ids.id('дом'), tag=ids.tag)) == (show_gesture, ('дом',))
+    assert table.resolve(encode(QUIZ_ANSWER, ids.id('вода'), 1, tag=ids.tag)) == (answer, ('вода', 1))
+
+
+def test_plain_action(table):
+    assert table.resolve(encode(PAGE, 3, 12)) == (page, (3, 12))
+
+
+def test_old_fingerprint_still_resolves(ids, table):
+    old = encode(GESTURE, ids.id('привет'), tag=ids.tag)
+    ids.publish(('арбуз', 'вода', 'дом', 'привет'))
+    # номер жеста в старом наборе другой, но кнопка ведёт к тому же жесту
+    assert table.resolve(old) == (show_gesture, ('привет',))
+
+
+def test_removed_key_is_stale(ids, table):
+    old = encode(GESTURE, ids.id('дом'), tag=ids.tag)
+    ids.publish(('вода', 'привет'))
+    assert table.resolve(old) is None
+
+
+def test_forgotten_fingerprint_is_stale(ids, table):
+    old = encode(GESTURE, ids.id('дом'), tag=ids.tag)
+    ids.publish(('вода', 'дом', 'привет', 'я'))
+    ids.publish(('вода', 'дом', 'привет', 'ты'))
+    # наборов помнится только history=2
+    assert table.resolve(old) is None
+
+
+def test_gesture_id_out_of_range_is_stale(ids, table):
+    assert table.resolve(encode(GESTURE, 99, tag=ids.tag)) is None
+
+
+def test_unknown_action_is_stale(table):
+    assert table.resolve(encode(200)) is None
+
+
+def test_broken_data_is_stale(table):
+    assert table.resolve('.CAAAgA') is None
+    assert table.resolve('.!!!') is None
+    assert table.resolve('unknown') is None
+
+
+def test_legacy_aliases(table):
+    assert table.resolve('noop') == (noop, ())
+    assert table.resolve('all_gestures') == (page, (0, 0))
+    assert table.resolve('gesture_дом') == (show_gesture, ('дом',))
+    assert table.resolve('gesture_нет') is None
+
+
+def test_gesture_ids_key(ids):
+    assert ids.key(ids.tag, ids.id('вода')) == 'вода'
+    assert ids.key(ids.tag, 3) is None
+    assert ids.key(ids.tag, -1) is None
+    assert ids.key(ids.tag ^ 1, 0) is None
+
+
+def test_gesture_ids_unknown_key(ids):
+    with pytest.raises(KeyError):
+        ids.id('нет')
+
+
+def test_duplicate_route_rejected(table):
+    with pytest.raises(ValueError):
+        table.route(PAGE)(noop)
+
+
+def test_wrong_argument_count_is_stale(ids, table):
+    # кнопки другой версии бота: лишние или недостающие аргументы
+    assert table.resolve(encode(GESTURE, ids.id('дом'), 1, 2, tag=ids.tag)) is None
+    assert table.resolve(encode(QUIZ_ANSWER, ids.id('дом'), tag=ids.tag)) is None
+    assert table.resolve(encode(PAGE, 3)) is None
+    assert table.resolve(encode(PAGE, 3, 12, 1)) is None
+    assert table.resolve(encode(NOOP, 1)) is None
+    assert table.resolve(encode(GESTURE, tag=ids.tag)) is None
+
+
+def test_optional_and_variadic_arguments(table):
+    async def optional(update, context, first, second=0):
+        pass
+
+    async def variadic(update, context, *args):
+        pass
+
+    table.route(100)(optional)
+    table.route(101)(variadic)
+    assert table.resolve(encode(100, 1)) == (optional, (1,))
+    assert table.resolve(encode(100, 1, 2)) == (optional, (1, 2))
+    assert table.resolve(encode(100)) is None
+    assert table.resolve(encode(101, 1, 2, 3)) == (variadic, (1, 2, 3))
+
+
+def test_dispatch_sends_wrong_arguments_to_stale(ids):
+    calls = []
+
+    async def stale_handler(update, context):
+        calls.append('stale')
+
+    async def search(update, context):
+        calls.append('search')
+
+    class Query:
+        def __init__(self, data):
+            self.data = data
+
+        async def answer(self, *args, **kwargs):
+            calls.append('answer')
+
+    class Update:
+        def __init__(self, data):
+            self.callback_query = Query(data)
+
+    table = Router(stale_handler, ids)
+    table.route(200)(search)
+    asyncio.run(table.dispatch(Update(encode(200, 7)), None))
+    assert calls == ['stale']
+    assert table.name(encode(200, 7)) == 'stale_handler'
@@ -0,0 +1,99 @@
+"""
+Календарь «слова дня».
+
+Дни отсчитываются от EPOCH и делятся на циклы длиной в размер базы:
+за цикл каждый жест выпадает ровно один раз, а порядок внутри цикла —
+перестановка, перемешанная с зерном, зависящим только от номера цикла.
+Поэтому календарь одинаков во всех процессах и после перезапуска,
+а слово на дату находится индексом в готовой перестановке.
+
+«Сегодня» считается в часовом поясе пользователя. Граница суток для
+каждого пояса вычисляется один раз и хранится до следующей полуночи,
+так что обычный запрос сводится к сравнению с меткой времени.
+"""
+
+import random
+import time
+from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+EPOCH = date(2024, 1, 1)
+SEED = 'rzhya-word-of-day'
+
+# Сколько перестановок держать: текущий цикл и соседние
+# (пользователи по разные стороны полуночи)
+CACHED_CYCLES = 4
+
+
+@lru_cache(maxsize=512)
+def parse_timezone(name):
+    """
+    Часовой пояс по названию IANA (Europe/Moscow) или смещению от UTC
+    (+3, -05:30, UTC+7); ValueError, если разобрать не удалось.
+    """
+    text = name.strip()
+    offset = text.upper().removeprefix('UTC').removeprefix('GMT')
+    if offset and offset[0] in '+-':
+        sign = -1 if offset[0] == '-' else 1
+        hours, _, minutes = offset[1:].partition(':')
+        try:
+            delta = timedelta(hours=int(hours), minutes=int(minutes or 0))
+        except ValueError:
+            raise ValueError(f"bad UTC offset: {name!r}") from None
+        if delta > timedelta(hours=14):
+            raise ValueError(f"bad UTC offset: {name!r}")
+        return timezone(sign * delta)
+    if offset == '':
+        return timezone.utc
+    try:
+        return ZoneInfo(text)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"unknown time zone: {name!r}") from None
+
+
+class DayClock:
+    """Текущая дата в заданном поясе; граница суток кэшируется по поясу"""
+
+    def __init__(self, clock=time.time):
+        self._clock = clock
+        self._days = {}     # пояс -> (метка следующей полуночи, дата)
+
+    def today(self, tz):
+        now = self._clock()
+        cached = self._days.get(tz)
+        if cached is not None and now < cached[0]:
+            return cached[1]
+        local = datetime.fromtimestamp(now, tz)
+        today = local.date()
+        midnight = datetime.combine(today + timedelta(days=1), datetime.min.time(), tzinfo=tz)
+        self._days[tz] = (midnight.timestamp(), today)
+        return today
+
+
+class WordCalendar:
+    """Слово дня на любую дату: перестановка базы на каждый цикл"""
+
+    def __init__(self, keys, seed=SEED, epoch=EPOCH):
+        self.keys = tuple(sorted(keys))
+        if not self.keys:
+            raise ValueError("word calendar needs at least one gesture")
+        self.seed = seed
+        self.epoch = epoch
+        self._cycles = {}
+
+    def _cycle(self, number):
+        order = self._cycles.get(number)
+        if order is None:
+            if len(self._cycles) >= CACHED_CYCLES:
+                # выбрасываем самый далёкий от запрошенного цикл
+                self._cycles.pop(max(self._cycles, key=lambda n: abs(n - number)))
+            order = list(self.keys)
+            random.Random(f'{self.seed}:{number}').shuffle(order)
+            self._cycles[number] = order = tuple(order)
+        return order
+
+    def word_for(self, day):
+        """Ключ жеста на дату day"""
+        number, position = divmod((day - self.epoch).days, len(self.keys))
+        return self._cycle(number)[position]